@@ -0,0 +1,321 @@
+import asyncio
+from datetime import datetime, time, timedelta
+
+from django.db.models import Sum, Max, Count, Q, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DailyStudyRollup, SchoolDailyKPI, UserProfile
+from .timezones import get_zone, school_zone, user_zone
+
+
+def study_windows(now=None, zone=None):
+    """
+    Return the time boundaries shared by the dashboard views.
+
+    Days start at midnight in `zone` (a school's timezone, see
+    api.timezones); None means SCHOOL_DEFAULT_TIMEZONE. Everything is
+    computed in Python from the zone the caller already holds, so the
+    boundaries cost no query.
+    """
+    zone = zone or get_zone(None)
+    now = (now or timezone.now()).astimezone(zone)
+    today = now.date()
+    today_start = datetime.combine(today, time.min, tzinfo=zone)
+    return {
+        'now': now,
+        'today_start': today_start,
+        'week_start': now - timedelta(days=7),
+        'last_week_start': now - timedelta(days=14),
+        'month_start': now - timedelta(days=30),
+        # Day-granular equivalents for DailyStudyRollup reads
+        'today': today,
+        'yesterday': today - timedelta(days=1),
+        'week_start_date': today - timedelta(days=7),
+        'month_start_date': today - timedelta(days=30),
+    }
+
+
+def _sum_since(path, start, end=None):
+    """Conditional Sum of duration_seconds over the sessions reachable via `path`"""
+    condition = Q(**{f'{path}__start_time__gte': start})
+    if end is not None:
+        condition &= Q(**{f'{path}__start_time__lt': end})
+    return Coalesce(
+        Sum(f'{path}__duration_seconds', filter=condition),
+        0,
+        output_field=IntegerField()
+    )
+
+
+def _rollup_sum(**condition):
+    """Conditional Sum of total_seconds over DailyStudyRollup rows"""
+    return Coalesce(
+        Sum('total_seconds', filter=Q(**condition)),
+        0,
+        output_field=IntegerField()
+    )
+
+
+def _user_totals(windows):
+    return {
+        'today': _rollup_sum(date__gte=windows['today']),
+        'week': _rollup_sum(date__gte=windows['week_start_date']),
+        'month': _rollup_sum(date__gte=windows['month_start_date']),
+        'total_sessions': Coalesce(Sum('session_count'), 0),
+    }
+
+
+def user_rollup_stats(user, now=None):
+    """Today/week/month totals and session count for one user from the rollup table"""
+    w = study_windows(now, user_zone(user))
+    return DailyStudyRollup.objects.filter(user=user).aggregate(**_user_totals(w))
+
+
+async def auser_rollup_stats(user, now=None):
+    """user_rollup_stats() through the async ORM"""
+    w = study_windows(now, user_zone(user))
+    return await DailyStudyRollup.objects.filter(user=user).aaggregate(**_user_totals(w))
+
+
+def rollup_days(user):
+    """Per-day totals and session counts of one user's rollups, oldest first"""
+    return DailyStudyRollup.objects.filter(user=user).values('date').annotate(
+        total_seconds=Sum('total_seconds'),
+        session_count=Sum('session_count')
+    ).order_by('date')
+
+
+def totals_from_days(days, windows):
+    """user_rollup_stats() figures from rollup_days() rows, without another query"""
+    starts = (
+        ('today', windows['today']), ('week', windows['week_start_date']), ('month', windows['month_start_date'])
+    )
+    totals = {'today': 0, 'week': 0, 'month': 0, 'total_sessions': 0}
+    for day in days:
+        for name, start in starts:
+            if day['date'] >= start:
+                totals[name] += day['total_seconds']
+        totals['total_sessions'] += day['session_count']
+    return totals
+
+
+def school_rollups(school):
+    """DailyStudyRollup rows of the students of a school"""
+    return DailyStudyRollup.objects.filter(
+        user__profile__role='student',
+        user__profile__school=school
+    )
+
+
+def kpi_days(school, windows):
+    """SchoolDailyKPI rows of today and yesterday, with the top student's profile"""
+    return SchoolDailyKPI.objects.filter(
+        school=school, date__in=[windows['today'], windows['yesterday']]
+    ).select_related('top_user__profile')
+
+
+def top_student_name(user):
+    """Display name of a student, as on the leaderboard"""
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return user.username
+    return profile.full_name or profile.phone_number
+
+
+def _kpis(total_students, days, windows):
+    """Assemble the KPI payload from the school's size and its day rows"""
+    if total_students == 0:
+        return {
+            'avg_study_today': '0:00',
+            'avg_study_today_seconds': 0,
+            'change_percent': 0,
+            'top_student': {'name': 'هیچ کس', 'total': 0},
+            'absent_count': 0,
+            'active_now': 0,
+            'total_students': 0
+        }
+
+    by_date = {day.date: day for day in days}
+    today = by_date.get(windows['today'])
+    yesterday = by_date.get(windows['yesterday'])
+    avg_today = (today.total_seconds if today else 0) // total_students
+    avg_yesterday = (yesterday.total_seconds if yesterday else 0) // total_students
+
+    if avg_yesterday > 0:
+        change_percent = ((avg_today - avg_yesterday) / avg_yesterday) * 100
+    else:
+        change_percent = 100 if avg_today > 0 else 0
+
+    if today is not None and today.top_user is not None:
+        top_student = {'name': top_student_name(today.top_user), 'total': today.top_seconds}
+    else:
+        top_student = {'name': 'هیچ کس', 'total': 0}
+
+    return {
+        'avg_study_today': f"{avg_today // 3600}:{(avg_today % 3600) // 60:02d}",
+        'avg_study_today_seconds': avg_today,
+        'change_percent': round(change_percent, 1),
+        'top_student': top_student,
+        # Absent students (no activity today)
+        'absent_count': max(0, total_students - (today.active_students if today else 0)),
+        # Filled in from the presence store by the caller
+        'active_now': 0,
+        'total_students': total_students
+    }
+
+
+def school_kpis(school, now=None):
+    """
+    Bird's-eye KPIs of a school for today: the roster size plus the
+    materialized SchoolDailyKPI rows of today and yesterday.
+    """
+    windows = study_windows(now, school_zone(school))
+    total_students = UserProfile.objects.filter(role='student', school=school).count()
+    if total_students == 0:
+        return _kpis(0, [], windows)
+    return _kpis(total_students, list(kpi_days(school, windows)), windows)
+
+
+async def aschool_kpis(school, now=None):
+    """
+    school_kpis() through the async ORM, with its two reads awaited together.
+
+    Django still runs them one at a time on the request's database thread;
+    what the async path buys is an event loop free to serve other requests
+    meanwhile.
+    """
+    windows = study_windows(now, school_zone(school))
+
+    async def days():
+        return [day async for day in kpi_days(school, windows)]
+
+    total_students, rows = await asyncio.gather(
+        UserProfile.objects.filter(role='student', school=school).acount(),
+        days(),
+    )
+    return _kpis(total_students, rows, windows)
+
+
+def annotate_school_stats(schools):
+    """
+    Annotate a School queryset with `member_count` (students) and
+    `manager_name`, so listing schools costs one query however many there are.
+    """
+    manager_name = UserProfile.objects.filter(
+        school=OuterRef('pk'),
+        role='manager'
+    ).order_by('id').values('full_name')[:1]
+    return schools.annotate(
+        member_count=Count('members', filter=Q(members__role='student')),
+        manager_name=Coalesce(Subquery(manager_name), Value('تعیین نشده'))
+    )
+
+
+def annotate_student_stats(profiles, now=None, zone=None):
+    """
+    Annotate a UserProfile queryset with today/week/last-week totals and last
+    activity, computed for the whole queryset in a single grouped query.
+    "Today" starts at midnight in `zone`, the timezone of the students' school.
+    """
+    windows = study_windows(now, zone)
+    path = 'user__study_sessions'
+    return profiles.annotate(
+        today_total=_sum_since(path, windows['today_start']),
+        week_total=_sum_since(path, windows['week_start']),
+        last_week_total=_sum_since(path, windows['last_week_start'], windows['week_start']),
+        last_activity=Max(f'{path}__start_time'),
+    )
+
+
+def calculate_trend(week_total, last_week_total):
+    """Return (trend, trend_percent) comparing this week with the previous one"""
+    if last_week_total > 0:
+        trend_percent = ((week_total - last_week_total) / last_week_total) * 100
+        if trend_percent > 5:
+            trend = 'up'
+        elif trend_percent < -5:
+            trend = 'down'
+        else:
+            trend = 'stable'
+    else:
+        trend_percent = 100 if week_total > 0 else 0
+        trend = 'up' if week_total > 0 else 'stable'
+    return trend, trend_percent
+
+
+def student_list_rows(profiles, now=None, zone=None):
+    """Build ManagerStudentListSerializer rows for a filtered UserProfile queryset"""
+    rows = annotate_student_stats(profiles, now, zone).values(
+        'user_id', 'full_name', 'phone_number', 'grade', 'olympiad_field',
+        'today_total', 'week_total', 'last_week_total', 'last_activity'
+    )
+    students = []
+    for row in rows:
+        trend, trend_percent = calculate_trend(row['week_total'], row.pop('last_week_total'))
+        row['trend'] = trend
+        row['trend_percent'] = round(trend_percent, 1)
+        students.append(row)
+    return students
+
+
+def study_streaks(days, today):
+    """
+    Return (current, longest) streaks of consecutive study days.
+
+    `days` are distinct dates in ascending order and are scanned once. The
+    current streak is the run ending today, or yesterday if the student has
+    not studied yet today.
+    """
+    longest = run = 0
+    previous = None
+    for day in days:
+        if day > today:
+            break
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+    return current, longest
+
+
+def student_analytics(user, start, end, today):
+    """
+    Daily totals from `start` to `end`, a per-subject split and study streaks.
+
+    Days and subjects come from a single query grouped by (date, subject)
+    over the rollup table; streaks from one ordered scan of distinct days.
+    """
+    rollups = DailyStudyRollup.objects.filter(user=user)
+    rows = rollups.filter(date__gte=start, date__lte=end).values(
+        'date', 'subject__name', 'subject__color_code'
+    ).annotate(total_seconds=Sum('total_seconds')).order_by()
+
+    daily = {}
+    subjects = {}
+    for row in rows:
+        daily[row['date']] = daily.get(row['date'], 0) + row['total_seconds']
+        subject = subjects.setdefault(row['subject__name'], {
+            'name': row['subject__name'],
+            'color': row['subject__color_code'] or '#10b981',
+            'total_seconds': 0,
+        })
+        subject['total_seconds'] += row['total_seconds']
+
+    study_days = rollups.filter(total_seconds__gt=0).values_list('date', flat=True).distinct().order_by('date')
+    current_streak, longest_streak = study_streaks(study_days.iterator(), today)
+
+    span = (end - start).days + 1
+    return {
+        'start': start,
+        'end': end,
+        'days': [
+            {'date': day, 'total_seconds': daily.get(day, 0)}
+            for day in (start + timedelta(days=offset) for offset in range(span))
+        ],
+        'subjects': sorted(subjects.values(), key=lambda s: s['total_seconds'], reverse=True),
+        'total_seconds': sum(daily.values()),
+        'active_days': sum(1 for seconds in daily.values() if seconds > 0),
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+    }
@@ -0,0 +1,45 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework import views
+
+
+class AsyncAPIView(views.APIView):
+    """
+    APIView whose handlers are coroutines, for read-heavy endpoints served
+    by the ASGI deployment (see gunicorn.conf.py).
+
+    Authentication, permissions and throttling are DRF's own and run in the
+    request's database thread, as they may read the cache or the principal.
+    The handler then awaits the async ORM on the event loop, and rendering,
+    errors and content negotiation are unchanged, so responses are
+    byte-for-byte those of the sync view. Under WSGI Django runs the
+    coroutine in a private event loop, which works but gains nothing.
+    """
+
+    # Handlers wrapped by method_decorator() look synchronous on Django 5.0
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
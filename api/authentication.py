@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_cache
+
+
+def principal_key(user_id):
+    return f'principal:user:{user_id}'
+
+
+def forget_principals(*user_ids):
+    """Drop cached principals, e.g. after a role or school change"""
+    get_cache().delete_many([principal_key(user_id) for user_id in user_ids if user_id is not None])
+
+
+def load_principal(user_id):
+    """
+    The user with profile, school and open timer attached, from the cache or one query.
+
+    Returns None for an unknown user. Entries live for
+    AUTH_PRINCIPAL_CACHE_TIMEOUT seconds and are dropped by the signals in
+    api/signals.py whenever the user, profile or school is saved.
+    """
+    cache = get_cache()
+    key = principal_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('profile__school', 'active_session').filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.AUTH_PRINCIPAL_CACHE_TIMEOUT)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves request.user together with its profile
+    and school, so permission checks and views read them without queries.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = load_principal(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
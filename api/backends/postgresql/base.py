@@ -0,0 +1,77 @@
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from api.dbpool import PoolTimeout, close_pool, get_pool
+
+# libpq's PQtransactionStatus values, the same in psycopg2 and psycopg 3
+TRANSACTION_IDLE = 0
+TRANSACTION_UNKNOWN = 4
+
+
+def is_usable(conn):
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+def reset(conn):
+    """Roll back whatever the last borrower left open; False if the connection is broken"""
+    if conn.closed:
+        return False
+    status = conn.info.transaction_status
+    if status == TRANSACTION_UNKNOWN:
+        return False
+    if status != TRANSACTION_IDLE:
+        conn.rollback()
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would block DROP DATABASE
+        close_pool(self.connection.alias, test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL with connections borrowed from a per-process pool
+    (api.dbpool), selected by DB_POOL_MODE=pool.
+
+    Django opens a connection on the first query of a request and, with
+    CONN_MAX_AGE = 0, closes it when the request finishes; here that is a
+    checkout and a checkin. With CONN_HEALTH_CHECKS an idle connection is
+    pinged before it is handed out, so one dropped by a failover or an idle
+    timeout is replaced instead of failing the request.
+    """
+
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        # Connections to the maintenance database, for CREATE/DROP DATABASE
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+        pool = self.pool()
+        try:
+            return pool.checkout(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                health_check=self.settings_dict['CONN_HEALTH_CHECKS']
+            )
+        except PoolTimeout as exc:
+            raise base.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.alias == NO_DB_ALIAS:
+            return super()._close()
+        if self.connection is not None:
+            # Closed inside atomic(), Django keeps the connection object until
+            # the block exits, so it cannot go back to the pool
+            self.pool().checkin(self.connection, discard=self.in_atomic_block)
+
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['NAME'], is_usable, reset)
@@ -0,0 +1,136 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .timezones import get_zone
+
+
+# Per-process hit/miss counters, keyed by cache name
+hits = Counter()
+misses = Counter()
+
+
+def get_cache():
+    return caches[settings.STATS_CACHE_ALIAS]
+
+
+def _generation_key(scope, scope_id):
+    return f'gen:{scope}:{scope_id}'
+
+
+def cache_key(name, scope, scope_id, generation, *parts, zone=None):
+    """
+    Key scheme: `<name>:<scope>:<id>:g<generation>:<day>[:<parts>]`.
+
+    `scope` is 'user' or 'school'. Bumping the scope's generation orphans every
+    key built on the old one, so invalidation never has to enumerate keys.
+    The current day is part of the key because "today" totals roll over at
+    midnight in `zone`, the school's timezone (None: SCHOOL_DEFAULT_TIMEZONE).
+    """
+    suffix = ':'.join(str(part) for part in parts)
+    day = timezone.localdate(timezone=zone or get_zone(None))
+    key = f'{name}:{scope}:{scope_id}:g{generation}:{day.isoformat()}'
+    return f'{key}:{suffix}' if suffix else key
+
+
+def _fresh_generation():
+    return int(timezone.now().timestamp() * 1000)
+
+
+def fingerprint(*parts):
+    """Short opaque digest of `parts`, used as an ETag value"""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def generation(scope, scope_id):
+    """
+    Current generation of a user or school; changes on every invalidation.
+
+    A missing key (never invalidated, evicted, expired or flushed) starts
+    from the current time rather than 0, so a generation never repeats and
+    values derived from it, such as ETags, cannot match data from before a
+    flush. Keys expire after STATS_GENERATION_TIMEOUT, as ids from URLs
+    may name users or schools that do not exist.
+    """
+    cache = get_cache()
+    key = _generation_key(scope, scope_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh_generation(), settings.STATS_GENERATION_TIMEOUT)
+        value = cache.get(key, 0)
+    return value
+
+
+def cached(name, scope, scope_id, compute, *parts, zone=None, timeout=None):
+    """
+    Return the cached value for `name` or compute, store and return it.
+    `zone` is the timezone whose day the value is about, see cache_key().
+    """
+    cache = get_cache()
+    key = cache_key(name, scope, scope_id, generation(scope, scope_id), *parts, zone=zone)
+    value = cache.get(key)
+    if value is not None:
+        hits[name] += 1
+        return value
+    misses[name] += 1
+    value = compute()
+    cache.set(key, value, settings.STATS_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+async def ageneration(scope, scope_id):
+    """generation() for async views, through the cache's async API"""
+    cache = get_cache()
+    key = _generation_key(scope, scope_id)
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, _fresh_generation(), settings.STATS_GENERATION_TIMEOUT)
+        value = await cache.aget(key, 0)
+    return value
+
+
+async def acached(name, scope, scope_id, compute, *parts, zone=None, timeout=None):
+    """cached() for async views: `compute` returns an awaitable"""
+    cache = get_cache()
+    key = cache_key(name, scope, scope_id, await ageneration(scope, scope_id), *parts, zone=zone)
+    value = await cache.aget(key)
+    if value is not None:
+        hits[name] += 1
+        return value
+    misses[name] += 1
+    value = await compute()
+    await cache.aset(key, value, settings.STATS_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+def invalidate(scope, scope_id):
+    """Drop every cached value of one user or school"""
+    if scope_id is None:
+        return
+    cache = get_cache()
+    key = _generation_key(scope, scope_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # An expired or evicted generation restarts from a fresh value
+        cache.set(key, _fresh_generation(), settings.STATS_GENERATION_TIMEOUT)
+
+
+def cache_stats():
+    """Hit/miss counters of this process plus the configured backend"""
+    names = sorted(set(hits) | set(misses))
+    return {
+        'backend': settings.CACHES[settings.STATS_CACHE_ALIAS]['BACKEND'],
+        'timeout': settings.STATS_CACHE_TIMEOUT,
+        'caches': {
+            name: {
+                'hits': hits[name],
+                'misses': misses[name],
+                'hit_rate': round(hits[name] / (hits[name] + misses[name]), 3),
+            }
+            for name in names
+        },
+    }
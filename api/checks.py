@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_presence_is_shared(app_configs, **kwargs):
+    """Warn when "active now" is counted per process instead of per deployment"""
+    backend = settings.CACHES[settings.STATS_CACHE_ALIAS]['BACKEND']
+    per_process = settings.PRESENCE_BACKEND == 'memory' or (
+        settings.PRESENCE_BACKEND == 'cache' and backend.endswith('.LocMemCache')
+    )
+    if per_process and not settings.DEBUG:
+        return [Warning(
+            'Presence is kept per process, so each worker counts only its own heartbeats.',
+            hint="Set CACHE_BACKEND to 'file' or 'redis', shared by every process, "
+                 "or serve all requests from a single process.",
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,105 @@
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def available_encodings():
+    """Content codings this process can produce, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    The coding to use for a request's Accept-Encoding header, or None.
+
+    Picks the highest q-value among the available codings; ties go to the
+    one listed first by available_encodings(). `q=0` refuses a coding.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    ranked = [
+        (accepted.get(coding, accepted.get('*', 0.0)), -index, coding)
+        for index, coding in enumerate(available_encodings())
+    ]
+    quality, _, coding = max(ranked)
+    return coding if quality > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=settings.API_BROTLI_QUALITY)
+    # mtime=0 keeps the output stable for identical bodies
+    return gzip.compress(body, compresslevel=settings.API_GZIP_LEVEL, mtime=0)
+
+
+class ApiCompressionMiddleware:
+    """
+    Compress API responses of at least API_COMPRESSION_MIN_SIZE bytes with
+    brotli (when installed) or gzip, as negotiated by Accept-Encoding.
+
+    Static files are left to WhiteNoise, which serves them precompressed,
+    and streaming responses (exports, PDFs) are passed through untouched.
+    Strong ETags are weakened, as Django's GZipMiddleware does, because the
+    compressed bytes differ from the representation the ETag was made for.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        if (
+            not request.path.startswith(settings.API_COMPRESSION_PREFIX)
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < settings.API_COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        body = compress(response.content, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,128 @@
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .cache import fingerprint, generation
+from .live import kpi_signature
+from .models import StudySession
+from .timezones import school_zone, user_zone
+
+
+def conditional(etag_func, name=''):
+    """
+    Method (or, with `name`, class) decorator adding ETag validation to a GET.
+
+    `etag_func(request, *args, **kwargs)` must be cheap: it runs before the
+    view, and a matching If-None-Match is answered with 304 straight away.
+    Responses are marked `private, no-cache` so browsers keep them but
+    revalidate on every use, which is what turns repeat loads into 304s.
+    Async handlers are supported; `etag_func` still runs synchronously.
+    """
+    def decorator(view):
+        guarded = condition(etag_func=etag_func)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                return _revalidate(await guarded(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return _revalidate(guarded(request, *args, **kwargs))
+        return wrapper
+
+    decorate = method_decorator(decorator, name=name)
+    if name:
+        return decorate
+
+    def decorate_method(method):
+        wrapped = decorate(method)
+        # method_decorator() keeps async methods async only from Django 5.1
+        return markcoroutinefunction(wrapped) if iscoroutinefunction(method) else wrapped
+    return decorate_method
+
+
+def _revalidate(response):
+    if response.status_code in (200, 304):
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _school(request):
+    profile = getattr(request.user, 'profile', None)
+    return profile.school if profile is not None else None
+
+
+def _rolling_bucket():
+    # Rolling 7/14-day windows drift without any write; expire validators
+    # as often as the stats cache expires the values behind them
+    return int(time.time() // settings.STATS_CACHE_TIMEOUT)
+
+
+# Validators. Each digests the request path (query string included) with
+# the versions of the data the endpoint reads; all but the session
+# watermark are answered from the request principal and the cache.
+
+def profile_etag(request, *args, **kwargs):
+    profile = getattr(request.user, 'profile', None)
+    return fingerprint(request.get_full_path(), request.user.id, profile.updated_at if profile else None)
+
+
+def user_data_etag(request, *args, **kwargs):
+    """Subjects and per-user stats: the user's generation and local day"""
+    user = request.user
+    return fingerprint(
+        request.get_full_path(), user.id, generation('user', user.id),
+        timezone.localdate(timezone.now(), user_zone(user))
+    )
+
+
+def session_list_etag(request, *args, **kwargs):
+    """Session pages: a max(id)/count watermark plus the generation for subject renames"""
+    user = request.user
+    watermark = StudySession.objects.filter(user=user).aggregate(last=Max('id'), count=Count('id'))
+    return fingerprint(
+        request.get_full_path(), user.id, watermark['last'], watermark['count'], generation('user', user.id)
+    )
+
+
+def school_data_etag(request, *args, **kwargs):
+    """Manager views over the whole school"""
+    school = _school(request)
+    if school is None:
+        return None
+    return fingerprint(
+        request.get_full_path(), school.id, school.updated_at, generation('school', school.id),
+        timezone.localdate(timezone.now(), school_zone(school))
+    )
+
+
+def school_rolling_etag(request, *args, **kwargs):
+    """Manager views with rolling week windows, such as the student list"""
+    etag = school_data_etag(request, *args, **kwargs)
+    return etag and fingerprint(etag, _rolling_bucket())
+
+
+def school_kpi_etag(request, *args, **kwargs):
+    """KPI cards: the live stream's signature, which includes presence"""
+    etag = school_data_etag(request, *args, **kwargs)
+    return etag and fingerprint(etag, *kpi_signature(_school(request)))
+
+
+def student_profile_etag(request, user_id, *args, **kwargs):
+    """One student as seen by a manager of their school"""
+    school = _school(request)
+    if school is None:
+        return None
+    return fingerprint(
+        request.get_full_path(), school.id, generation('user', user_id),
+        timezone.localdate(timezone.now(), school_zone(school))
+    )
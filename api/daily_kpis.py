@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.db.models import Min
+from django.utils import timezone
+
+from .aggregates import top_student_name
+from .cache import invalidate
+from .models import DailyStudyRollup, School, SchoolDailyKPI, UserProfile
+from .rollups import finalize_school_kpis, refresh_school_kpis
+from .timezones import get_zone, school_zone
+
+
+def refresh_open_days(school_id, now=None):
+    """
+    Recompute a school's unfinalized SchoolDailyKPI rows after its roster
+    changed, e.g. a student moved in or out. Finalized days keep the
+    roster they were finalized with.
+    """
+    if school_id is None:
+        return 0
+    zone_name = School.objects.filter(pk=school_id).values_list('timezone', flat=True).first()
+    today = timezone.localdate(now or timezone.now(), get_zone(zone_name))
+    first_open = SchoolDailyKPI.objects.filter(
+        school_id=school_id, finalized=False
+    ).aggregate(first=Min('date'))['first']
+    since = min(first_open, today) if first_open else today
+    return refresh_school_kpis(DailyStudyRollup, SchoolDailyKPI, school_id, since)
+
+
+def finalize_days(school, now=None):
+    """Finalize every day of `school` before its local today; returns the rows written"""
+    today = timezone.localdate(now or timezone.now(), school_zone(school))
+    written = finalize_school_kpis(DailyStudyRollup, SchoolDailyKPI, UserProfile, school.id, today)
+    if written:
+        invalidate('school', school.id)
+    return written
+
+
+def kpi_trend(school, days, now=None):
+    """
+    Daily KPIs of `school` for the `days` days ending today, oldest first.
+
+    Two queries: the SchoolDailyKPI rows of the range and the roster size,
+    which stands in for days not finalized yet. Days without a row are
+    days nobody studied.
+    """
+    end = timezone.localdate(now or timezone.now(), school_zone(school))
+    start = end - timedelta(days=days - 1)
+    rows = {
+        row.date: row
+        for row in SchoolDailyKPI.objects.filter(
+            school=school, date__gte=start, date__lte=end
+        ).select_related('top_user__profile')
+    }
+    current_students = UserProfile.objects.filter(role='student', school=school).count()
+
+    series = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        row = rows.get(date)
+        students = row.student_count if row is not None and row.student_count is not None else current_students
+        total = row.total_seconds if row else 0
+        active = row.active_students if row else 0
+        top_student = None
+        if row is not None and row.top_user is not None:
+            top_student = {'name': top_student_name(row.top_user), 'total': row.top_seconds}
+        series.append({
+            'date': date,
+            'total_seconds': total,
+            'avg_seconds': total // students if students else 0,
+            'session_count': row.session_count if row else 0,
+            'active_students': active,
+            'absent_count': max(0, students - active),
+            'student_count': students,
+            'top_student': top_student,
+            'finalized': row is not None and row.finalized,
+        })
+    return {'days': days, 'start': start, 'end': end, 'series': series}
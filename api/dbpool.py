@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .metrics import PERCENTILES, percentile
+
+
+class PoolTimeout(Exception):
+    """No connection came free within the pool's timeout"""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of DB-API connections for one database.
+
+    Used by the api.backends.postgresql engine (DB_POOL_MODE=pool): each
+    thread's DatabaseWrapper checks a connection out when it first queries
+    and back in when Django closes it at the end of the request, so a burst
+    of requests reuses warm connections instead of opening one each, and at
+    most `max_size` are open per process whatever the number of threads.
+
+    `check(conn)` tells whether an idle connection still works (run on
+    checkout, the pool's CONN_HEALTH_CHECKS) and `reset(conn)` cleans one
+    that comes back, returning False to drop it.
+    """
+
+    def __init__(self, check, reset, max_size, timeout, samples=1000):
+        self.check = check
+        self.reset = reset
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._waiting = 0
+        self._counters = dict.fromkeys(('checkouts', 'connects', 'check_failures', 'discarded', 'timeouts'), 0)
+        self._wait_ms = deque(maxlen=samples)
+        self._checkout_ms = deque(maxlen=samples)
+        self._available = threading.Condition()
+
+    def checkout(self, connect, health_check=True):
+        """
+        An open connection, waiting up to `timeout` seconds for a free slot.
+        `connect()` opens a new one when the pool has none idle.
+        """
+        started = time.perf_counter()
+        with self._available:
+            deadline = time.monotonic() + self.timeout
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection free within {self.timeout}s ({self.max_size} in use)'
+                    )
+                self._waiting += 1
+                try:
+                    self._available.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            conn = self._idle.pop() if self._idle else None
+            # Reserve the slot now; a new connection is opened outside the lock
+            self._size += conn is None
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        waited = time.perf_counter() - started
+
+        try:
+            if conn is not None and health_check and not self.check(conn):
+                self._close_quietly(conn)
+                conn = None
+                self._count('check_failures')
+            if conn is None:
+                conn = connect()
+                self._count('connects')
+        except BaseException:
+            with self._available:
+                self._size -= 1
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        with self._available:
+            self._counters['checkouts'] += 1
+            self._wait_ms.append(waited * 1000)
+            self._checkout_ms.append((time.perf_counter() - started) * 1000)
+        return conn
+
+    def checkin(self, conn, discard=False):
+        """Give back a connection from checkout(); broken or discarded ones are closed"""
+        try:
+            keep = not discard and self.reset(conn)
+        except Exception:
+            keep = False
+        if not keep:
+            self._close_quietly(conn)
+        with self._available:
+            self._in_use -= 1
+            if keep:
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+                self._counters['discarded'] += 1
+            self._available.notify()
+
+    def close(self):
+        """Close the idle connections"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def reset_stats(self):
+        with self._available:
+            self._counters = dict.fromkeys(self._counters, 0)
+            self._peak_in_use = self._in_use
+            self._wait_ms.clear()
+            self._checkout_ms.clear()
+
+    def stats(self):
+        with self._available:
+            report = {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'peak_in_use': self._peak_in_use,
+                **self._counters,
+            }
+            samples = {'wait_ms': sorted(self._wait_ms), 'checkout_ms': sorted(self._checkout_ms)}
+        for name, ordered in samples.items():
+            report[name] = {f'p{pct}': percentile(ordered, pct) for pct in PERCENTILES}
+            report[name]['max'] = ordered[-1] if ordered else None
+        return report
+
+    def _count(self, counter):
+        with self._available:
+            self._counters[counter] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, database, check, reset):
+    """
+    The process's pool for `database` under connection `alias`, created on
+    first use. Keyed by both as test runs switch an alias to another database.
+    """
+    key = (alias, database)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    check, reset,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    samples=settings.REQUEST_METRICS_BUFFER
+                )
+    return pool
+
+
+def close_pool(alias, database):
+    """Close the idle connections of a pool, e.g. before dropping its database"""
+    pool = _pools.get((alias, database))
+    if pool is not None:
+        pool.close()
+
+
+def pool_stats():
+    """stats() of every pool of this process"""
+    return [
+        {'alias': alias, 'database': database, **pool.stats()}
+        for (alias, database), pool in sorted(_pools.items(), key=lambda item: str(item[0]))
+    ]
+
+
+def reset_pool_stats():
+    for pool in list(_pools.values()):
+        pool.reset_stats()
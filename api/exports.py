@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum, Q, IntegerField
+from django.db.models.functions import Coalesce
+
+from .aggregates import study_windows, user_rollup_stats
+from .models import UserProfile, DailyStudyRollup
+from .timezones import user_zone
+
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_CONTENT_TYPE = 'application/pdf'
+
+REPORT_HEADERS = ['نام', 'شماره تماس', 'پایه', 'رشته المپیاد', 'مجموع ساعات مطالعه', 'تعداد جلسات']
+REPORT_COLUMN_WIDTHS = {'A': 20, 'B': 15, 'C': 12, 'D': 15, 'E': 20, 'F': 15}
+
+
+def student_report_rows(school, start_date, end_date, chunk_size=2000):
+    """
+    Yield one report row per student of `school` for the given date range.
+
+    Totals come from DailyStudyRollup in a single grouped query which is
+    consumed with iterator(), so memory does not grow with the roster.
+    """
+    in_range = Q(
+        user__daily_rollups__date__gte=start_date.date(),
+        user__daily_rollups__date__lte=end_date.date()
+    )
+    grades = dict(UserProfile.GRADE_CHOICES)
+    olympiads = dict(UserProfile.OLYMPIAD_CHOICES)
+
+    rows = UserProfile.objects.filter(
+        role='student',
+        school=school
+    ).annotate(
+        total_seconds=Coalesce(
+            Sum('user__daily_rollups__total_seconds', filter=in_range), 0, output_field=IntegerField()
+        ),
+        session_count=Coalesce(
+            Sum('user__daily_rollups__session_count', filter=in_range), 0, output_field=IntegerField()
+        )
+    ).values_list(
+        'full_name', 'phone_number', 'grade', 'olympiad_field', 'total_seconds', 'session_count'
+    ).order_by('id')
+
+    for full_name, phone_number, grade, olympiad_field, total_seconds, session_count in rows.iterator(chunk_size=chunk_size):
+        yield [
+            full_name,
+            phone_number,
+            grades.get(grade, grade),
+            olympiads.get(olympiad_field, olympiad_field),
+            f"{total_seconds / 3600:.2f}",
+            session_count
+        ]
+
+
+def write_student_report(fileobj, rows):
+    """Write report rows to `fileobj` as an xlsx using openpyxl's write-only mode"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("گزارش عملکرد")
+
+    # Column widths must be set before the first row in write-only mode
+    for column, width in REPORT_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    # Header style
+    header_fill = PatternFill(start_color="10b981", end_color="10b981", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header = []
+    for title in REPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center')
+        header.append(cell)
+    ws.append(header)
+
+    for row in rows:
+        ws.append(row)
+
+    wb.save(fileobj)
+
+
+def student_report_context(user, now=None):
+    """Collect everything the student PDF report shows, read from DailyStudyRollup"""
+    windows = study_windows(now, user_zone(user))
+    rollups = DailyStudyRollup.objects.filter(user=user)
+    subjects = rollups.values('subject__name').annotate(
+        total_seconds=Sum('total_seconds')
+    ).order_by('-total_seconds')
+    daily = rollups.filter(
+        date__gte=windows['today'] - timedelta(days=29)
+    ).values('date').annotate(
+        total_seconds=Sum('total_seconds')
+    ).order_by('date')
+    profile = user.profile
+    return {
+        'full_name': profile.full_name or profile.phone_number,
+        'phone_number': profile.phone_number,
+        'grade': profile.get_grade_display(),
+        'olympiad_field': profile.get_olympiad_field_display(),
+        'generated_on': windows['today'],
+        'stats': user_rollup_stats(user, windows['now']),
+        'subjects': [(s['subject__name'], s['total_seconds']) for s in subjects],
+        'daily': [(d['date'], d['total_seconds']) for d in daily],
+    }
+
+
+def _format_duration(seconds):
+    return f"{seconds // 3600}:{(seconds % 3600) // 60:02d}"
+
+
+def _rtl(text):
+    """Shape Persian text for PDF output when arabic_reshaper/python-bidi are installed"""
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return text
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def write_student_pdf(fileobj, context):
+    """Render a student report to `fileobj` with reportlab"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    font = 'Helvetica'
+    if settings.REPORT_PDF_FONT:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(TTFont('ReportFont', settings.REPORT_PDF_FONT))
+        font = 'ReportFont'
+        for style in styles.byName.values():
+            style.fontName = font
+
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+    ])
+    stats = context['stats']
+    story = [
+        Paragraph(_rtl(context['full_name']), styles['Title']),
+        Paragraph(f"{context['phone_number']} | {_rtl(context['grade'])} | {_rtl(context['olympiad_field'])}", styles['Normal']),
+        Paragraph(f"Generated on {context['generated_on'].isoformat()}", styles['Normal']),
+        Spacer(1, 12),
+        Table([
+            ['Today', 'Week', 'Month', 'Sessions'],
+            [_format_duration(stats['today']), _format_duration(stats['week']),
+             _format_duration(stats['month']), stats['total_sessions']],
+        ], style=table_style),
+        Spacer(1, 12),
+        Table(
+            [['Subject', 'Total']] + [[_rtl(name), _format_duration(total)] for name, total in context['subjects']],
+            style=table_style
+        ),
+        Spacer(1, 12),
+        Table(
+            [['Date', 'Total']] + [[day.isoformat(), _format_duration(total)] for day, total in context['daily']],
+            style=table_style
+        ),
+    ]
+    SimpleDocTemplate(fileobj, pagesize=A4, title='Student report').build(story)
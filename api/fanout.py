@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.FANOUT_THREADS, thread_name_prefix='fanout')
+    return _executor
+
+
+def _run(call):
+    # Pool threads live outside the request cycle, which normally recycles connections
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+def _hand_off():
+    """True if the calls must run inline; otherwise free the caller's connection"""
+    if _in_transaction():
+        return True
+    # A connection that is not kept past the request (CONN_MAX_AGE = 0, as
+    # with DB_POOL_MODE=pool) goes back now: requests holding one while they
+    # wait for the pool threads' could otherwise take every pooled connection
+    if connection.settings_dict['CONN_MAX_AGE'] == 0:
+        connection.close()
+    return False
+
+
+async def fan_out(*calls):
+    """
+    Run independent sync ORM reads concurrently and return their results in order.
+
+    Calls go to a process-wide pool of FANOUT_THREADS threads, each with its
+    own database connection, so the queries overlap in the database and
+    the caller waits for the slowest rather than the sum. Inside a
+    transaction they run one by one on the request's connection instead,
+    since other connections would not see its uncommitted writes.
+    """
+    if not settings.FANOUT_THREADS or await sync_to_async(_hand_off)():
+        return [await sync_to_async(call)() for call in calls]
+    loop = asyncio.get_running_loop()
+    # Copy the context so request-scoped state such as the query recorder follows
+    return await asyncio.gather(*(
+        loop.run_in_executor(get_executor(), functools.partial(contextvars.copy_context().run, _run, call))
+        for call in calls
+    ))
@@ -0,0 +1,61 @@
+from django.utils import timezone
+
+from .models import LeaderboardEntry, DailyStudyRollup, UserProfile
+from .rollups import rebuild_leaderboards
+from .timezones import period_start, school_zone
+
+
+def leaderboard(school, period, now=None, grade=None, olympiad_field=None, limit=10):
+    """
+    Top `limit` students of `school` for the current day, week or month.
+
+    Reads walk the (school, period, period_start[, grade | olympiad_field],
+    -total_seconds) indexes of LeaderboardEntry, so the cost is one index
+    seek plus `limit` rows however large the school is.
+    """
+    start = period_start(timezone.localdate(now or timezone.now(), school_zone(school)), period)
+    entries = LeaderboardEntry.objects.filter(school=school, period=period, period_start=start)
+    if grade:
+        entries = entries.filter(grade=grade)
+    if olympiad_field:
+        entries = entries.filter(olympiad_field=olympiad_field)
+
+    rows = entries.order_by('-total_seconds', 'user_id').values(
+        'user_id', 'user__profile__full_name', 'user__profile__phone_number',
+        'grade', 'olympiad_field', 'total_seconds'
+    )[:limit]
+    return {
+        'period': period,
+        'period_start': start,
+        'entries': [
+            {
+                'rank': rank,
+                'user_id': row['user_id'],
+                'full_name': row['user__profile__full_name'] or row['user__profile__phone_number'],
+                'grade': row['grade'],
+                'olympiad_field': row['olympiad_field'],
+                'total_seconds': row['total_seconds'],
+            }
+            for rank, row in enumerate(rows, start=1)
+        ],
+    }
+
+
+def sync_member(profile, moved=False):
+    """
+    Bring a student's entries in line with their profile.
+
+    Grade and olympiad changes are copied onto the existing rows. A student
+    who `moved` school or became a student has their entries rebuilt from
+    the rollups, so study done before the move still counts.
+    """
+    entries = LeaderboardEntry.objects.filter(user_id=profile.user_id)
+    if profile.role != 'student' or profile.school_id is None:
+        entries.delete()
+    elif moved:
+        rebuild_leaderboards(DailyStudyRollup, LeaderboardEntry, UserProfile, users=[profile.user_id])
+    else:
+        entries.exclude(
+            grade=profile.grade,
+            olympiad_field=profile.olympiad_field
+        ).update(grade=profile.grade, olympiad_field=profile.olympiad_field)
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import logging
+import secrets
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .aggregates import aschool_kpis, school_kpis
+from .authentication import CachedJWTAuthentication
+from .cache import acached, cached, generation, get_cache
+from .presence import get_presence_store
+from .timezones import school_zone
+
+
+logger = logging.getLogger(__name__)
+
+
+def current_kpis(school):
+    """Cached school KPIs with active_now read live from the presence store"""
+    data = cached('manager_kpi', 'school', school.id, lambda: school_kpis(school), zone=school_zone(school))
+    # Presence changes far more often than the cached aggregates
+    return {**data, 'active_now': get_presence_store().active_count(school.id)}
+
+
+async def acurrent_kpis(school):
+    """current_kpis() for async views"""
+    data = await acached(
+        'manager_kpi', 'school', school.id, lambda: aschool_kpis(school), zone=school_zone(school)
+    )
+    active_now = await sync_to_async(get_presence_store().active_count)(school.id)
+    return {**data, 'active_now': active_now}
+
+
+def kpi_signature(school):
+    """Cheap value that changes whenever current_kpis() may have changed"""
+    return (
+        generation('school', school.id),
+        get_presence_store().active_count(school.id),
+        timezone.localdate(timezone=school_zone(school)),
+    )
+
+
+def kpi_delta(previous, current):
+    """The keys of `current` whose values differ from `previous`"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class KPIBroadcaster:
+    """
+    Fans KPI changes of each school out to the SSE streams of this process.
+
+    A school with at least one subscriber gets one poll task which checks
+    kpi_signature() every `poll_interval` seconds and only recomputes the
+    KPIs when it changed, so the cost per tick is independent of the number
+    of connected managers. Idle subscribers cost one asyncio.Queue each.
+    """
+
+    def __init__(self, poll_interval, queue_size):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._pollers = {}
+        self._snapshots = {}
+
+    def subscriber_count(self, school_id=None):
+        if school_id is not None:
+            return len(self._subscribers.get(school_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def subscribe(self, school):
+        """Register a subscriber; returns its queue and the current snapshot"""
+        # Snapshot first: if it fails there is nothing to unregister
+        snapshot = self._snapshots.get(school.id)
+        if snapshot is None:
+            snapshot = await sync_to_async(current_kpis)(school)
+            snapshot = self._snapshots.setdefault(school.id, snapshot)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[school.id].add(queue)
+        if school.id not in self._pollers:
+            poller = self._pollers[school.id] = asyncio.create_task(self._poll(school))
+            poller.add_done_callback(lambda task: self._poller_done(school.id, task))
+        return queue, snapshot
+
+    def unsubscribe(self, school_id, queue):
+        queues = self._subscribers.get(school_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[school_id]
+            self._snapshots.pop(school_id, None)
+            poller = self._pollers.pop(school_id, None)
+            if poller is not None:
+                poller.cancel()
+
+    def publish(self, school_id, event, data):
+        for queue in self._subscribers.get(school_id, ()):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # A slow client loses its backlog and resyncs from a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('snapshot', self._snapshots[school_id]))
+
+    def _check(self, school, signature):
+        """Return the current signature and, if it moved, fresh KPIs"""
+        # Streams live outside Django's request cycle, which normally recycles connections
+        close_old_connections()
+        current_signature = kpi_signature(school)
+        if current_signature == signature:
+            return signature, None
+        return current_signature, current_kpis(school)
+
+    async def _poll(self, school):
+        signature = None
+        failures = 0
+        check = sync_to_async(self._check)
+        while True:
+            try:
+                signature, snapshot = await check(school, signature)
+            except Exception:
+                # e.g. the database went away; keep the streams open and retry
+                failures += 1
+                signature = None
+                delay = min(self.poll_interval * 2 ** failures, settings.LIVE_ERROR_BACKOFF)
+                logger.exception('KPI poll of school %s failed, retrying in %.0fs', school.id, delay)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            if snapshot is not None:
+                delta = kpi_delta(self._snapshots.get(school.id, {}), snapshot)
+                self._snapshots[school.id] = snapshot
+                if delta:
+                    self.publish(school.id, 'delta', delta)
+            await asyncio.sleep(self.poll_interval)
+
+    def _poller_done(self, school_id, task):
+        if self._pollers.get(school_id) is task:
+            # Let the next subscriber start a new one
+            del self._pollers[school_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('KPI poller of school %s stopped', school_id, exc_info=task.exception())
+
+
+_broadcaster = None
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = KPIBroadcaster(settings.LIVE_POLL_INTERVAL, settings.LIVE_QUEUE_SIZE)
+    return _broadcaster
+
+
+def issue_stream_ticket(user):
+    """
+    A single-use ticket that lets `user` open the KPI stream within
+    LIVE_TICKET_TTL seconds. EventSource cannot set headers, and the access
+    token must not end up in URLs and access logs, so browsers connect with
+    one of these in the `ticket` query parameter instead.
+    """
+    ticket = secrets.token_urlsafe(32)
+    get_cache().set(f'stream_ticket:{ticket}', user.id, settings.LIVE_TICKET_TTL)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """The user a ticket was issued to, or None; a ticket works only once"""
+    cache = get_cache()
+    key = f'stream_ticket:{ticket}'
+    user_id = cache.get(key)
+    # Only the request whose delete succeeded gets in
+    if user_id is None or not cache.delete(key):
+        return None
+    return User.objects.select_related('profile__school').filter(pk=user_id, is_active=True).first()
+
+
+def _token_user(token):
+    authenticator = CachedJWTAuthentication()
+    try:
+        return authenticator.get_user(authenticator.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def stream_principal(scope):
+    """
+    Resolve the school a stream request may watch, from a `ticket` query
+    parameter or an Authorization: Bearer header.
+
+    Returns (user, school): user is None when neither is valid and school
+    is None when the user is not a manager of a school.
+    """
+    close_old_connections()
+    query = parse_qs(scope.get('query_string', b'').decode())
+    prefix, _, token = dict(scope.get('headers', [])).get(b'authorization', b'').decode().partition(' ')
+    if query.get('ticket'):
+        user = redeem_stream_ticket(query['ticket'][0])
+    elif prefix == 'Bearer' and token:
+        user = _token_user(token)
+    else:
+        user = None
+    if user is None:
+        return None, None
+    profile = getattr(user, 'profile', None)
+    if profile is None or profile.role != 'manager':
+        return user, None
+    return user, profile.school
+
+
+def _cors_headers(scope):
+    origin = dict(scope.get('headers', [])).get(b'origin')
+    if origin is None:
+        return []
+    allowed = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or \
+        origin.decode() in getattr(settings, 'CORS_ALLOWED_ORIGINS', [])
+    return [(b'access-control-allow-origin', origin)] if allowed else []
+
+
+async def _send_json(send, scope, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *_cors_headers(scope)],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def kpi_stream(scope, receive, send, keepalive=None):
+    """
+    Server-Sent Events stream of the manager dashboard KPIs: a `snapshot`
+    event on connect, then `delta` events holding only the changed fields.
+
+    A plain ASGI app rather than a Django view: Django gives every request
+    its own executor thread for as long as the response runs, which would
+    cost a thread per idle stream.
+    """
+    keepalive = settings.LIVE_KEEPALIVE if keepalive is None else keepalive
+    if scope['method'] != 'GET':
+        await _send_json(send, scope, 405, {'error': 'Method not allowed'})
+        return
+
+    user, school = await sync_to_async(stream_principal)(scope)
+    if user is None:
+        await _send_json(send, scope, 401, {'error': 'احراز هویت نامعتبر است'})
+        return
+    if school is None:
+        await _send_json(send, scope, 403, {'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'})
+        return
+
+    broadcaster = get_broadcaster()
+    queue, snapshot = await broadcaster.subscribe(school)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                # Tell nginx not to buffer the stream
+                (b'x-accel-buffering', b'no'),
+                *_cors_headers(scope),
+            ],
+        })
+        chunk = f"retry: {settings.LIVE_RETRY_MS}\n" + sse_event('snapshot', snapshot)
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            next_event = asyncio.ensure_future(queue.get())
+            await asyncio.wait({next_event, disconnected}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                chunk = sse_event(*next_event.result())
+            else:
+                next_event.cancel()
+                if disconnected.done():
+                    break
+                # Comment line, keeps proxies from closing an idle connection
+                chunk = ': keepalive\n\n'
+    except OSError:
+        # The client went away while we were writing
+        pass
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(school.id, queue)
+
+
+class LiveStreamRouter:
+    """ASGI app serving the KPI stream itself and every other request through Django"""
+
+    def __init__(self, application, path=None):
+        self.application = application
+        self.path = path or settings.LIVE_STREAM_PATH
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await kpi_stream(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
@@ -0,0 +1,266 @@
+import json
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import urls as api_urls
+from api.cache import get_cache
+from api.models import UserProfile, Subject
+from api.reports import submit_report, run_job
+from api.seeding import seed_dataset
+from api.timers import start_timer
+
+
+BENCH_PASSWORD = 'Bench12345!'
+
+# URL name -> (method, role, url kwargs, request data). Role is None for
+# anonymous calls; kwargs and data are built from the seeded fixture.
+CASES = {
+    'check_phone': ('post', None, None, lambda f: {'phone_number': f.student.username}),
+    'register': ('post', None, None, lambda f: {
+        'phone_number': '09990000001', 'password': BENCH_PASSWORD, 'password_confirm': BENCH_PASSWORD
+    }),
+    'login': ('post', None, None, lambda f: {'phone_number': f.student.username, 'password': BENCH_PASSWORD}),
+    'request_otp': ('post', None, None, lambda f: {'phone_number': '09990000002'}),
+    'phone_login': ('post', None, None, lambda f: {'phone_number': '09990000003', 'otp': '12345'}),
+    'user_profile': ('get', 'student', None, None),
+    'update_study_status': ('post', 'student', None, lambda f: {'is_studying': True}),
+    'study_heartbeat': ('post', 'student', None, None),
+    'timer_state': ('get', 'student', None, None),
+    # The fixture's student has a timer open; the manager has none to conflict with
+    'timer_start': ('post', 'manager', None, lambda f: {'subject_name': 'benchmark'}),
+    'timer_pause': ('post', 'student', None, None),
+    'timer_resume': ('post', 'student', None, None),
+    'timer_stop': ('post', 'student', None, None),
+    'subject_list': ('get', 'student', None, None),
+    'subject_detail': ('get', 'student', lambda f: {'pk': f.subject.pk}, None),
+    'study_sessions': ('get', 'student', None, None),
+    'study_sessions_bulk': ('post', 'student', None, lambda f: {'sessions': [
+        {
+            'client_id': str(uuid.uuid4()),
+            'subject_name': f.subject.name,
+            'start_time': (f.now - timezone.timedelta(hours=i + 1)).isoformat(),
+            'end_time': (f.now - timezone.timedelta(hours=i + 1) + timezone.timedelta(minutes=40)).isoformat(),
+        }
+        for i in range(20)
+    ]}),
+    'dashboard_stats': ('get', 'student', None, None),
+    'dashboard_analytics': ('get', 'student', None, None),
+    'create_ticket': ('post', 'student', None, lambda f: {'message': 'benchmark', 'request_call': False}),
+    'manager_dashboard_kpi': ('get', 'manager', None, None),
+    'manager_kpi_trend': ('get', 'manager', None, None),
+    'manager_stream_ticket': ('post', 'manager', None, None),
+    'manager_leaderboard': ('get', 'manager', None, None),
+    'manager_live_sessions': ('get', 'manager', None, None),
+    'manager_student_list': ('get', 'manager', None, None),
+    'manager_student_profile': ('get', 'manager', lambda f: {'user_id': f.student.pk}, None),
+    'manager_export_excel': ('get', 'manager', None, None),
+    'manager_student_pdf': ('get', 'manager', lambda f: {'user_id': f.student.pk}, None),
+    'manager_report_create': ('post', 'manager', None, lambda f: {'kind': 'excel'}),
+    'manager_report_detail': ('get', 'manager', lambda f: {'job_id': f.job.pk}, None),
+    'manager_report_download': ('get', 'manager', lambda f: {'job_id': f.job.pk}, None),
+    'superadmin_schools': ('get', 'superadmin', None, None),
+    'superadmin_school_detail': ('get', 'superadmin', lambda f: {'pk': f.school.pk}, None),
+    'superadmin_assign_manager': ('post', 'superadmin', lambda f: {'school_id': f.school.pk},
+                                  lambda f: {'phone_number': '09990000004'}),
+    'superadmin_school_members': ('get', 'superadmin', lambda f: {'school_id': f.school.pk}, None),
+    'superadmin_cache_stats': ('get', 'superadmin', None, None),
+    'superadmin_request_metrics': ('get', 'superadmin', None, None),
+    'superadmin_db_pool': ('get', 'superadmin', None, None),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a deterministic dataset, call every endpoint of api/urls.py through the '
+        'test client and report query counts and latency. --save writes the results '
+        'as a JSON baseline; --compare fails on regressions against one. Seeded data '
+        'and every write made by the calls are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=2)
+        parser.add_argument('--students', type=int, default=200, help='Students per school')
+        parser.add_argument('--sessions', type=int, default=60, help='Sessions per student')
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed calls per endpoint')
+        parser.add_argument('--warm', action='store_true',
+                            help='Keep the stats cache between calls instead of measuring cold requests')
+        parser.add_argument('--only', nargs='+', help='Benchmark only these URL names')
+        parser.add_argument('--save', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against')
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help='Allowed relative p50 latency increase (0.5 = 50%%)')
+        parser.add_argument('--min-ms', type=float, default=5,
+                            help='Latency increases below this many ms are never regressions')
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in api_urls.urlpatterns if pattern.name]
+        missing = [name for name in names if name not in CASES]
+        if missing:
+            raise CommandError(f'No benchmark case for: {", ".join(missing)}')
+        if options['only']:
+            names = [name for name in names if name in options['only']]
+
+        baseline = None
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+
+        # Like the test runner, let the test client's 'testserver' host through
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        # A private cache: the run clears it before every cold call, and its
+        # entries describe rolled-back data, so the shared one is left alone
+        caches = {**settings.CACHES, settings.STATS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark-endpoints',
+        }}
+        with tempfile.TemporaryDirectory() as report_root, \
+                override_settings(REPORT_ROOT=Path(report_root), ALLOWED_HOSTS=hosts, CACHES=caches):
+            try:
+                with transaction.atomic():
+                    fixture = self.build_fixture(options)
+                    results = {name: self.measure(name, fixture, options) for name in names}
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        self.report(results, baseline)
+        document = {
+            'dataset': {key: options[key] for key in ('schools', 'students', 'sessions', 'days', 'seed')},
+            'repeat': options['repeat'],
+            'warm': options['warm'],
+            'endpoints': results,
+        }
+        if options['save']:
+            Path(options['save']).parent.mkdir(parents=True, exist_ok=True)
+            Path(options['save']).write_text(json.dumps(document, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Saved results to {options["save"]}')
+        if baseline is not None:
+            regressions = self.regressions(results, baseline['endpoints'], options)
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def build_fixture(self, options):
+        now = timezone.now()
+        schools = seed_dataset(
+            options['schools'], options['students'], options['sessions'],
+            days=options['days'], seed=options['seed'], prefix='bench', now=now
+        )
+        school = schools[0]
+        student_profile = UserProfile.objects.select_related('user').filter(
+            school=school, role='student'
+        ).order_by('id').first()
+        student = student_profile.user
+        student.set_password(BENCH_PASSWORD)
+        student.save()
+        manager = UserProfile.objects.select_related('user').get(school=school, role='manager').user
+        superadmin = UserProfile.objects.create(
+            user=student.__class__.objects.create(username='bench-superadmin'),
+            phone_number='09990000000',
+            is_superadmin=True
+        ).user
+        start_timer(student, subject_name='benchmark', now=now - timezone.timedelta(minutes=20))
+        job = run_job(submit_report('excel', manager, school, {
+            'start_date': (now - timezone.timedelta(days=30)).date().isoformat(),
+            'end_date': now.date().isoformat(),
+        }))
+        return SimpleNamespace(
+            now=now,
+            school=school,
+            student=student,
+            subject=Subject.objects.filter(user=student).order_by('id').first(),
+            manager=manager,
+            superadmin=superadmin,
+            job=job,
+            clients=self.build_clients(student=student, manager=manager, superadmin=superadmin),
+        )
+
+    def build_clients(self, **users):
+        # One client per role: every new client builds its own middleware
+        # chain (WhiteNoise scans the static files), which would swamp the
+        # timings of fast endpoints.
+        clients = {None: APIClient()}
+        for role, user in users.items():
+            clients[role] = APIClient()
+            clients[role].credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return clients
+
+    def call(self, name, fixture):
+        method, role, kwargs, data = CASES[name]
+        client = fixture.clients[role]
+        url = reverse(name, kwargs=kwargs(fixture) if kwargs else None)
+        payload = data(fixture) if data else None
+        response = getattr(client, method)(url, payload, format='json')
+        # The test client closes the response itself, with close_old_connections
+        # unhooked; closing it again would end the rolled-back transaction
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, name, fixture, options):
+        timings = []
+        queries = []
+        status = None
+        # The first call is a warm-up (imports, template and URL caches)
+        for iteration in range(options['repeat'] + 1):
+            if not options['warm']:
+                get_cache().clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = self.call(name, fixture)
+                    elapsed = (time.perf_counter() - started) * 1000
+                transaction.set_rollback(True)
+            if response.status_code >= 500:
+                raise CommandError(f'{name} returned {response.status_code}')
+            if iteration:
+                timings.append(elapsed)
+                queries.append(len(captured))
+                status = response.status_code
+        return {
+            'status': status,
+            'queries': max(queries),
+            'p50_ms': round(statistics.median(timings), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def report(self, results, baseline):
+        previous = baseline['endpoints'] if baseline else {}
+        self.stdout.write(f'{"endpoint":<28} {"status":>6} {"queries":>8} {"p50 ms":>9} {"max ms":>9} {"base p50":>9}')
+        for name, row in results.items():
+            base = previous.get(name, {}).get('p50_ms')
+            base = f'{base:>9.2f}' if base is not None else f'{"-":>9}'
+            self.stdout.write(
+                f'{name:<28} {row["status"]:>6} {row["queries"]:>8} {row["p50_ms"]:>9.2f} {row["max_ms"]:>9.2f} {base}'
+            )
+
+    def regressions(self, results, baseline, options):
+        found = []
+        for name, row in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if row['queries'] > base['queries']:
+                found.append(f'{name}: {row["queries"]} queries (baseline {base["queries"]})')
+            slower = row['p50_ms'] - base['p50_ms']
+            if slower > options['min_ms'] and row['p50_ms'] > base['p50_ms'] * (1 + options['threshold']):
+                found.append(f'{name}: p50 {row["p50_ms"]:.2f} ms (baseline {base["p50_ms"]:.2f} ms)')
+        return found
@@ -0,0 +1,61 @@
+import time
+import tempfile
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.exports import student_report_rows, write_student_report
+from api.seeding import seed_school
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure peak Python memory and wall time of the streaming Excel export '
+        'for seeded schools of increasing size. Seeded data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                            help='Roster sizes to benchmark')
+        parser.add_argument('--sessions', type=int, default=5,
+                            help='Sessions to seed per student')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"students":>10} {"seconds":>10} {"peak KiB":>10} {"file KiB":>10}')
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    school = seed_school(f'Export benchmark {size}', size, options['sessions'],
+                                         prefix=f'export-bench-{size}')
+                    elapsed, peak, file_size = self.measure(school)
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(f'{size:>10} {elapsed:>10.2f} {peak / 1024:>10.0f} {file_size / 1024:>10.0f}')
+
+    def measure(self, school):
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=30)
+
+        # Untraced run for wall time (also warms up imports)
+        with tempfile.TemporaryFile() as report:
+            started = time.perf_counter()
+            write_student_report(report, student_report_rows(school, start_date, end_date))
+            elapsed = time.perf_counter() - started
+            file_size = report.tell()
+
+        # Traced run for peak allocations
+        with tempfile.TemporaryFile() as report:
+            tracemalloc.start()
+            write_student_report(report, student_report_rows(school, start_date, end_date))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return elapsed, peak, file_size
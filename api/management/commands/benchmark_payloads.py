@@ -0,0 +1,115 @@
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.compression import available_encodings, compress
+from api.renderers import ColumnarJSONRenderer
+
+from .benchmark_endpoints import CASES, Command as EndpointBenchmark, _Rollback
+
+
+# Read endpoints whose payloads are lists of rows
+DEFAULT_NAMES = [
+    'subject_list', 'study_sessions', 'dashboard_analytics', 'manager_leaderboard',
+    'manager_student_list', 'manager_student_profile', 'superadmin_schools',
+]
+
+RENDERERS = {
+    'json': JSONRenderer(),
+    'columnar': ColumnarJSONRenderer(),
+}
+
+
+class Command(EndpointBenchmark):
+    help = (
+        'Seed the benchmark_endpoints dataset, fetch the payload of each list endpoint '
+        'and report its size and rendering time as plain JSON (what Response sends '
+        'today) and as columnar JSON, each raw and compressed with every available '
+        'content coding. Seeded data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=1)
+        parser.add_argument('--students', type=int, default=200, help='Students per school')
+        parser.add_argument('--sessions', type=int, default=60, help='Sessions per student')
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed renders per payload')
+        parser.add_argument('--only', nargs='+', help='Benchmark only these URL names')
+        parser.add_argument('--save', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        names = options['only'] or DEFAULT_NAMES
+        unknown = [name for name in names if name not in CASES or CASES[name][0] != 'get']
+        if unknown:
+            raise CommandError(f'Not a benchmarked GET endpoint: {", ".join(unknown)}')
+
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with tempfile.TemporaryDirectory() as report_root, \
+                override_settings(REPORT_ROOT=Path(report_root), ALLOWED_HOSTS=hosts):
+            try:
+                with transaction.atomic():
+                    fixture = self.build_fixture(options)
+                    payloads = {name: self.payload(name, fixture) for name in names}
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        results = {name: self.measure_payload(data, options['repeat']) for name, data in payloads.items()}
+        self.report(results)
+        if options['save']:
+            document = {
+                'dataset': {key: options[key] for key in ('schools', 'students', 'sessions', 'days', 'seed')},
+                'repeat': options['repeat'],
+                'payloads': results,
+            }
+            Path(options['save']).parent.mkdir(parents=True, exist_ok=True)
+            Path(options['save']).write_text(json.dumps(document, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Saved results to {options["save"]}')
+
+    def payload(self, name, fixture):
+        response = self.call(name, fixture)
+        if response.status_code != 200:
+            raise CommandError(f'{name} returned {response.status_code}')
+        return response.data
+
+    def measure_payload(self, data, repeat):
+        result = {}
+        for format_name, renderer in RENDERERS.items():
+            body, render_ms = self.timed(lambda: renderer.render(data), repeat)
+            row = {'bytes': len(body), 'render_ms': render_ms}
+            for encoding in available_encodings():
+                compressed, compress_ms = self.timed(lambda: compress(body, encoding), repeat)
+                row[encoding] = {'bytes': len(compressed), 'compress_ms': compress_ms}
+            result[format_name] = row
+        return result
+
+    @staticmethod
+    def timed(work, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = work()
+            timings.append((time.perf_counter() - started) * 1000)
+        return output, round(statistics.median(timings), 3)
+
+    def report(self, results):
+        encodings = available_encodings()
+        header = f'{"endpoint":<26} {"format":<9} {"bytes":>9} {"render ms":>10}'
+        for encoding in encodings:
+            header += f' {encoding + " bytes":>11} {encoding + " ms":>9}'
+        self.stdout.write(header)
+        for name, formats in results.items():
+            for format_name, row in formats.items():
+                line = f'{name:<26} {format_name:<9} {row["bytes"]:>9} {row["render_ms"]:>10.3f}'
+                for encoding in encodings:
+                    line += f' {row[encoding]["bytes"]:>11} {row[encoding]["compress_ms"]:>9.3f}'
+                self.stdout.write(line)
@@ -0,0 +1,103 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import StudySession, Subject
+from api.readers import values_serializer
+from api.serializers import ManagerStudentListSerializer, StudySessionSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark of the list serializers: render N in-memory rows with the DRF '
+        'serializer and with its ValuesSerializer twin, check that both produce the same '
+        'JSON bytes and report the timings. Nothing touches the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        now = timezone.now()
+        cases = {
+            'study_sessions': (StudySessionSerializer, *self.session_rows(rows, now)),
+            'manager_student_list': (ManagerStudentListSerializer, *self.student_rows(rows, now)),
+        }
+
+        self.stdout.write(f'{"serializer":<22} {"rows":>7} {"drf ms":>9} {"values ms":>10} {"speedup":>8}')
+        for name, (serializer_class, instances, values) in cases.items():
+            drf_data, drf_ms = self.timed(lambda: serializer_class(instances, many=True).data, options['repeat'])
+            reader = values_serializer(serializer_class)
+            fast_data, fast_ms = self.timed(lambda: reader.render(values), options['repeat'])
+            if JSONRenderer().render(drf_data) != JSONRenderer().render(fast_data):
+                raise CommandError(f'{name}: ValuesSerializer output differs from {serializer_class.__name__}')
+            self.stdout.write(
+                f'{name:<22} {rows:>7} {drf_ms:>9.2f} {fast_ms:>10.2f} {drf_ms / max(fast_ms, 1e-6):>7.1f}x'
+            )
+
+    @staticmethod
+    def timed(work, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = work()
+            timings.append((time.perf_counter() - started) * 1000)
+        return output, statistics.median(timings)
+
+    def session_rows(self, count, now):
+        subjects = [Subject(id=i + 1, name=f'درس {i}', color_code='#10b981') for i in range(8)]
+        instances = []
+        for i in range(count):
+            start = now - timedelta(minutes=45 * i)
+            instances.append(StudySession(
+                id=i + 1,
+                subject=subjects[i % len(subjects)],
+                description='' if i % 3 else 'مرور فصل',
+                start_time=start,
+                end_time=start + timedelta(minutes=40) if i % 50 else None,
+                duration_seconds=2400,
+                is_valid=bool(i % 7),
+                client_id=uuid.UUID(int=i) if i % 2 else None,
+            ))
+        values = [
+            {
+                'id': session.id,
+                'subject': session.subject.id,
+                'subject__name': session.subject.name,
+                'subject__color_code': session.subject.color_code,
+                'description': session.description,
+                'start_time': session.start_time,
+                'end_time': session.end_time,
+                'duration_seconds': session.duration_seconds,
+                'is_valid': session.is_valid,
+                'client_id': session.client_id,
+            }
+            for session in instances
+        ]
+        return instances, values
+
+    def student_rows(self, count, now):
+        rows = [
+            {
+                'user_id': i + 1,
+                'full_name': f'دانش‌آموز {i}',
+                'phone_number': f'0913{i:07d}',
+                'grade': ('10', '11', '12')[i % 3],
+                'olympiad_field': None if i % 4 else 'math',
+                'today_total': (i * 97) % 7200,
+                'week_total': (i * 331) % 36000,
+                'trend': ('up', 'down', 'stable')[i % 3],
+                'trend_percent': round((i % 400) / 3 - 50, 1),
+                'last_activity': now - timedelta(minutes=i) if i % 10 else None,
+            }
+            for i in range(count)
+        ]
+        # The DRF path reads the same dicts, which is what ManagerStudentListView did
+        return rows, rows
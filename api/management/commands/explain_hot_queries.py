@@ -0,0 +1,98 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.models import UserProfile, StudySession, DailyStudyRollup
+from api.aggregates import study_windows, kpi_days, rollup_days
+from api.seeding import seed_school
+from api.timezones import school_zone
+
+
+# Tables the hot queries read; a full scan of any of them fails the check
+HOT_TABLES = r'(api_studysession|api_dailystudyrollup|api_schooldailykpi)'
+
+SEQ_SCAN_PATTERNS = [
+    re.compile(rf'Seq Scan on {HOT_TABLES}\b'),                 # PostgreSQL
+    re.compile(rf'\bSCAN (TABLE )?{HOT_TABLES}\b(?! USING)'),  # SQLite
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the hot dashboard queries and fail if any of them '
+        'falls back to a sequential scan of the session, rollup or KPI tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=300,
+                            help='Students to seed in a throwaway school')
+        parser.add_argument('--sessions', type=int, default=40,
+                            help='Sessions to seed per student')
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Explain against the existing data instead of a seeded dataset')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['no_seed']:
+            failures = self.explain_all(*self.pick_targets())
+        else:
+            try:
+                with transaction.atomic():
+                    self.seed(options['students'], options['sessions'])
+                    failures = self.explain_all(*self.pick_targets())
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        if failures:
+            raise CommandError(
+                'Sequential scan of a hot table in: ' + ', '.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index'))
+
+    def seed(self, student_count, sessions_per_student):
+        seed_school('EXPLAIN seed school', student_count, sessions_per_student, prefix='explain-seed')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def pick_targets(self):
+        profile = UserProfile.objects.filter(role='student', school__isnull=False).order_by('-id').first()
+        if profile is None:
+            raise CommandError('No student with a school to explain against; drop --no-seed')
+        return profile.user, profile.school
+
+    def hot_queries(self, user, school):
+        return {
+            # DashboardStatsView, StudentAnalyticsView: user_rollup_stats()
+            # aggregates these rows, which EXPLAIN cannot run on directly
+            'dashboard.stats': DailyStudyRollup.objects.filter(user=user).values_list(
+                'date', 'total_seconds', 'session_count'),
+            # ManagerDashboardKPIView: school_kpis()
+            'kpi.days': kpi_days(school, study_windows(zone=school_zone(school))),
+            # ManagerStudentProfileView
+            'profile.recent_sessions': StudySession.objects.filter(
+                user=user).select_related('subject').order_by('-start_time')[:10],
+            'profile.subjects': DailyStudyRollup.objects.filter(user=user).values(
+                'subject__name', 'subject__color_code').annotate(
+                total_seconds=Sum('total_seconds')).order_by('-total_seconds'),
+            'profile.days': rollup_days(user),
+        }
+
+    def explain_all(self, user, school):
+        failures = []
+        for name, queryset in self.hot_queries(user, school).items():
+            plan = queryset.explain()
+            scanned = any(p.search(plan) for p in SEQ_SCAN_PATTERNS)
+            if scanned:
+                failures.append(name)
+            label = self.style.ERROR('SEQ SCAN') if scanned else self.style.SUCCESS('ok')
+            self.stdout.write(f'{name}: {label}')
+            if self.verbosity > 1:
+                self.stdout.write(plan)
+        return failures
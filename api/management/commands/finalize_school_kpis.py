@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from api.daily_kpis import finalize_days
+from api.models import DailyStudyRollup, School, SchoolDailyKPI, UserProfile
+from api.rollups import rebuild_school_kpis
+
+
+class Command(BaseCommand):
+    help = (
+        'Finalize SchoolDailyKPI rows of the days before each school\'s local today: '
+        'recompute them from the rollups and record the roster size. Run it daily '
+        'from cron, after midnight in the schools\' timezones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, action='append', dest='schools',
+                            help='Only this school id (repeatable)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute finalized days too, e.g. after rebuilding the rollups')
+
+    def handle(self, *args, **options):
+        schools = School.objects.all()
+        if options['schools']:
+            schools = schools.filter(pk__in=options['schools'])
+
+        if options['rebuild']:
+            written = rebuild_school_kpis(
+                DailyStudyRollup, SchoolDailyKPI, UserProfile, School, schools=schools.values_list('pk', flat=True)
+            )
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} school KPI days'))
+            return
+
+        total = 0
+        for school in schools:
+            written = finalize_days(school)
+            if written:
+                self.stdout.write(f'{school.name}: finalized {written} days')
+            total += written
+        self.stdout.write(self.style.SUCCESS(f'Finalized {total} school KPI days'))
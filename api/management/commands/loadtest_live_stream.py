@@ -0,0 +1,137 @@
+import asyncio
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def _rss_kib(pid):
+    """Resident set size of a local process from /proc, or None"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many concurrent connections to manager/dashboard/stream/ on a running '
+        'ASGI server and report connect latency, events received, failures and, with '
+        '--server-pid, the server memory per idle connection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Base URL of the ASGI server')
+        parser.add_argument('--manager', help='Phone number of a manager to mint a token for')
+        parser.add_argument('--token', help='Access token to use instead of --manager')
+        parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000],
+                            help='Connection counts to ramp through')
+        parser.add_argument('--batch', type=int, default=200,
+                            help='Connections opened concurrently while ramping')
+        parser.add_argument('--hold', type=float, default=10,
+                            help='Seconds to keep every connection open at each step')
+        parser.add_argument('--server-pid', type=int,
+                            help='PID of the server process, to sample its RSS')
+
+    def handle(self, *args, **options):
+        token = options['token']
+        if not token:
+            if not options['manager']:
+                raise CommandError('Pass --manager or --token')
+            try:
+                user = User.objects.get(username=options['manager'], profile__role='manager')
+            except User.DoesNotExist:
+                raise CommandError(f'No manager with phone number {options["manager"]}')
+            token = str(RefreshToken.for_user(user).access_token)
+
+        # Every connection is a file descriptor on this side too
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = max(options['connections']) + 100
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+        self.stdout.write(
+            f'{"conns":>7} {"open":>7} {"failed":>7} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"events":>7} {"rss MiB":>8} {"KiB/conn":>9}'
+        )
+        for count in options['connections']:
+            row = asyncio.run(self.step(options, token, count))
+            self.stdout.write(
+                f'{count:>7} {row["open"]:>7} {row["failed"]:>7} {row["p50"]:>8.1f} {row["p95"]:>8.1f} '
+                f'{row["events"]:>7} {row["rss"]:>8} {row["per_conn"]:>9}'
+            )
+
+    async def step(self, options, token, count):
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        request = (
+            f'GET {url.path.rstrip("/")}/api/manager/dashboard/stream/ HTTP/1.1\r\n'
+            f'Host: {url.netloc}\r\nAuthorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n'
+        ).encode()
+        rss_before = _rss_kib(options['server_pid']) if options['server_pid'] else None
+
+        latencies = []
+        events = [0]
+        streams = []
+        failed = 0
+
+        async def connect():
+            started = time.perf_counter()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            if b' 200 ' not in status_line:
+                writer.close()
+                raise ConnectionError(status_line.decode().strip())
+            # Wait for the initial snapshot event
+            while not (await reader.readline()).startswith(b'event: snapshot'):
+                pass
+            latencies.append((time.perf_counter() - started) * 1000)
+            return reader, writer
+
+        async def drain(reader):
+            while line := await reader.readline():
+                if line.startswith(b'event: '):
+                    events[0] += 1
+
+        for offset in range(0, count, options['batch']):
+            batch = min(options['batch'], count - offset)
+            results = await asyncio.gather(*(connect() for _ in range(batch)), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    failed += 1
+                else:
+                    streams.append(result)
+
+        readers = [asyncio.create_task(drain(reader)) for reader, _ in streams]
+        await asyncio.sleep(options['hold'])
+        rss_after = _rss_kib(options['server_pid']) if options['server_pid'] else None
+
+        for task in readers:
+            task.cancel()
+        for _, writer in streams:
+            writer.close()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+        per_conn = '-'
+        if rss_before is not None and rss_after is not None and streams:
+            per_conn = f'{(rss_after - rss_before) / len(streams):.1f}'
+        return {
+            'open': len(streams),
+            'failed': failed,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p95': statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0,
+            'events': events[0],
+            'rss': f'{rss_after / 1024:.0f}' if rss_after is not None else '-',
+            'per_conn': per_conn,
+        }
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+# Endpoints served by async views: URL name -> role that calls it
+ENDPOINTS = {
+    'dashboard_stats': 'student',
+    'manager_dashboard_kpi': 'manager',
+    'manager_student_profile': 'manager',
+}
+
+
+async def listening(host, port):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 1)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def fetch(host, port, raw):
+    """Send one request on a fresh connection and return its status code"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        # Connection: close, so the server ends the response by closing
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the WSGI and ASGI deployments (SERVER_MODE, see gunicorn.conf.py) on the '
+        'endpoints served by async views: run closed-loop concurrent clients against each '
+        'server and report requests per second and latency per concurrency level. Point it '
+        'at running servers with --wsgi-url/--asgi-url, or let --spawn start both against '
+        'this database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--manager', required=True,
+                            help='Phone number of a manager; their school is the one read')
+        parser.add_argument('--student', help='Phone number of a student of that school (default: the first)')
+        parser.add_argument('--wsgi-url', help='Base URL of a running SERVER_MODE=wsgi server')
+        parser.add_argument('--asgi-url', help='Base URL of a running SERVER_MODE=asgi server')
+        parser.add_argument('--spawn', action='store_true',
+                            help='Start both servers with gunicorn on --port and --port + 1')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers per spawned server')
+        parser.add_argument('--cache', default='dummy', choices=list(settings.CACHE_BACKENDS),
+                            help="CACHE_BACKEND of spawned servers; 'dummy' makes every request hit the database")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per concurrency level')
+        parser.add_argument('--only', nargs='+', choices=list(ENDPOINTS), help='Endpoints to load')
+
+    def handle(self, *args, **options):
+        if not (options['spawn'] or options['wsgi_url'] or options['asgi_url']):
+            raise CommandError('Pass --spawn or at least one of --wsgi-url and --asgi-url')
+        try:
+            manager = User.objects.select_related('profile').get(
+                username=options['manager'], profile__role='manager'
+            )
+        except User.DoesNotExist:
+            raise CommandError(f'No manager with phone number {options["manager"]}')
+        students = User.objects.filter(profile__role='student', profile__school=manager.profile.school_id)
+        if options['student']:
+            students = students.filter(username=options['student'])
+        student = students.order_by('id').first()
+        if student is None:
+            raise CommandError("No such student in the manager's school")
+
+        tokens = {
+            'manager': str(RefreshToken.for_user(manager).access_token),
+            'student': str(RefreshToken.for_user(student).access_token),
+        }
+        paths = [
+            (reverse(name, kwargs={'user_id': student.id} if name == 'manager_student_profile' else None),
+             tokens[role])
+            for name, role in ENDPOINTS.items()
+            if not options['only'] or name in options['only']
+        ]
+
+        self.stdout.write(f'{"mode":<5} {"conc":>5} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"errors":>7}')
+        for mode in ('wsgi', 'asgi'):
+            if options['spawn']:
+                port = options['port'] + (mode == 'asgi')
+                with self.spawned(mode, port, options):
+                    self.run_levels(mode, f'http://127.0.0.1:{port}', paths, options)
+            elif options[f'{mode}_url']:
+                self.run_levels(mode, options[f'{mode}_url'], paths, options)
+
+    def run_levels(self, mode, base_url, paths, options):
+        url = urlsplit(base_url)
+        target = (url.hostname, url.port or 80)
+        requests = [
+            (
+                f'GET {url.path.rstrip("/")}{path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+                f'Authorization: Bearer {token}\r\nAccept: application/json\r\nConnection: close\r\n\r\n'
+            ).encode()
+            for path, token in paths
+        ]
+        for raw in requests:
+            status = asyncio.run(fetch(*target, raw))
+            if status != 200:
+                raise CommandError(f'{mode}: {raw.split(b" ")[1].decode()} answered {status}')
+        for concurrency in options['concurrency']:
+            row = asyncio.run(self.load(target, requests, concurrency, options['duration']))
+            self.stdout.write(
+                f'{mode:<5} {concurrency:>5} {row["rate"]:>8.1f} {row["p50"]:>8.1f} '
+                f'{row["p95"]:>8.1f} {row["errors"]:>7}'
+            )
+
+    async def load(self, target, requests, concurrency, duration):
+        latencies = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def client(position):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                raw = requests[position % len(requests)]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    status = await fetch(*target, raw)
+                except (OSError, ValueError, IndexError):
+                    status = None
+                if status == 200:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            'rate': len(latencies) / elapsed,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p95': statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0,
+            'errors': errors,
+        }
+
+    @contextmanager
+    def spawned(self, mode, port, options):
+        """A gunicorn server in `mode` on 127.0.0.1:`port`, stopped on exit"""
+        env = {**os.environ, 'SERVER_MODE': mode, 'CACHE_BACKEND': options['cache']}
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'gunicorn', '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+                    '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+                    '--access-logfile', os.devnull,
+                ],
+                cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                self.wait_for(port, process, log)
+                yield
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    def wait_for(self, port, process, log, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'Server on port {port} exited:\n{log.read().decode(errors="replace")[-2000:]}')
+            if asyncio.run(listening('127.0.0.1', port)):
+                return
+            time.sleep(0.2)
+        raise CommandError(f'Server on port {port} did not start within {timeout}s')
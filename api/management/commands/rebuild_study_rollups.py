@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import StudySession, DailyStudyRollup, LeaderboardEntry, UserProfile, School, SchoolDailyKPI
+from api.rollups import rebuild_daily_rollups, rebuild_leaderboards, rebuild_school_kpis
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyStudyRollup, LeaderboardEntry and SchoolDailyKPI tables from raw study sessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only rebuild this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_daily_rollups(
+                StudySession,
+                DailyStudyRollup,
+                users=options['users'],
+                batch_size=options['batch_size']
+            )
+            entries = rebuild_leaderboards(
+                DailyStudyRollup,
+                LeaderboardEntry,
+                UserProfile,
+                users=options['users'],
+                batch_size=options['batch_size']
+            )
+            schools = None
+            if options['users']:
+                schools = UserProfile.objects.filter(
+                    user__in=options['users'], school__isnull=False
+                ).values_list('school_id', flat=True).distinct()
+            kpis = rebuild_school_kpis(DailyStudyRollup, SchoolDailyKPI, UserProfile, School, schools=schools)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rollup rows, {entries} leaderboard entries and {kpis} school KPI days'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reports import claim_next_job, run_job, prune_artifacts
+
+
+PRUNE_INTERVAL = 3600  # seconds
+
+
+class Command(BaseCommand):
+    help = (
+        'Process queued ReportJob rows. The queue is the database table itself, '
+        'so no external broker is needed; run one or more of these next to the web workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        last_prune = 0
+        while True:
+            job = claim_next_job()
+            if job is not None:
+                run_job(job)
+                message = f'{job.kind} {job.id}: {job.status}'
+                if job.status == 'failed':
+                    self.stderr.write(f'{message} ({job.error})')
+                else:
+                    self.stdout.write(message)
+                continue
+
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                prune_artifacts()
+                last_prune = time.monotonic()
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
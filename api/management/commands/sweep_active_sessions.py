@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.timers import close_abandoned_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Close server-side timers whose client stopped sending heartbeats and save '
+        'them as study sessions. Run it from cron with --once, or leave it polling.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Sweep once and exit instead of polling')
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds between sweeps')
+
+    def handle(self, *args, **options):
+        while True:
+            for session in close_abandoned_sessions():
+                self.stdout.write(f'user {session.user_id}: saved {session.duration_seconds}s as session {session.id}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
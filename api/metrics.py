@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+METRIC_FIELDS = ('queries', 'sql_ms', 'total_ms', 'bytes')
+PERCENTILES = (50, 95, 99)
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper() hook counting queries and their time.
+
+    Thread-safe, as one request may query from several threads (see
+    api/fanout.py); overlapping queries each add their full time.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.seconds += elapsed
+                self.count += 1
+
+
+# Recorder of the request in flight. A context variable rather than a
+# per-connection wrapper because connections are thread-local: under ASGI
+# the async ORM and sync views query from executor threads, which inherit
+# the request's context but not the middleware's connection objects.
+current_recorder = ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; feeds current_recorder"""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_hook(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[rank - 1]
+
+
+class RequestMetrics:
+    """
+    Per-endpoint ring buffers of request measurements for this process.
+
+    Each endpoint keeps its last `size` samples, so memory is bounded and
+    the report reflects recent traffic rather than all-time averages.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._samples = defaultdict(lambda: deque(maxlen=self.size))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, queries, sql_ms, total_ms, size):
+        with self._lock:
+            self._samples[endpoint].append((queries, sql_ms, total_ms, size))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def report(self):
+        with self._lock:
+            samples = {endpoint: list(buffer) for endpoint, buffer in self._samples.items()}
+        report = {}
+        for endpoint, rows in sorted(samples.items()):
+            entry = {'count': len(rows)}
+            for index, field in enumerate(METRIC_FIELDS):
+                ordered = sorted(row[index] for row in rows if row[index] is not None)
+                entry[field] = {f'p{pct}': percentile(ordered, pct) for pct in PERCENTILES}
+            report[endpoint] = entry
+        return report
+
+
+_metrics = None
+
+
+def get_request_metrics():
+    global _metrics
+    if _metrics is None:
+        _metrics = RequestMetrics(settings.REQUEST_METRICS_BUFFER)
+    return _metrics
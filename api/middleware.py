@@ -0,0 +1,97 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import QueryRecorder, current_recorder, get_request_metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Record SQL query count, SQL time, wall time and response size of every
+    request routed to a named URL, keyed by that URL name.
+
+    Samples go to the in-process buffer behind superadmin/metrics/. With
+    REQUEST_METRICS_SERVER_TIMING the figures are also sent back in a
+    Server-Timing header, which browser devtools show per request.
+    Works in both the WSGI and the ASGI deployment.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    def finish(self, request, response, recorder, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = recorder.seconds * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            size = None if response.streaming else len(response.content)
+            get_request_metrics().record(match.url_name, recorder.count, sql_ms, total_ms, size)
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={sql_ms:.1f};desc="{recorder.count} queries", app;dur={total_ms:.1f}'
+            )
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain.
+
+    WhiteNoise 6 is sync-only, which under ASGI would push every request
+    through a thread hop before it reaches the async views. The file lookup
+    is a dict read (or a stat with autorefresh, run in a thread); files are
+    then served exactly as WhiteNoise does.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_add_subject_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', '-start_time'], include=('duration_seconds',), name='session_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['start_time'], name='session_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['school', 'role'], name='profile_school_role_idx'),
+        ),
+    ]
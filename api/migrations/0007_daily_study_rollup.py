@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    from api.rollups import rebuild_daily_rollups
+    rebuild_daily_rollups(
+        apps.get_model('api', 'StudySession'),
+        apps.get_model('api', 'DailyStudyRollup'),
+        timezone_path=None
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_studysession_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStudyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_seconds', models.IntegerField(default=0)),
+                ('session_count', models.IntegerField(default=0)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='api.subject')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='rollup_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystudyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'date', 'subject'), name='rollup_user_date_subject_uniq'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_report_job'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='is_studying',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_remove_is_studying'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='client_id',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='studysession',
+            constraint=models.UniqueConstraint(fields=('user', 'client_id'), name='session_user_client_uniq'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:47
+
+import api.timezones
+from django.db import migrations, models
+
+
+def rebucket_rollups(apps, schema_editor):
+    # Existing rows were bucketed by UTC day; redo them in each school's day
+    from api.rollups import rebuild_daily_rollups
+    rebuild_daily_rollups(
+        apps.get_model('api', 'StudySession'),
+        apps.get_model('api', 'DailyStudyRollup')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_studysession_client_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='timezone',
+            field=models.CharField(default='Asia/Tehran', help_text='روز مطالعه از نیمه\u200cشب این منطقه زمانی شروع می\u200cشود', max_length=64, validators=[api.timezones.validate_timezone], verbose_name='منطقه زمانی'),
+        ),
+        migrations.RunPython(rebucket_rollups, migrations.RunPython.noop),
+    ]
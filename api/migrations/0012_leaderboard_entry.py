@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_leaderboards(apps, schema_editor):
+    from api.rollups import rebuild_leaderboards
+    rebuild_leaderboards(
+        apps.get_model('api', 'DailyStudyRollup'),
+        apps.get_model('api', 'LeaderboardEntry'),
+        apps.get_model('api', 'UserProfile')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_school_timezone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'روزانه'), ('week', 'هفتگی'), ('month', 'ماهانه')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('grade', models.CharField(blank=True, max_length=20)),
+                ('olympiad_field', models.CharField(blank=True, max_length=20)),
+                ('total_seconds', models.IntegerField(default=0)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='api.school')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'period', 'period_start', '-total_seconds', 'user'], name='board_school_idx'), models.Index(fields=['school', 'period', 'period_start', 'grade', '-total_seconds', 'user'], name='board_grade_idx'), models.Index(fields=['school', 'period', 'period_start', 'olympiad_field', '-total_seconds', 'user'], name='board_olympiad_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='board_user_period_uniq'),
+        ),
+        migrations.RunPython(backfill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_leaderboard_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(blank=True)),
+                ('client_id', models.UUIDField(default=uuid.uuid4, editable=False)),
+                ('started_at', models.DateTimeField()),
+                ('segment_started_at', models.DateTimeField(blank=True, null=True)),
+                ('accumulated_seconds', models.IntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField()),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='active_sessions', to='api.school')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.subject')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='active_session', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_seen_at'], name='active_session_seen_idx')],
+            },
+        ),
+    ]
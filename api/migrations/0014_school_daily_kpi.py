@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_school_kpis(apps, schema_editor):
+    from api.rollups import rebuild_school_kpis
+    rebuild_school_kpis(
+        apps.get_model('api', 'DailyStudyRollup'),
+        apps.get_model('api', 'SchoolDailyKPI'),
+        apps.get_model('api', 'UserProfile'),
+        apps.get_model('api', 'School')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_active_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolDailyKPI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_seconds', models.IntegerField(default=0)),
+                ('session_count', models.IntegerField(default=0)),
+                ('active_students', models.IntegerField(default=0)),
+                ('top_seconds', models.IntegerField(default=0)),
+                ('student_count', models.IntegerField(blank=True, null=True)),
+                ('finalized', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_kpis', to='api.school')),
+                ('top_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='schooldailykpi',
+            constraint=models.UniqueConstraint(fields=('school', 'date'), name='school_kpi_day_uniq'),
+        ),
+        migrations.RunPython(backfill_school_kpis, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Sum
 from django.contrib.auth.models import User
+from django.utils import timezone
 import secrets
+import uuid
+from collections import defaultdict
+
+from .timezones import get_zone, period_start, validate_timezone
 
 
 class School(models.Model):
@@ -17,6 +23,13 @@ class School(models.Model):
         verbose_name='حد نرمال مطالعه (ثانیه)',
         help_text='زمان مطالعه نرمال روزانه به ثانیه'
     )
+    timezone = models.CharField(
+        max_length=64,
+        default='Asia/Tehran',
+        validators=[validate_timezone],
+        verbose_name='منطقه زمانی',
+        help_text='روز مطالعه از نیمه‌شب این منطقه زمانی شروع می‌شود'
+    )
     is_active = models.BooleanField(default=True, verbose_name='فعال')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -88,16 +101,27 @@ class UserProfile(models.Model):
     is_superadmin = models.BooleanField(default=False, verbose_name='سوپرادمین')
     is_profile_complete = models.BooleanField(default=False)
     is_password_set = models.BooleanField(default=False, verbose_name='رمز عبور تنظیم شده')
-    is_studying = models.BooleanField(default=False, verbose_name='در حال مطالعه')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.full_name or self.phone_number}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the school and role as loaded so signal handlers can spot moves
+        instance._loaded_school_id = instance.__dict__.get('school_id')
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
+    
     class Meta:
         verbose_name = 'پروفایل کاربر'
         verbose_name_plural = 'پروفایل‌های کاربر'
+        indexes = [
+            # Roster lookups: students of one school
+            models.Index(fields=['school', 'role'], name='profile_school_role_idx'),
+        ]
 
 
 class Subject(models.Model):
@@ -120,12 +144,305 @@ class StudySession(models.Model):
     end_time = models.DateTimeField(null=True, blank=True)
     duration_seconds = models.IntegerField(default=0)
     is_valid = models.BooleanField(default=True)
+    # Idempotency key generated by the client for offline uploads
+    client_id = models.UUIDField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.subject.name} - {self.start_time}"
 
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            # Per-user time-range scans; on PostgreSQL duration_seconds is
+            # carried in the index so Sum() can use an index-only scan.
+            models.Index(
+                fields=['user', '-start_time'],
+                include=['duration_seconds'],
+                name='session_user_start_idx'
+            ),
+            # School-wide "since" scans joined through user__profile__school
+            models.Index(fields=['start_time'], name='session_start_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_id'], name='session_user_client_uniq'),
+        ]
+
+
+def _increment_or_create(model, key, amounts, defaults=None):
+    """Add `amounts` to the counters of the row matching `key`, creating it if missing"""
+    increment = {field: F(field) + amount for field, amount in amounts.items()}
+    if model.objects.filter(**key).update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **amounts, **(defaults or {}))
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**key).update(**increment)
+
+
+class DailyStudyRollup(models.Model):
+    """Per-day study totals for a user and subject, maintained on session write"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    total_seconds = models.IntegerField(default=0)
+    session_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.subject_id} - {self.date}: {self.total_seconds}s"
+
+    @classmethod
+    def add_session(cls, session, zone=None):
+        """Fold a newly saved StudySession into its day's rollup row"""
+        cls.add_sessions([session], zone)
+
+    @classmethod
+    def add_sessions(cls, sessions, zone=None):
+        """
+        Fold newly saved sessions in with one increment per (user, subject, day).
+
+        Days are those of `zone`, the timezone of the users' school (see
+        api.timezones.user_zone); None means SCHOOL_DEFAULT_TIMEZONE.
+        """
+        zone = zone or get_zone(None)
+        groups = defaultdict(lambda: [0, 0])
+        for session in sessions:
+            totals = groups[(session.user_id, session.subject_id, timezone.localdate(session.start_time, zone))]
+            totals[0] += session.duration_seconds
+            totals[1] += 1
+
+        for (user_id, subject_id, date), (seconds, count) in groups.items():
+            _increment_or_create(
+                cls,
+                {'user_id': user_id, 'subject_id': subject_id, 'date': date},
+                {'total_seconds': seconds, 'session_count': count}
+            )
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            # School-wide day lookups (KPI dashboard)
+            models.Index(fields=['date'], name='rollup_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'subject'], name='rollup_user_date_subject_uniq'),
+        ]
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A student's study total for one day, week or month of their school.
+
+    Rows are kept sorted by the indexes below and incremented on session
+    write, so the top k of a school (optionally per grade or olympiad field)
+    is an index range scan rather than an aggregate over the whole school.
+    School, grade and olympiad field are copied from the profile and kept in
+    step with it by api.signals.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'روزانه'),
+        ('week', 'هفتگی'),
+        ('month', 'ماهانه'),
+    ]
+    PERIODS = [code for code, _ in PERIOD_CHOICES]
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    grade = models.CharField(max_length=20, blank=True)
+    olympiad_field = models.CharField(max_length=20, blank=True)
+    total_seconds = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.period} {self.period_start}: {self.total_seconds}s"
+
+    @classmethod
+    def add_sessions(cls, user, sessions, zone=None):
+        """Add newly saved sessions of `user` to their day, week and month entries"""
+        profile = getattr(user, 'profile', None)
+        if profile is None or profile.role != 'student' or profile.school_id is None:
+            return
+        zone = zone or get_zone(None)
+        totals = defaultdict(int)
+        for session in sessions:
+            day = timezone.localdate(session.start_time, zone)
+            for period in cls.PERIODS:
+                totals[(period, period_start(day, period))] += session.duration_seconds
+
+        member = {
+            'school_id': profile.school_id,
+            'grade': profile.grade,
+            'olympiad_field': profile.olympiad_field,
+        }
+        for (period, start), seconds in totals.items():
+            _increment_or_create(
+                cls,
+                {'user_id': user.id, 'period': period, 'period_start': start},
+                {'total_seconds': seconds},
+                defaults=member
+            )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', 'period', 'period_start', '-total_seconds', 'user'],
+                         name='board_school_idx'),
+            models.Index(fields=['school', 'period', 'period_start', 'grade', '-total_seconds', 'user'],
+                         name='board_grade_idx'),
+            models.Index(fields=['school', 'period', 'period_start', 'olympiad_field', '-total_seconds', 'user'],
+                         name='board_olympiad_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start'], name='board_user_period_uniq'),
+        ]
+
+
+class SchoolDailyKPI(models.Model):
+    """
+    One school's study figures for one local day, read by the manager KPI
+    cards and trend charts instead of aggregating the rollups per view.
+
+    Rows are incremented on session write by add_sessions(). Days before
+    today are finalized by `python manage.py finalize_school_kpis`, which
+    recomputes them from the rollups and records the roster size;
+    unfinalized days follow the current roster (see api.rollups).
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='daily_kpis')
+    date = models.DateField()
+    total_seconds = models.IntegerField(default=0)
+    session_count = models.IntegerField(default=0)
+    active_students = models.IntegerField(default=0)
+    top_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    top_seconds = models.IntegerField(default=0)
+    # Students in the school when the day was finalized
+    student_count = models.IntegerField(null=True, blank=True)
+    finalized = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.school_id} - {self.date}: {self.total_seconds}s"
+
+    @classmethod
+    def add_sessions(cls, user, sessions, zone=None):
+        """
+        Add newly saved sessions of `user` to their school's day rows.
+
+        Call after DailyStudyRollup.add_sessions(): the student's day totals
+        are read back from the rollups to tell a first session of the day
+        (one more active student) and to challenge the day's top student,
+        ties going to the lower user id as on the leaderboard.
+        """
+        profile = getattr(user, 'profile', None)
+        if profile is None or profile.role != 'student' or profile.school_id is None:
+            return
+        zone = zone or get_zone(None)
+        groups = defaultdict(lambda: [0, 0])
+        for session in sessions:
+            totals = groups[timezone.localdate(session.start_time, zone)]
+            totals[0] += session.duration_seconds
+            totals[1] += 1
+
+        for date, (seconds, count) in groups.items():
+            day = DailyStudyRollup.objects.filter(user=user, date=date).aggregate(
+                seconds=Sum('total_seconds'), count=Sum('session_count')
+            )
+            key = {'school_id': profile.school_id, 'date': date}
+            _increment_or_create(cls, key, {
+                'total_seconds': seconds,
+                'session_count': count,
+                'active_students': int(day['count'] == count),
+            })
+            cls.objects.filter(**key).filter(
+                Q(top_user__isnull=True)
+                | Q(top_seconds__lt=day['seconds'])
+                | Q(top_seconds=day['seconds'], top_user_id__gt=user.id)
+            ).update(top_user=user, top_seconds=day['seconds'])
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'date'], name='school_kpi_day_uniq'),
+        ]
+
+
+class ActiveSession(models.Model):
+    """
+    A study timer that is running or paused on the server, at most one per user.
+
+    Pausing merges the open segment into `accumulated_seconds`, so the time
+    studied is that plus the open segment, if any. Stopping (or the sweep,
+    for abandoned timers) turns it into a StudySession and deletes it.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='active_session')
+    # Copied from the profile at start, for the manager's live view
+    school = models.ForeignKey(School, on_delete=models.SET_NULL, null=True, blank=True, related_name='active_sessions')
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    description = models.TextField(blank=True)
+    # Becomes the StudySession's client_id, so closing it twice cannot double count
+    client_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    started_at = models.DateTimeField()
+    segment_started_at = models.DateTimeField(null=True, blank=True)  # None while paused
+    accumulated_seconds = models.IntegerField(default=0)
+    last_seen_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} - {'running' if self.is_running else 'paused'} since {self.started_at}"
+
+    @property
+    def is_running(self):
+        return self.segment_started_at is not None
+
+    def elapsed_seconds(self, now=None):
+        """Seconds studied up to `now`, pauses excluded"""
+        if not self.is_running:
+            return self.accumulated_seconds
+        segment = int(((now or timezone.now()) - self.segment_started_at).total_seconds())
+        return self.accumulated_seconds + max(segment, 0)
+
+    class Meta:
+        indexes = [
+            # Sweep of abandoned timers
+            models.Index(fields=['last_seen_at'], name='active_session_seen_idx'),
+        ]
+
+
+class ReportJob(models.Model):
+    """A report generated in the background by the run_report_worker command"""
+    KIND_CHOICES = [
+        ('excel', 'Excel'),
+        ('student_pdf', 'PDF'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'در صف'),
+        ('running', 'در حال تولید'),
+        ('done', 'آماده'),
+        ('failed', 'ناموفق'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='report_jobs')
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    fingerprint = models.CharField(max_length=64, blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Worker queue polling
+            models.Index(fields=['status', 'created_at'], name='reportjob_queue_idx'),
+        ]
 
 
 class ConsultantTicket(models.Model):
@@ -0,0 +1,99 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over `(start_time, id)`, newest first.
+
+    Each page is a single indexed range scan, unlike offset pagination whose
+    cost grows with the page number. The cursor is an opaque token holding
+    the last row's start_time and id.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, row):
+        # Rows are model instances or, on the values() read path, dicts
+        start_time, pk = (row['start_time'], row['id']) if isinstance(row, dict) else (row.start_time, row.pk)
+        token = json.dumps([start_time.isoformat(), pk]).encode()
+        return urlsafe_b64encode(token).decode()
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            start_time, pk = json.loads(urlsafe_b64decode(token.encode()))
+            start_time = parse_datetime(start_time)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if start_time is None:
+            raise NotFound(self.invalid_cursor_message)
+        return start_time, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-start_time', '-id')
+        if cursor is not None:
+            start_time, pk = cursor
+            queryset = queryset.filter(
+                Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=pk)
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class AdminListPagination(PageNumberPagination):
+    """Page-number pagination for the superadmin lists"""
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
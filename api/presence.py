@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cache import get_cache
+
+
+class MemoryPresenceStore:
+    """
+    In-process presence: per school, an OrderedDict of user_id -> expiry kept
+    in heartbeat order, so expired entries are always at the front.
+
+    Heartbeats are O(1) and counts are amortised O(1). Only suitable when a
+    single process serves every heartbeat (e.g. one ASGI worker).
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._schools = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, members, now):
+        while members:
+            user_id, expires_at = next(iter(members.items()))
+            if expires_at > now:
+                break
+            members.popitem(last=False)
+
+    def heartbeat(self, school_id, user_id):
+        now = time.time()
+        with self._lock:
+            members = self._schools.setdefault(school_id, OrderedDict())
+            members[user_id] = now + self.ttl
+            members.move_to_end(user_id)
+            self._prune(members, now)
+
+    def leave(self, school_id, user_id):
+        with self._lock:
+            self._schools.get(school_id, {}).pop(user_id, None)
+
+    def active_users(self, school_id):
+        with self._lock:
+            members = self._schools.get(school_id)
+            if not members:
+                return set()
+            self._prune(members, time.time())
+            return set(members)
+
+    def active_count(self, school_id):
+        with self._lock:
+            members = self._schools.get(school_id)
+            if not members:
+                return 0
+            self._prune(members, time.time())
+            return len(members)
+
+
+class CachePresenceStore:
+    """
+    Presence shared between processes through the Django cache.
+
+    Each present user is one key expiring after the TTL, so the heartbeat
+    of someone already present is a single O(1) touch. Counts read a
+    per-school index of user ids together with their keys in one
+    get_many. The index only changes when someone arrives, leaves or is
+    found expired, under a short cache lock, so concurrent arrivals do not
+    drop each other and a leave cannot be undone by an earlier heartbeat.
+
+    Needs a cache every process shares (file, Redis); with the per-process
+    locmem cache each worker counts only its own heartbeats (check api.W001).
+    """
+    LOCK_TIMEOUT = 5  # seconds; bounds how long a crashed holder blocks others
+    LOCK_ATTEMPTS = 50
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _key(self, school_id):
+        return f'presence:school:{school_id}'
+
+    def _user_key(self, school_id, user_id):
+        return f'presence:school:{school_id}:user:{user_id}'
+
+    @contextmanager
+    def _locked(self, school_id):
+        cache = get_cache()
+        lock = f'presence:school:{school_id}:lock'
+        for _ in range(self.LOCK_ATTEMPTS):
+            if cache.add(lock, True, self.LOCK_TIMEOUT):
+                break
+            time.sleep(0.01)
+        try:
+            yield cache
+        finally:
+            cache.delete(lock)
+
+    def heartbeat(self, school_id, user_id):
+        key = self._user_key(school_id, user_id)
+        # touch() fails once the key expired or leave() removed it
+        if get_cache().touch(key, self.ttl):
+            return
+        with self._locked(school_id) as cache:
+            cache.set(key, True, self.ttl)
+            members = cache.get(self._key(school_id)) or set()
+            if user_id not in members:
+                cache.set(self._key(school_id), members | {user_id}, None)
+
+    def leave(self, school_id, user_id):
+        with self._locked(school_id) as cache:
+            cache.delete(self._user_key(school_id, user_id))
+            members = cache.get(self._key(school_id)) or set()
+            if user_id in members:
+                cache.set(self._key(school_id), members - {user_id}, None)
+
+    def _present(self, cache, school_id, members):
+        keys = {self._user_key(school_id, user_id): user_id for user_id in members}
+        return {keys[key] for key in cache.get_many(keys)}
+
+    def active_users(self, school_id):
+        cache = get_cache()
+        members = cache.get(self._key(school_id))
+        if not members:
+            return set()
+        present = self._present(cache, school_id, members)
+        if present != members:
+            # Drop the expired; re-read under the lock as someone may have arrived
+            with self._locked(school_id) as cache:
+                members = cache.get(self._key(school_id)) or set()
+                present = self._present(cache, school_id, members)
+                cache.set(self._key(school_id), present, None)
+        return present
+
+    def active_count(self, school_id):
+        return len(self.active_users(school_id))
+
+
+PRESENCE_BACKENDS = {
+    'memory': 'api.presence.MemoryPresenceStore',
+    'cache': 'api.presence.CachePresenceStore',
+}
+
+_store = None
+
+
+def get_presence_store():
+    global _store
+    if _store is None:
+        backend = PRESENCE_BACKENDS.get(settings.PRESENCE_BACKEND, settings.PRESENCE_BACKEND)
+        _store = import_string(backend)(settings.PRESENCE_TTL)
+    return _store
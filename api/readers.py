@@ -0,0 +1,127 @@
+from functools import lru_cache
+
+from django.utils import timezone
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+# Field types whose to_representation() is a plain builtin for the values
+# the database returns
+_BUILTINS = {
+    drf_fields.IntegerField: int,
+    drf_fields.CharField: str,
+    drf_fields.FloatField: float,
+    drf_fields.BooleanField: bool,
+    drf_fields.UUIDField: str,
+    drf_fields.ReadOnlyField: None,
+    relations.PrimaryKeyRelatedField: None,
+}
+
+
+def _iso_datetime(field):
+    """DateTimeField.to_representation() for aware values, minus the per-call lookups"""
+    def convert(value, zone):
+        if timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(zone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(field):
+    """
+    Return (convert, needs_zone) for one bound serializer field.
+
+    `convert` is None when the value is passed through unchanged.
+    """
+    field_type = type(field)
+    if field_type is drf_fields.UUIDField and field.uuid_format != 'hex_verbose':
+        return field.to_representation, False
+    if field_type is relations.PrimaryKeyRelatedField and field.pk_field is not None:
+        # The values() path already holds the primary key
+        return field.pk_field.to_representation, False
+    if field_type in _BUILTINS:
+        return _BUILTINS[field_type], False
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (
+        field_type is drf_fields.DateTimeField
+        and not hasattr(field, 'timezone')
+        and isinstance(output_format, str) and output_format.lower() == drf_fields.ISO_8601
+        and field.default_timezone() is not None
+    ):
+        return _iso_datetime(field), True
+    return field.to_representation, False
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of a DRF serializer that renders `.values()` rows.
+
+    Output matches `serializer_class(instances, many=True).data` key for key.
+    Field accessors are compiled once: each readable field maps to its
+    `.values()` path (`source` with dots as `__`) and a converter, a builtin
+    such as int() or str() where DRF's to_representation() amounts to one.
+
+    Related lookups must follow non-null relations: where the serializer
+    would drop the key of a missing related object, a values row has None.
+    Fields that need the request, such as hyperlinks, are not supported.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.columns = []
+        for field in serializer_class()._readable_fields:
+            if field.source == '*':
+                raise ValueError(f'{serializer_class.__name__}.{field.field_name}: source="*" has no values() path')
+            convert, needs_zone = _converter(field)
+            self.columns.append((field.field_name, '__'.join(field.source_attrs), convert, needs_zone))
+        self.paths = [path for _, path, _, _ in self.columns]
+
+    def values(self, queryset):
+        """`queryset.values()` limited to the columns this serializer reads"""
+        return queryset.values(*self.paths)
+
+    def render(self, rows):
+        """List of output dicts for an iterable of `.values()`-style dicts"""
+        zone = timezone.get_current_timezone()
+        columns = self.columns
+        output = []
+        append = output.append
+        for row in rows:
+            item = {}
+            for name, path, convert, needs_zone in columns:
+                value = row[path]
+                if value is None or convert is None:
+                    item[name] = value
+                elif needs_zone:
+                    item[name] = convert(value, zone)
+                else:
+                    item[name] = convert(value)
+            append(item)
+        return output
+
+
+@lru_cache(maxsize=None)
+def values_serializer(serializer_class):
+    """The ValuesSerializer of `serializer_class`, compiled on first use"""
+    return ValuesSerializer(serializer_class)
+
+
+class ValuesListMixin:
+    """
+    Opt-in fast path for the list action of a generic view.
+
+    Pages are fetched with `.values()` and rendered by the view's
+    serializer_class through a ValuesSerializer, skipping model instances
+    and per-row serializer calls. Writes still use the regular serializer.
+    """
+
+    def list(self, request, *args, **kwargs):
+        reader = values_serializer(self.get_serializer_class())
+        rows = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(rows))
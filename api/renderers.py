@@ -0,0 +1,34 @@
+from rest_framework.renderers import JSONRenderer
+
+
+def columnar(data):
+    """
+    Rewrite every list of same-keyed dicts in `data` as a dict of parallel arrays.
+
+    `[{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]` becomes
+    `{"id": [1, 2], "name": ["a", "b"]}`, so each key is sent once per list
+    instead of once per row. Empty lists and lists of scalars are unchanged.
+    """
+    if isinstance(data, dict):
+        return {key: columnar(value) for key, value in data.items()}
+    if isinstance(data, list):
+        keys = list(data[0]) if data and isinstance(data[0], dict) else None
+        if keys and all(isinstance(row, dict) and row.keys() == data[0].keys() for row in data):
+            return {key: [columnar(row[key]) for row in data] for key in keys}
+        return [columnar(item) for item in data]
+    return data
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    JSON with lists of rows sent as parallel arrays, selected with `?format=columnar`.
+
+    Error responses keep their usual shape so clients can handle them alike.
+    """
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is None or response.status_code < 400:
+            data = columnar(data)
+        return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,181 @@
+import os
+import json
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Sum, Count, Max, Q
+from django.utils import timezone
+
+from .aggregates import school_rollups, study_windows
+from .exports import (
+    EXCEL_CONTENT_TYPE,
+    PDF_CONTENT_TYPE,
+    student_report_rows,
+    write_student_report,
+    student_report_context,
+    write_student_pdf,
+)
+from .models import ReportJob, UserProfile, DailyStudyRollup
+from .timezones import school_zone
+
+
+ARTIFACT_TYPES = {
+    'excel': ('xlsx', EXCEL_CONTENT_TYPE),
+    'student_pdf': ('pdf', PDF_CONTENT_TYPE),
+}
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _excel_watermark(job):
+    """Cheap aggregates that change whenever the exported data changes"""
+    rollups = school_rollups(job.school).filter(
+        date__gte=job.params['start_date'],
+        date__lte=job.params['end_date']
+    ).aggregate(rows=Count('id'), sessions=Sum('session_count'), seconds=Sum('total_seconds'))
+    roster = UserProfile.objects.filter(
+        role='student',
+        school=job.school
+    ).aggregate(students=Count('id'), updated=Max('updated_at'))
+    return [job.params['start_date'], job.params['end_date'], rollups, roster]
+
+
+def _student_pdf_watermark(job):
+    user_id = job.params['user_id']
+    rollups = DailyStudyRollup.objects.filter(user_id=user_id).aggregate(
+        rows=Count('id'), sessions=Sum('session_count'), seconds=Sum('total_seconds')
+    )
+    updated = UserProfile.objects.filter(user_id=user_id).values_list('updated_at', flat=True).first()
+    # Today/week/month figures depend on the current day as well
+    return [user_id, study_windows(zone=school_zone(job.school))['today'], rollups, updated]
+
+
+def _build_excel(job, fileobj):
+    start_date = _parse_date(job.params['start_date'])
+    end_date = _parse_date(job.params['end_date'])
+    write_student_report(fileobj, student_report_rows(job.school, start_date, end_date))
+
+
+def _build_student_pdf(job, fileobj):
+    profile = UserProfile.objects.select_related('user', 'school').get(user_id=job.params['user_id'])
+    write_student_pdf(fileobj, student_report_context(profile.user))
+
+
+WATERMARKS = {
+    'excel': _excel_watermark,
+    'student_pdf': _student_pdf_watermark,
+}
+
+BUILDERS = {
+    'excel': _build_excel,
+    'student_pdf': _build_student_pdf,
+}
+
+
+def compute_fingerprint(job):
+    """Hash of the job's inputs and the current state of the data it reads"""
+    payload = [job.kind, job.school_id, WATERMARKS[job.kind](job)]
+    return hashlib.sha256(json.dumps(payload, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def artifact_path(kind, fingerprint):
+    extension, _ = ARTIFACT_TYPES[kind]
+    return settings.REPORT_ROOT / f'{kind}-{fingerprint}.{extension}'
+
+
+def submit_report(kind, user, school, params):
+    """
+    Queue a report, or hand back an existing one.
+
+    If an artifact for the same inputs and unchanged data is already on disk
+    the job is created as done; a matching job still in the queue is reused.
+    """
+    job = ReportJob(kind=kind, requested_by=user, school=school, params=params)
+    job.fingerprint = compute_fingerprint(job)
+
+    path = artifact_path(kind, job.fingerprint)
+    if path.exists():
+        os.utime(path)  # keep reused artifacts from being pruned
+        job.status = 'done'
+        job.file_path = str(path)
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    queued = ReportJob.objects.filter(
+        requested_by=user,
+        fingerprint=job.fingerprint,
+        status__in=['pending', 'running']
+    ).first()
+    if queued:
+        return queued
+
+    job.save()
+    return job
+
+
+def claim_next_job(timeout=None):
+    """
+    Atomically move the oldest pending job to running and return it.
+
+    A job left running for longer than `timeout` seconds (its worker died) is
+    claimable again. Claiming is a conditional UPDATE, so several workers can
+    poll the same table without a broker or row locks.
+    """
+    timeout = settings.REPORT_JOB_TIMEOUT if timeout is None else timeout
+    claimable = Q(status='pending') | Q(status='running', started_at__lt=timezone.now() - timedelta(seconds=timeout))
+    candidates = ReportJob.objects.filter(claimable).order_by('created_at').values_list('id', flat=True)[:5]
+    for job_id in candidates:
+        claimed = ReportJob.objects.filter(claimable, id=job_id).update(
+            status='running',
+            started_at=timezone.now()
+        )
+        if claimed:
+            return ReportJob.objects.select_related('school').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Build (or reuse) the job's artifact and record the outcome"""
+    partial = None
+    try:
+        job.fingerprint = compute_fingerprint(job)
+        path = artifact_path(job.kind, job.fingerprint)
+        if path.exists():
+            os.utime(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(f'{path.name}.{os.getpid()}.partial')
+            with open(partial, 'wb') as fileobj:
+                BUILDERS[job.kind](job, fileobj)
+            os.replace(partial, path)
+    except Exception as exc:
+        if partial is not None:
+            partial.unlink(missing_ok=True)
+        job.status = 'failed'
+        job.error = str(exc)
+    else:
+        job.status = 'done'
+        job.file_path = str(path)
+        job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['fingerprint', 'status', 'file_path', 'error', 'finished_at'])
+    return job
+
+
+def prune_artifacts(max_age_days=None):
+    """Delete cached artifacts that have not been modified for `max_age_days`"""
+    max_age_days = settings.REPORT_ARTIFACT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not settings.REPORT_ROOT.exists():
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for path in settings.REPORT_ROOT.iterdir():
+        if path.is_file() and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
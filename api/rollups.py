@@ -0,0 +1,201 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .timezones import get_zone, period_start
+
+
+TIMEZONE_PATH = 'user__profile__school__timezone'
+
+
+def _sessions_by_zone(sessions, timezone_path):
+    """Split `sessions` into (zone, sessions) groups by their school timezone"""
+    if timezone_path is None:
+        return [(get_zone(None), sessions)]
+    names = sessions.values_list(timezone_path, flat=True).distinct().order_by()
+    # A None name (no profile or no school) filters on IS NULL
+    return [(get_zone(name), sessions.filter(**{timezone_path: name})) for name in names]
+
+
+def rebuild_daily_rollups(session_model, rollup_model, users=None, batch_size=2000, timezone_path=TIMEZONE_PATH):
+    """
+    Recompute DailyStudyRollup rows from raw study sessions.
+
+    Models are passed in so data migrations can hand over historical models.
+    When `users` is given only their rows are rebuilt. Sessions are bucketed
+    into days in the database with TruncDate in their school's timezone;
+    migrations that predate School.timezone pass `timezone_path=None` to use
+    SCHOOL_DEFAULT_TIMEZONE throughout. Returns the number of rollup rows
+    written.
+    """
+    sessions = session_model.objects.all()
+    rollups = rollup_model.objects.all()
+    if users is not None:
+        sessions = sessions.filter(user__in=users)
+        rollups = rollups.filter(user__in=users)
+
+    groups = [
+        zoned.annotate(
+            day=TruncDate('start_time', tzinfo=zone)
+        ).values('user_id', 'subject_id', 'day').annotate(
+            total=Sum('duration_seconds'),
+            count=Count('id')
+        ).order_by()
+        for zone, zoned in _sessions_by_zone(sessions, timezone_path)
+    ]
+
+    rollups.delete()
+    written = 0
+    batch = []
+    for row in (row for grouped in groups for row in grouped.iterator(chunk_size=batch_size)):
+        batch.append(rollup_model(
+            user_id=row['user_id'],
+            subject_id=row['subject_id'],
+            date=row['day'],
+            total_seconds=row['total'] or 0,
+            session_count=row['count']
+        ))
+        if len(batch) >= batch_size:
+            rollup_model.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        rollup_model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def rebuild_leaderboards(rollup_model, entry_model, profile_model, users=None, batch_size=2000):
+    """
+    Recompute LeaderboardEntry rows from DailyStudyRollup.
+
+    Rollup dates are already local to each school, so day, week and month
+    totals are plain sums over them. Only students with a school get
+    entries. Returns the number of entries written.
+    """
+    profiles = profile_model.objects.filter(role='student', school__isnull=False)
+    rollups = rollup_model.objects.filter(user__profile__role='student', user__profile__school__isnull=False)
+    entries = entry_model.objects.all()
+    if users is not None:
+        profiles = profiles.filter(user__in=users)
+        rollups = rollups.filter(user__in=users)
+        entries = entries.filter(user__in=users)
+
+    members = {
+        user_id: (school_id, grade, olympiad_field)
+        for user_id, school_id, grade, olympiad_field in profiles.values_list(
+            'user_id', 'school_id', 'grade', 'olympiad_field'
+        )
+    }
+    periods = [code for code, _ in entry_model._meta.get_field('period').choices]
+    totals = defaultdict(int)
+    daily = rollups.values('user_id', 'date').annotate(total=Sum('total_seconds')).order_by()
+    for row in daily.iterator(chunk_size=batch_size):
+        for period in periods:
+            totals[(row['user_id'], period, period_start(row['date'], period))] += row['total'] or 0
+
+    entries.delete()
+    rows = []
+    for (user_id, period, start), seconds in totals.items():
+        school_id, grade, olympiad_field = members[user_id]
+        rows.append(entry_model(
+            school_id=school_id,
+            user_id=user_id,
+            period=period,
+            period_start=start,
+            grade=grade,
+            olympiad_field=olympiad_field,
+            total_seconds=seconds
+        ))
+    entry_model.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def _school_day_figures(rollup_model, school_id, days):
+    """
+    SchoolDailyKPI field values per date for the school's current students,
+    from their rollup rows matching the `days` filter.
+    """
+    rows = rollup_model.objects.filter(
+        user__profile__role='student', user__profile__school_id=school_id
+    ).filter(days).values('date', 'user_id').annotate(
+        seconds=Sum('total_seconds'),
+        count=Sum('session_count')
+    ).order_by()
+
+    figures = {}
+    for row in rows.iterator(chunk_size=2000):
+        day = figures.setdefault(row['date'], {
+            'total_seconds': 0, 'session_count': 0, 'active_students': 0, 'top_user_id': None, 'top_seconds': 0
+        })
+        seconds = row['seconds'] or 0
+        day['total_seconds'] += seconds
+        day['session_count'] += row['count'] or 0
+        day['active_students'] += 1
+        if day['top_user_id'] is None or (-seconds, row['user_id']) < (-day['top_seconds'], day['top_user_id']):
+            day['top_user_id'] = row['user_id']
+            day['top_seconds'] = seconds
+    return figures
+
+
+def _rewrite_school_kpis(rollup_model, kpi_model, school_id, days, **fields):
+    """Replace the unfinalized KPI rows of the days matching `days` (a Q on date)"""
+    kpis = kpi_model.objects.filter(school_id=school_id).filter(days)
+    pending = days & ~Q(date__in=kpis.filter(finalized=True).values('date'))
+    figures = _school_day_figures(rollup_model, school_id, pending)
+    with transaction.atomic():
+        kpis.filter(finalized=False).delete()
+        kpi_model.objects.bulk_create([
+            kpi_model(school_id=school_id, date=date, **values, **fields)
+            for date, values in figures.items()
+        ], batch_size=2000)
+    return len(figures)
+
+
+def refresh_school_kpis(rollup_model, kpi_model, school_id, since):
+    """
+    Recompute a school's unfinalized SchoolDailyKPI rows from `since` on.
+
+    For changes other than new sessions, such as a student moving school;
+    finalized days are left as they were. Returns the number of rows written.
+    """
+    return _rewrite_school_kpis(rollup_model, kpi_model, school_id, Q(date__gte=since))
+
+
+def finalize_school_kpis(rollup_model, kpi_model, profile_model, school_id, before):
+    """
+    Recompute and finalize a school's SchoolDailyKPI rows for the days
+    before `before` that are not finalized yet.
+
+    Each row records the school's current number of students, which for
+    a backfilled history is the only roster size known. Days nobody
+    studied get no row. Returns the number of rows written.
+    """
+    student_count = profile_model.objects.filter(role='student', school_id=school_id).count()
+    return _rewrite_school_kpis(
+        rollup_model, kpi_model, school_id, Q(date__lt=before), finalized=True, student_count=student_count
+    )
+
+
+def rebuild_school_kpis(rollup_model, kpi_model, profile_model, school_model, schools=None, now=None):
+    """
+    Recompute SchoolDailyKPI rows from DailyStudyRollup.
+
+    Days before each school's local today are finalized and the rest left
+    open. When `schools` (ids) is given only their rows are rebuilt.
+    Returns the number of rows written.
+    """
+    now = now or timezone.now()
+    targets = school_model.objects.all()
+    if schools is not None:
+        targets = targets.filter(pk__in=schools)
+    written = 0
+    for school_id, zone_name in targets.values_list('id', 'timezone'):
+        today = timezone.localdate(now, get_zone(zone_name))
+        kpi_model.objects.filter(school_id=school_id).delete()
+        written += finalize_school_kpis(rollup_model, kpi_model, profile_model, school_id, today)
+        written += refresh_school_kpis(rollup_model, kpi_model, school_id, today)
+    return written
@@ -0,0 +1,120 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import UserProfile, Subject, StudySession, School, DailyStudyRollup, LeaderboardEntry, SchoolDailyKPI
+from .rollups import rebuild_daily_rollups, rebuild_leaderboards, rebuild_school_kpis
+
+
+SUBJECTS = [
+    ('ریاضی', '#10b981'),
+    ('فیزیک', '#3b82f6'),
+    ('شیمی', '#f59e0b'),
+    ('زیست‌شناسی', '#ef4444'),
+    ('ادبیات', '#8b5cf6'),
+    ('عربی', '#ec4899'),
+    ('زبان انگلیسی', '#14b8a6'),
+    ('دینی', '#6366f1'),
+]
+
+
+def seed_school(name, student_count, sessions_per_student, rng=None, days=90, prefix='seed',
+                subjects=1, manager=False, now=None):
+    """
+    Create a school full of students with random study history using bulk inserts.
+
+    Usernames are `<prefix>-<n>` so several seeded schools can coexist. Each
+    student gets the first `subjects` entries of SUBJECTS and sessions spread
+    over the last `days` days; with `manager` the school also gets a manager
+    named `<prefix>-manager`. The same `rng` seed and `now` give the same
+    data. The daily rollup and leaderboard rows of the new students are
+    rebuilt at the end.
+    """
+    rng = rng or random.Random(0)
+    now = now or timezone.now()
+    school = School.objects.create(name=name)
+    User.objects.bulk_create(
+        [User(username=f'{prefix}-{i}') for i in range(student_count)],
+        batch_size=2000
+    )
+    # Re-read so every backend hands back primary keys
+    seeded = User.objects.filter(username__startswith=f'{prefix}-')
+    users = list(seeded.order_by('id'))
+    grades = [code for code, _ in UserProfile.GRADE_CHOICES]
+    olympiads = [code for code, _ in UserProfile.OLYMPIAD_CHOICES]
+    UserProfile.objects.bulk_create([
+        UserProfile(
+            user=user,
+            school=school,
+            role='student',
+            phone_number=f'0{user.id:010d}',
+            full_name=f'Student {i}',
+            grade=rng.choice(grades),
+            olympiad_field=rng.choice(olympiads),
+            is_profile_complete=True
+        )
+        for i, user in enumerate(users)
+    ], batch_size=2000)
+    subject_specs = SUBJECTS[:max(1, subjects)]
+    Subject.objects.bulk_create([
+        Subject(user=user, name=subject_name, color_code=color)
+        for user in users
+        for subject_name, color in subject_specs
+    ], batch_size=2000)
+    subjects_by_user = {}
+    for subject in Subject.objects.filter(user__in=seeded).order_by('id'):
+        subjects_by_user.setdefault(subject.user_id, []).append(subject)
+
+    batch = []
+    for user in users:
+        for _ in range(sessions_per_student):
+            start = now - timedelta(minutes=rng.randint(0, 60 * 24 * days))
+            duration = rng.randint(300, 7200)
+            batch.append(StudySession(
+                user=user,
+                subject=rng.choice(subjects_by_user[user.id]),
+                start_time=start,
+                end_time=start + timedelta(seconds=duration),
+                duration_seconds=duration
+            ))
+            if len(batch) >= 5000:
+                StudySession.objects.bulk_create(batch)
+                batch = []
+    if batch:
+        StudySession.objects.bulk_create(batch)
+
+    rebuild_daily_rollups(StudySession, DailyStudyRollup, users=seeded)
+    rebuild_leaderboards(DailyStudyRollup, LeaderboardEntry, UserProfile, users=seeded)
+    rebuild_school_kpis(DailyStudyRollup, SchoolDailyKPI, UserProfile, School, schools=[school.id], now=now)
+
+    if manager:
+        manager_user = User.objects.create(username=f'{prefix}-manager')
+        UserProfile.objects.create(
+            user=manager_user,
+            school=school,
+            role='manager',
+            phone_number=f'0{manager_user.id:010d}',
+            full_name=f'Manager of {name}',
+            is_profile_complete=True
+        )
+    return school
+
+
+def seed_dataset(schools, students, sessions_per_student, subjects=4, days=90, seed=0, prefix='seed', now=None):
+    """
+    Seed `schools` schools, each with a manager and `students` students.
+
+    Everything is drawn from one random.Random(seed), so a given seed and
+    `now` always produce the same dataset. Returns the created schools.
+    """
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    return [
+        seed_school(
+            f'{prefix} school {index}', students, sessions_per_student,
+            rng=rng, days=days, prefix=f'{prefix}-{index}', subjects=subjects, manager=True, now=now
+        )
+        for index in range(schools)
+    ]
@@ -1,6 +1,12 @@
+from datetime import timedelta
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import UserProfile, Subject, StudySession, ConsultantTicket, School
+from django.urls import reverse
+from .models import (
+    UserProfile, Subject, StudySession, ConsultantTicket, School, ReportJob, LeaderboardEntry, ActiveSession
+)
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -32,9 +38,10 @@ class StudySessionSerializer(serializers.ModelSerializer):
             'start_time',
             'end_time',
             'duration_seconds',
-            'is_valid'
+            'is_valid',
+            'client_id'
         ]
-        read_only_fields = ['id', 'duration_seconds']
+        read_only_fields = ['id', 'duration_seconds', 'client_id']
 
     def create(self, validated_data):
         # Calculate duration automatically
@@ -46,6 +53,67 @@ class StudySessionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class StudySessionUploadSerializer(serializers.Serializer):
+    """One session of an offline batch upload, keyed by a client-generated UUID"""
+    client_id = serializers.UUIDField()
+    subject_name = serializers.CharField(max_length=100)
+    subject_color = serializers.CharField(max_length=7, required=False, default='#10b981')
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['end_time'] < attrs['start_time']:
+            raise serializers.ValidationError({'end_time': 'زمان پایان نباید قبل از زمان شروع باشد'})
+        return attrs
+
+
+class TimerActionSerializer(serializers.Serializer):
+    """Optional subject and description sent when starting or stopping the timer"""
+    subject_name = serializers.CharField(max_length=100, required=False)
+    subject_color = serializers.CharField(max_length=7, required=False, default='#10b981')
+    description = serializers.CharField(required=False, allow_blank=True)
+
+
+class ActiveSessionSerializer(serializers.ModelSerializer):
+    """The server-side timer; `elapsed_seconds` is as of context['now']"""
+    state = serializers.SerializerMethodField()
+    subject_name = serializers.SerializerMethodField()
+    elapsed_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ActiveSession
+        fields = [
+            'state',
+            'subject_name',
+            'description',
+            'started_at',
+            'segment_started_at',
+            'accumulated_seconds',
+            'elapsed_seconds',
+            'last_seen_at'
+        ]
+
+    def get_state(self, obj):
+        return 'running' if obj.is_running else 'paused'
+
+    def get_subject_name(self, obj):
+        return obj.subject.name if obj.subject_id else None
+
+    def get_elapsed_seconds(self, obj):
+        return obj.elapsed_seconds(self.context.get('now'))
+
+
+class LiveSessionSerializer(serializers.Serializer):
+    """One open timer in the manager's live view"""
+    user_id = serializers.IntegerField()
+    full_name = serializers.CharField()
+    state = serializers.CharField()
+    subject_name = serializers.CharField(allow_null=True)
+    started_at = serializers.DateTimeField()
+    elapsed_seconds = serializers.IntegerField()
+
+
 class ConsultantTicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConsultantTicket
@@ -59,6 +127,49 @@ class ConsultantTicketSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'is_resolved']
 
 
+class StudentAnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Date range of the analytics endpoint.
+
+    Defaults to the 30 days ending today; `today` (the student's local date)
+    comes from the serializer context.
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or self.context['today']
+        start = attrs.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({'start': 'تاریخ شروع نباید بعد از تاریخ پایان باشد'})
+        if (end - start).days + 1 > settings.ANALYTICS_MAX_DAYS:
+            raise serializers.ValidationError(f'بازه حداکثر {settings.ANALYTICS_MAX_DAYS} روز است')
+        return {'start': start, 'end': end}
+
+
+class AnalyticsDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    total_seconds = serializers.IntegerField()
+
+
+class AnalyticsSubjectSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    color = serializers.CharField()
+    total_seconds = serializers.IntegerField()
+
+
+class StudentAnalyticsSerializer(serializers.Serializer):
+    """Daily time series, per-subject split and streaks of one student"""
+    start = serializers.DateField()
+    end = serializers.DateField()
+    days = AnalyticsDaySerializer(many=True)
+    subjects = AnalyticsSubjectSerializer(many=True)
+    total_seconds = serializers.IntegerField()
+    active_days = serializers.IntegerField()
+    current_streak = serializers.IntegerField()
+    longest_streak = serializers.IntegerField()
+
+
 class PhoneLoginSerializer(serializers.Serializer):
     phone_number = serializers.CharField(max_length=15)
     otp = serializers.CharField(max_length=6)
@@ -90,11 +201,65 @@ class ManagerDashboardKPISerializer(serializers.Serializer):
     total_students = serializers.IntegerField()
 
 
+class KPITrendQuerySerializer(serializers.Serializer):
+    """Query parameters of the manager KPI trend"""
+    days = serializers.ChoiceField(choices=[30, 90, 365], default=30)
+
+
+class KPITrendDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    total_seconds = serializers.IntegerField()
+    avg_seconds = serializers.IntegerField()
+    session_count = serializers.IntegerField()
+    active_students = serializers.IntegerField()
+    absent_count = serializers.IntegerField()
+    student_count = serializers.IntegerField()
+    top_student = serializers.DictField(allow_null=True)
+    finalized = serializers.BooleanField()
+
+
+class KPITrendSerializer(serializers.Serializer):
+    """Daily KPIs of a school over the last 30, 90 or 365 days, oldest first"""
+    days = serializers.IntegerField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    series = KPITrendDaySerializer(many=True)
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """Query parameters of the manager leaderboard"""
+    period = serializers.ChoiceField(choices=LeaderboardEntry.PERIOD_CHOICES, default='day')
+    grade = serializers.ChoiceField(choices=UserProfile.GRADE_CHOICES, required=False)
+    olympiad_field = serializers.ChoiceField(choices=UserProfile.OLYMPIAD_CHOICES, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    user_id = serializers.IntegerField()
+    full_name = serializers.CharField()
+    grade = serializers.CharField()
+    olympiad_field = serializers.CharField()
+    total_seconds = serializers.IntegerField()
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    """Top students of a school for the current day, week or month"""
+    period = serializers.CharField()
+    period_start = serializers.DateField()
+    entries = LeaderboardEntrySerializer(many=True)
+
+
 # SuperAdmin Serializers
 class SchoolSerializer(serializers.ModelSerializer):
-    """Serializer for School model"""
-    member_count = serializers.SerializerMethodField()
-    manager_name = serializers.SerializerMethodField()
+    """
+    Serializer for School model
+
+    member_count and manager_name are read from annotate_school_stats();
+    the defaults apply to a school that was just created.
+    """
+    member_count = serializers.IntegerField(read_only=True, default=0)
+    manager_name = serializers.CharField(read_only=True, default='تعیین نشده')
     
     class Meta:
         model = School
@@ -103,19 +268,13 @@ class SchoolSerializer(serializers.ModelSerializer):
             'name',
             'invitation_code',
             'normal_study_threshold',
+            'timezone',
             'is_active',
             'member_count',
             'manager_name',
             'created_at'
         ]
         read_only_fields = ['invitation_code', 'created_at']
-    
-    def get_member_count(self, obj):
-        return obj.members.filter(role='student').count()
-    
-    def get_manager_name(self, obj):
-        manager = obj.members.filter(role='manager').first()
-        return manager.full_name if manager else 'تعیین نشده'
 
 
 class AssignManagerSerializer(serializers.Serializer):
@@ -127,3 +286,42 @@ class AssignManagerSerializer(serializers.Serializer):
             raise serializers.ValidationError('شماره تلفن معتبر نیست')
         return value
 
+
+
+# Report Job Serializers
+class ReportJobCreateSerializer(serializers.Serializer):
+    """Serializer for submitting a background report"""
+    kind = serializers.ChoiceField(choices=ReportJob.KIND_CHOICES)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    user_id = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs['kind'] == 'student_pdf' and not attrs.get('user_id'):
+            raise serializers.ValidationError({'user_id': 'برای گزارش PDF شناسه دانش‌آموز الزامی است'})
+        if bool(attrs.get('start_date')) != bool(attrs.get('end_date')):
+            raise serializers.ValidationError('تاریخ شروع و پایان باید با هم ارسال شوند')
+        return attrs
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Serializer for report job status"""
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id',
+            'kind',
+            'status',
+            'params',
+            'error',
+            'download_url',
+            'created_at',
+            'finished_at'
+        ]
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        return reverse('manager_report_download', kwargs={'job_id': obj.id})
@@ -0,0 +1,112 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .authentication import forget_principals
+from .cache import invalidate
+from .daily_kpis import refresh_open_days
+from .leaderboards import sync_member
+from .models import StudySession, Subject, UserProfile, School, LeaderboardEntry, DailyStudyRollup
+from .rollups import rebuild_leaderboards
+
+
+def _school_of(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list('school_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=StudySession)
+def invalidate_session_stats(sender, instance, **kwargs):
+    invalidate('user', instance.user_id)
+    invalidate('school', _school_of(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Subject)
+def invalidate_subject_stats(sender, instance, **kwargs):
+    # Session lists and per-subject splits embed subject names and colours
+    invalidate('user', instance.user_id)
+
+
+@receiver(pre_delete, sender=Subject)
+def remember_subject_students(sender, instance, **kwargs):
+    # The cascade takes the subject's sessions and rollups with it; note
+    # whose study that was before they are gone
+    instance._studied_by = set(
+        DailyStudyRollup.objects.filter(subject=instance).values_list('user_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Subject)
+def drop_subject_study(sender, instance, **kwargs):
+    # Leaderboard entries and KPI rows were only ever incremented; rebuild
+    # them from the rollups that are left
+    users = getattr(instance, '_studied_by', set())
+    if not users:
+        return
+    rebuild_leaderboards(DailyStudyRollup, LeaderboardEntry, UserProfile, users=users)
+    school_ids = set(UserProfile.objects.filter(user_id__in=users).values_list('school_id', flat=True))
+    for school_id in school_ids - {None}:
+        refresh_open_days(school_id)
+        invalidate('school', school_id)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_stats(sender, instance, **kwargs):
+    forget_principals(instance.user_id)
+    invalidate('user', instance.user_id)
+    invalidate('school', instance.school_id)
+    # Moving a student between schools changes both rosters
+    loaded_school_id = getattr(instance, '_loaded_school_id', instance.school_id)
+    if loaded_school_id != instance.school_id:
+        invalidate('school', loaded_school_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def sync_leaderboard_member(sender, instance, created, **kwargs):
+    moved = not created and (
+        getattr(instance, '_loaded_school_id', instance.school_id) != instance.school_id
+        or getattr(instance, '_loaded_role', instance.role) != instance.role
+    )
+    sync_member(instance, moved)
+
+
+@receiver(post_delete, sender=UserProfile)
+def drop_leaderboard_member(sender, instance, **kwargs):
+    LeaderboardEntry.objects.filter(user_id=instance.user_id).delete()
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_school_kpi_roster(sender, instance, created, **kwargs):
+    # A new profile has no study yet; a move or role change shifts it between
+    # the rosters that open KPI days are counted over
+    loaded_school_id = getattr(instance, '_loaded_school_id', instance.school_id)
+    moved = not created and (
+        loaded_school_id != instance.school_id
+        or getattr(instance, '_loaded_role', instance.role) != instance.role
+    )
+    if moved:
+        for school_id in {loaded_school_id, instance.school_id}:
+            refresh_open_days(school_id)
+
+
+@receiver(post_delete, sender=UserProfile)
+def drop_school_kpi_member(sender, instance, **kwargs):
+    refresh_open_days(instance.school_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def remember_loaded_membership(sender, instance, **kwargs):
+    # Connected after the handlers above, which compare against these
+    instance._loaded_school_id = instance.school_id
+    instance._loaded_role = instance.role
+
+
+@receiver([post_save, post_delete], sender=School)
+def invalidate_school_stats(sender, instance, **kwargs):
+    invalidate('school', instance.pk)
+    # Cached principals carry their school
+    forget_principals(*UserProfile.objects.filter(school_id=instance.pk).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_user_principal(sender, instance, **kwargs):
+    forget_principals(instance.pk)
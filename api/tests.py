@@ -1,3 +1,1549 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    UserProfile, Subject, StudySession, School, DailyStudyRollup, ReportJob, LeaderboardEntry, ActiveSession,
+    SchoolDailyKPI
+)
+from .presence import MemoryPresenceStore, CachePresenceStore, get_presence_store
+from .checks import check_presence_is_shared
+from . import live
+from .metrics import get_request_metrics, percentile
+from .seeding import seed_dataset
+from .aggregates import study_windows, study_streaks, user_rollup_stats, student_list_rows
+from .timezones import school_zone
+from .cache import cache_key, get_cache
+from .leaderboards import leaderboard
+from .daily_kpis import finalize_days, kpi_trend
+from .compression import negotiate_encoding
+from .fanout import fan_out
+from .dbpool import ConnectionPool, PoolTimeout
+from .renderers import columnar
+from .readers import values_serializer
+from .timers import (
+    start_timer, pause_timer, resume_timer, stop_timer, touch_timer, close_abandoned_sessions
+)
+from .serializers import ManagerStudentListSerializer, StudySessionSerializer
+
+
+class BaseTestCase(TestCase):
+    """Every test starts with an empty stats cache"""
+    def setUp(self):
+        cache.clear()
+
+
+def create_member(school, phone_number, role='student', **extra):
+    user = User.objects.create(username=phone_number)
+    UserProfile.objects.create(
+        user=user,
+        school=school,
+        phone_number=phone_number,
+        role=role,
+        is_profile_complete=True,
+        **extra
+    )
+    return user
+
+
+def post_session(user, start_time, duration_seconds, subject_name='ریاضی'):
+    """Save a session of `user` through POST /api/sessions/, as the apps do"""
+    client = APIClient()
+    client.force_authenticate(user)
+    return client.post('/api/sessions/', {
+        'subject_name': subject_name,
+        'start_time': start_time.isoformat(),
+        'end_time': (start_time + timedelta(seconds=duration_seconds)).isoformat(),
+    }, format='json')
+
+
+def create_session(user, start_time, duration_seconds, subject=None):
+    if subject is None:
+        subject, _ = Subject.objects.get_or_create(
+            name='ریاضی', user=user, defaults={'color_code': '#10b981'}
+        )
+    return StudySession.objects.create(
+        user=user,
+        subject=subject,
+        start_time=start_time,
+        end_time=start_time + timedelta(seconds=duration_seconds),
+        duration_seconds=duration_seconds
+    )
+
+
+class ManagerStudentListViewTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def add_students(self, count, offset=0):
+        now = timezone.now()
+        students = []
+        for i in range(offset, offset + count):
+            student = create_member(self.school, f'0913{i:07d}', full_name=f'Student {i}')
+            create_session(student, now - timedelta(minutes=5), 600)
+            create_session(student, now - timedelta(days=10), 300)
+            students.append(student)
+        return students
+
+    def test_output_matches_serializer_contract(self):
+        now = timezone.now()
+        student = create_member(self.school, '09130000001', full_name='Ali', grade='10')
+        create_session(student, now - timedelta(minutes=30), 1200)
+        create_session(student, now - timedelta(days=3), 1800)
+        create_session(student, now - timedelta(days=9), 1000)
+        create_member(self.school, '09130000002', full_name='Idle')
+
+        response = self.client.get('/api/manager/students/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        first, second = response.data['students']
+        self.assertEqual(first['user_id'], student.id)
+        self.assertEqual(first['week_total'], 3000)
+        self.assertEqual(first['trend'], 'up')
+        self.assertEqual(first['trend_percent'], 200.0)
+        self.assertIsNotNone(first['last_activity'])
+        self.assertEqual(second['full_name'], 'Idle')
+        self.assertEqual(second['today_total'], 0)
+        self.assertEqual(second['trend'], 'stable')
+        self.assertIsNone(second['last_activity'])
+
+    def test_query_count_is_constant_in_roster_size(self):
+        self.add_students(2)
+        with self.assertNumQueries(1):
+            self.client.get('/api/manager/students/')
+        self.add_students(20, offset=2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/manager/students/')
+        self.assertEqual(response.data['count'], 22)
+
+
+class ExplainHotQueriesCommandTests(BaseTestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_hot_queries', students=50, sessions=10, stdout=out)
+        self.assertIn('All hot queries use an index', out.getvalue())
+        self.assertFalse(School.objects.exists())
+
+
+class BenchmarkEndpointsCommandTests(BaseTestCase):
+    def test_seed_is_deterministic(self):
+        now = timezone.now()
+        for prefix in ('a', 'b'):
+            seed_dataset(1, 5, 4, subjects=2, seed=7, prefix=prefix, now=now)
+        rows = {
+            prefix: list(StudySession.objects.filter(user__username__startswith=f'{prefix}-').order_by('id').values_list(
+                'subject__name', 'start_time', 'duration_seconds'
+            ))
+            for prefix in ('a', 'b')
+        }
+        self.assertEqual(len(rows['a']), 20)
+        self.assertEqual(rows['a'], rows['b'])
+
+    def test_baseline_round_trip(self):
+        options = dict(schools=1, students=3, sessions=2, repeat=1, stdout=StringIO(),
+                       only=['user_profile', 'manager_student_list'])
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / 'baseline.json'
+            call_command('benchmark_endpoints', save=str(baseline), **options)
+            results = json.loads(baseline.read_text())['endpoints']
+            self.assertEqual(set(results), {'user_profile', 'manager_student_list'})
+            self.assertEqual(results['manager_student_list']['status'], 200)
+
+            results['manager_student_list']['queries'] = 0
+            baseline.write_text(json.dumps({'endpoints': results}))
+            with self.assertRaisesMessage(CommandError, 'manager_student_list'):
+                call_command('benchmark_endpoints', compare=str(baseline), **options)
+        self.assertFalse(School.objects.exists())
+
+    def test_leaves_the_shared_cache_alone(self):
+        cache.set('unrelated', 1)
+        call_command('benchmark_endpoints', schools=1, students=2, sessions=1, repeat=1,
+                     only=['dashboard_stats'], stdout=StringIO())
+        self.assertEqual(cache.get('unrelated'), 1)
+
+    def test_runs_from_the_cli_on_a_file_database(self):
+        # The in-memory test database ignores close(), which hides a
+        # connection closed inside the command's transaction
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'DATABASE_URL': f'sqlite:///{Path(tmp) / "db.sqlite3"}'}
+            results = [
+                subprocess.run([sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+                               capture_output=True, text=True)
+                for args in (
+                    ['migrate', '-v0'],
+                    ['benchmark_endpoints', '--schools', '1', '--students', '2', '--sessions', '1',
+                     '--repeat', '1', '--only', 'check_phone', 'manager_report_download'],
+                )
+            ]
+        for result in results:
+            self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('manager_report_download', results[-1].stdout)
+
+
+class DailyStudyRollupTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_session_create_updates_rollup(self):
+        now = timezone.now().replace(hour=12, minute=0)
+        post_session(self.student, now - timedelta(minutes=30), 600)
+        post_session(self.student, now - timedelta(minutes=10), 300)
+        post_session(self.student, now - timedelta(minutes=5), 120, subject_name='فیزیک')
+
+        rollups = DailyStudyRollup.objects.filter(user=self.student, date=now.date())
+        self.assertEqual(rollups.count(), 2)
+        math = rollups.get(subject__name='ریاضی')
+        self.assertEqual((math.total_seconds, math.session_count), (900, 2))
+
+    def test_dashboard_stats_read_from_rollup(self):
+        now = timezone.now().replace(hour=12, minute=0)
+        post_session(self.student, now - timedelta(minutes=1), 600)
+        post_session(self.student, now - timedelta(days=3), 1200)
+        post_session(self.student, now - timedelta(days=20), 1800)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/dashboard/stats/')
+
+        self.assertEqual(response.data['week'], 1800)
+        self.assertEqual(response.data['month'], 3600)
+        self.assertEqual(response.data['total_sessions'], 3)
+
+    def test_rebuild_command_matches_incremental_rows(self):
+        now = timezone.now().replace(hour=12, minute=0)
+        post_session(self.student, now - timedelta(days=1), 600)
+        post_session(self.student, now - timedelta(days=1, minutes=30), 400)
+        post_session(self.student, now - timedelta(days=5), 300)
+        before = list(DailyStudyRollup.objects.values_list('date', 'subject', 'total_seconds', 'session_count'))
+
+        call_command('rebuild_study_rollups', stdout=StringIO())
+
+        after = list(DailyStudyRollup.objects.values_list('date', 'subject', 'total_seconds', 'session_count'))
+        self.assertEqual(sorted(before), sorted(after))
+
+
+class SchoolTimezoneTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tehran = School.objects.create(name='Tehran School', timezone='Asia/Tehran')
+        self.utc = School.objects.create(name='UTC School', timezone='UTC')
+        self.student = create_member(self.tehran, '09130000001')
+        self.other = create_member(self.utc, '09130000002')
+        # 00:30 on Jan 11 in Tehran (UTC+3:30), still Jan 10 in UTC
+        self.late = datetime(2026, 1, 10, 21, 0, tzinfo=dt_timezone.utc)
+        self.client = APIClient()
+
+    def test_windows_start_at_local_midnight(self):
+        windows = study_windows(self.late, school_zone(self.tehran))
+        self.assertEqual(windows['today'], date(2026, 1, 11))
+        self.assertEqual(windows['today_start'], datetime(2026, 1, 10, 20, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(study_windows(self.late, school_zone(self.utc))['today'], date(2026, 1, 10))
+
+    def test_rollup_days_follow_school_timezone(self):
+        post_session(self.student, self.late, 600)
+        post_session(self.other, self.late, 600)
+        incremental = sorted(DailyStudyRollup.objects.values_list('user', 'date'))
+        self.assertEqual(incremental, [(self.student.id, date(2026, 1, 11)), (self.other.id, date(2026, 1, 10))])
+
+        call_command('rebuild_study_rollups', stdout=StringIO())
+        self.assertEqual(sorted(DailyStudyRollup.objects.values_list('user', 'date')), incremental)
+
+        stats = user_rollup_stats(self.student, self.late + timedelta(minutes=30))
+        self.assertEqual(stats['today'], 600)
+
+    def test_invalid_timezone_rejected(self):
+        admin = create_member(None, '09100000000', is_superadmin=True)
+        self.client.force_authenticate(admin)
+        response = self.client.patch(f'/api/superadmin/schools/{self.utc.id}/', {'timezone': 'Mars/Base'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timezone', response.data)
+
+
+class LeaderboardTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School', timezone='UTC')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.ali = create_member(self.school, '09130000001', full_name='Ali', grade='10')
+        self.sara = create_member(self.school, '09130000002', full_name='Sara', grade='11')
+        self.reza = create_member(self.school, '09130000003', full_name='Reza', grade='10')
+        # Wednesday; with weeks starting on Saturday the week began on Jan 10
+        self.now = datetime(2026, 1, 14, 12, 0, tzinfo=dt_timezone.utc)
+        self.client = APIClient()
+
+    def names(self, period, **filters):
+        return [
+            (entry['full_name'], entry['total_seconds'])
+            for entry in leaderboard(self.school, period, self.now, **filters)['entries']
+        ]
+
+    def test_rankings_per_period_and_group(self):
+        post_session(self.ali, self.now - timedelta(hours=1), 600)
+        post_session(self.sara, self.now - timedelta(hours=2), 900)
+        post_session(self.reza, self.now - timedelta(days=3), 3000)   # Sunday, same week
+        post_session(self.ali, self.now - timedelta(days=5), 1200)    # Friday, previous week
+        post_session(self.sara, self.now - timedelta(days=20), 5000)  # previous month
+
+        self.assertEqual(self.names('day'), [('Sara', 900), ('Ali', 600)])
+        self.assertEqual(self.names('week'), [('Reza', 3000), ('Sara', 900), ('Ali', 600)])
+        self.assertEqual(self.names('month'), [('Reza', 3000), ('Ali', 1800), ('Sara', 900)])
+        self.assertEqual(self.names('month', grade='10', limit=1), [('Reza', 3000)])
+
+        incremental = sorted(LeaderboardEntry.objects.values_list('user', 'period', 'period_start', 'total_seconds'))
+        call_command('rebuild_study_rollups', stdout=StringIO())
+        rebuilt = sorted(LeaderboardEntry.objects.values_list('user', 'period', 'period_start', 'total_seconds'))
+        self.assertEqual(incremental, rebuilt)
+
+        with self.assertNumQueries(1):
+            leaderboard(self.school, 'week', self.now, olympiad_field='math')
+
+    def test_entries_follow_profile_changes(self):
+        post_session(self.ali, self.now - timedelta(hours=1), 600)
+        profile = UserProfile.objects.get(user=self.ali)
+        profile.grade = '12'
+        profile.save()
+        self.assertEqual(set(LeaderboardEntry.objects.values_list('grade', flat=True)), {'12'})
+
+        other = School.objects.create(name='Other School', timezone='UTC')
+        profile = UserProfile.objects.get(user=self.ali)
+        profile.school = other
+        profile.save()
+        self.assertEqual(set(LeaderboardEntry.objects.values_list('school', flat=True)), {other.id})
+
+        profile.role = 'manager'
+        profile.save()
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_manager_endpoint(self):
+        now = timezone.now()
+        post_session(self.ali, now - timedelta(minutes=1), 600)
+        post_session(self.reza, now - timedelta(minutes=2), 300)
+        self.client.force_authenticate(self.manager)
+
+        response = self.client.get('/api/manager/leaderboard/', {'period': 'week', 'grade': '10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(e['rank'], e['full_name']) for e in response.data['entries']],
+            [(1, 'Ali'), (2, 'Reza')]
+        )
+        kpis = self.client.get('/api/manager/dashboard/').data
+        self.assertEqual(kpis['top_student'], {'name': 'Ali', 'total': 600})
+
+        self.assertEqual(self.client.get('/api/manager/leaderboard/', {'period': 'year'}).status_code, 400)
+        self.client.force_authenticate(self.ali)
+        self.assertEqual(self.client.get('/api/manager/leaderboard/').status_code, 403)
+
+
+class SchoolDailyKPITests(BaseTestCase):
+    KPI_FIELDS = ('date', 'total_seconds', 'session_count', 'active_students', 'top_user', 'top_seconds')
+
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School', timezone='UTC')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.ali = create_member(self.school, '09130000001', full_name='Ali')
+        self.sara = create_member(self.school, '09130000002', full_name='Sara')
+        self.reza = create_member(self.school, '09130000003', full_name='Reza')
+        # Midday of the school's today, so no session crosses a day boundary
+        today = timezone.localdate(timezone=school_zone(self.school))
+        self.noon = datetime.combine(today, datetime.min.time(), tzinfo=school_zone(self.school)) + timedelta(hours=12)
+        self.client = APIClient()
+
+    def kpi_rows(self):
+        return list(SchoolDailyKPI.objects.order_by('date').values_list(*self.KPI_FIELDS))
+
+    def test_deleting_a_subject_takes_its_study_off_the_board_and_kpis(self):
+        post_session(self.ali, self.noon - timedelta(hours=2), 3600, subject_name='شیمی')
+        post_session(self.sara, self.noon - timedelta(hours=1), 600)
+        subject = Subject.objects.get(user=self.ali, name='شیمی')
+        self.client.force_authenticate(self.ali)
+        self.assertEqual(self.client.delete(f'/api/subjects/{subject.pk}/').status_code, 204)
+
+        for period in LeaderboardEntry.PERIODS:
+            entries = leaderboard(self.school, period, self.noon)['entries']
+            self.assertEqual([(entry['full_name'], entry['total_seconds']) for entry in entries], [('Sara', 600)])
+        self.assertEqual(self.kpi_rows(), [(self.noon.date(), 600, 1, 1, self.sara.id, 600)])
+
+    def test_incremental_rows_match_a_rebuild(self):
+        now = self.noon
+        post_session(self.ali, now - timedelta(days=2, hours=1), 600)
+        post_session(self.sara, now - timedelta(days=2, hours=2), 900)
+        post_session(self.ali, now - timedelta(days=2, hours=3), 300)     # ties Sara, lower id wins
+        post_session(self.reza, now - timedelta(days=1, hours=1), 1200)
+        post_session(self.reza, now - timedelta(days=1, hours=2), 60)
+
+        incremental = self.kpi_rows()
+        self.assertEqual(
+            [row[1:] for row in incremental],
+            [(1800, 3, 2, self.ali.id, 900), (1260, 2, 1, self.reza.id, 1260)]
+        )
+        call_command('rebuild_study_rollups', stdout=StringIO())
+        self.assertEqual(self.kpi_rows(), incremental)
+
+    def test_finalize_records_the_roster_and_keeps_it(self):
+        post_session(self.ali, self.noon - timedelta(days=1), 600)
+        post_session(self.ali, self.noon, 300)
+
+        out = StringIO()
+        call_command('finalize_school_kpis', stdout=out)
+        self.assertIn('Finalized 1 school KPI days', out.getvalue())
+        yesterday, today = SchoolDailyKPI.objects.order_by('date')
+        self.assertEqual((yesterday.finalized, yesterday.student_count), (True, 3))
+        self.assertEqual((today.finalized, today.student_count), (False, None))
+
+        # A student who leaves counts on open days only
+        profile = UserProfile.objects.get(user=self.sara)
+        profile.school = School.objects.create(name='Other School', timezone='UTC')
+        profile.save()
+        series = kpi_trend(self.school, 30, now=self.noon)['series']
+        self.assertEqual((series[-2]['student_count'], series[-2]['absent_count']), (3, 2))
+        self.assertEqual((series[-1]['student_count'], series[-1]['absent_count']), (2, 1))
+        self.assertEqual(finalize_days(self.school, now=self.noon), 0)
+
+    def test_rows_follow_a_student_who_moves(self):
+        post_session(self.ali, self.noon, 600)
+        other = School.objects.create(name='Other School', timezone='UTC')
+        profile = UserProfile.objects.get(user=self.ali)
+        profile.school = other
+        profile.save()
+        self.assertEqual(
+            list(SchoolDailyKPI.objects.values_list('school', 'total_seconds', 'top_user')),
+            [(other.id, 600, self.ali.id)]
+        )
+
+    def test_trend_endpoint(self):
+        post_session(self.sara, self.noon - timedelta(days=40), 900)
+        post_session(self.ali, self.noon, 600)
+        self.client.force_authenticate(self.manager)
+
+        response = self.client.get('/api/manager/dashboard/trend/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['series']), 30)
+        self.assertEqual(sum(day['total_seconds'] for day in response.data['series']), 600)
+        self.assertEqual(response.data['series'][-1]['top_student'], {'name': 'Ali', 'total': 600})
+        self.assertIsNone(response.data['series'][0]['top_student'])
+
+        response = self.client.get('/api/manager/dashboard/trend/', {'days': 90})
+        self.assertEqual(len(response.data['series']), 90)
+        self.assertEqual(sum(day['total_seconds'] for day in response.data['series']), 1500)
+        self.assertEqual(self.client.get('/api/manager/dashboard/trend/', {'days': 7}).status_code, 400)
+
+        with self.assertNumQueries(2):
+            kpi_trend(self.school, 365, now=self.noon)
+
+
+class ManagerExportExcelViewTests(BaseTestCase):
+    def test_export_is_scoped_to_manager_school(self):
+        from openpyxl import load_workbook
+
+        school = School.objects.create(name='Test School')
+        other_school = School.objects.create(name='Other School')
+        manager = create_member(school, '09120000000', role='manager')
+        student = create_member(school, '09130000001', full_name='Ali', grade='10')
+        create_member(other_school, '09130000002', full_name='Outsider')
+        create_session(student, timezone.now() - timedelta(days=2), 5400)
+        call_command('rebuild_study_rollups', stdout=StringIO())
+
+        client = APIClient()
+        client.force_authenticate(manager)
+        response = client.get('/api/manager/export/excel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1], ('Ali', '09130000001', 'دهم', None, '1.50', 1))
+
+
+@override_settings(REPORT_ROOT=Path(tempfile.mkdtemp()))
+class ReportJobTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali', grade='10')
+        create_session(self.student, timezone.now() - timedelta(days=1), 3600)
+        call_command('rebuild_study_rollups', stdout=StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def run_worker(self):
+        call_command('run_report_worker', once=True, stdout=StringIO(), stderr=StringIO())
+
+    def test_excel_job_lifecycle(self):
+        response = self.client.post('/api/manager/reports/', {'kind': 'excel'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(response.data['status'], 'pending')
+
+        self.run_worker()
+
+        status_response = self.client.get(f'/api/manager/reports/{job_id}/')
+        self.assertEqual(status_response.data['status'], 'done')
+        download = self.client.get(status_response.data['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'PK'))
+
+    def test_dashboard_export_flow(self):
+        # What the dashboard's Excel button does: submit, poll, download
+        from openpyxl import load_workbook
+
+        end = timezone.localdate(timezone=school_zone(self.school))
+        dates = {'start_date': (end - timedelta(days=30)).isoformat(), 'end_date': end.isoformat()}
+        job = self.client.post('/api/manager/reports/', {'kind': 'excel', **dates}, format='json').data
+        self.assertEqual(job['params'], dates)
+        self.assertEqual(self.client.get(f'/api/manager/reports/{job["id"]}/').data['status'], 'pending')
+        self.assertEqual(self.client.get(f'/api/manager/reports/{job["id"]}/download/').status_code, 409)
+
+        self.run_worker()
+
+        self.assertEqual(self.client.get(f'/api/manager/reports/{job["id"]}/').data['status'], 'done')
+        download = self.client.get(f'/api/manager/reports/{job["id"]}/download/')
+        self.assertEqual(download.status_code, 200)
+        workbook = load_workbook(BytesIO(b''.join(download.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[1][:2], ('Ali', '09130000001'))
+
+    def test_artifact_reused_until_data_changes(self):
+        first = self.client.post('/api/manager/reports/', {'kind': 'excel'}, format='json').data
+        self.run_worker()
+
+        again = self.client.post('/api/manager/reports/', {'kind': 'excel'}, format='json').data
+        self.assertEqual(again['status'], 'done')
+        self.assertNotEqual(again['id'], first['id'])
+
+        post_session(self.student, timezone.now() - timedelta(hours=1), 3600, subject_name='فیزیک')
+
+        changed = self.client.post('/api/manager/reports/', {'kind': 'excel'}, format='json').data
+        self.assertEqual(changed['status'], 'pending')
+
+    def test_student_pdf_endpoint_queues_then_serves_file(self):
+        url = f'/api/manager/students/{self.student.id}/report/pdf/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+
+        self.run_worker()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_stale_running_job_is_reclaimed(self):
+        self.client.post('/api/manager/reports/', {'kind': 'excel'}, format='json')
+        ReportJob.objects.update(status='running', started_at=timezone.now() - timedelta(hours=1))
+
+        self.run_worker()
+
+        self.assertEqual(ReportJob.objects.get().status, 'done')
+
+
+class StudySessionBulkUploadTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.student = create_member(self.school, '09130000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def items(self, count, subject_name='ریاضی'):
+        start = study_windows(zone=school_zone(self.school))['today_start'] + timedelta(hours=8)
+        return [{
+            'client_id': str(uuid.uuid4()),
+            'subject_name': subject_name,
+            'start_time': (start + timedelta(minutes=i)).isoformat(),
+            'end_time': (start + timedelta(minutes=i, seconds=30)).isoformat(),
+        } for i in range(count)]
+
+    def upload(self, items):
+        return self.client.post('/api/sessions/bulk/', {'sessions': items}, format='json')
+
+    def test_retrying_a_batch_does_not_duplicate(self):
+        items = self.items(3)
+        first = self.upload(items)
+        self.assertEqual([r['status'] for r in first.data['results']], ['created'] * 3)
+
+        retry = self.upload(items + self.items(1, subject_name='فیزیک'))
+        statuses = [r['status'] for r in retry.data['results']]
+        self.assertEqual(statuses, ['duplicate'] * 3 + ['created'])
+        self.assertEqual(
+            [r['id'] for r in retry.data['results'][:3]],
+            [r['id'] for r in first.data['results']]
+        )
+        self.assertEqual(StudySession.objects.filter(user=self.student).count(), 4)
+        self.assertEqual(Subject.objects.filter(user=self.student).count(), 2)
+
+        # bulk_create skips signals, so rollups and cached stats are updated explicitly
+        stats = self.client.get('/api/dashboard/stats/').data
+        self.assertEqual(stats['today'], 120)
+        self.assertEqual(stats['total_sessions'], 4)
+
+    def test_invalid_and_repeated_items_are_reported(self):
+        items = self.items(2)
+        items[1]['end_time'] = items[1]['start_time'][:-6] + 'x'
+        items.append(dict(items[0]))
+        response = self.upload(items)
+
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'invalid', 'duplicate'])
+        self.assertIn('end_time', results[1]['errors'])
+        self.assertEqual(results[2]['id'], results[0]['id'])
+        self.assertEqual(StudySession.objects.filter(user=self.student).count(), 1)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.upload(self.items(5))
+        with CaptureQueriesContext(connection) as large:
+            self.upload(self.items(200))
+        self.assertLessEqual(len(large), len(small))
+        self.assertEqual(DailyStudyRollup.objects.get(user=self.student).session_count, 205)
+
+
+class SuperAdminSchoolListTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = create_member(None, '09100000000', is_superadmin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_schools(self, count, offset=0):
+        schools = School.objects.bulk_create([
+            School(name=f'School {i:04d}', invitation_code=f'C{i:07d}') for i in range(offset, offset + count)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'0912{i:07d}') for i in range(offset, offset + count)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, school=school, phone_number=user.username,
+                        role='manager', full_name=f'Manager {school.name}')
+            for user, school in zip(users, schools)
+        ])
+        return schools
+
+    def test_annotated_fields(self):
+        school = School.objects.create(name='Alborz')
+        create_member(school, '09120000001', role='manager', full_name='Ms. Manager')
+        create_member(school, '09130000001')
+        create_member(school, '09130000002')
+        School.objects.create(name='Empty')
+
+        response = self.client.get('/api/superadmin/schools/', {'ordering': 'name'})
+        self.assertEqual(response.data['count'], 2)
+        rows = {row['name']: row for row in response.data['results']}
+        self.assertEqual(rows['Alborz']['member_count'], 2)
+        self.assertEqual(rows['Alborz']['manager_name'], 'Ms. Manager')
+        self.assertEqual(rows['Empty']['member_count'], 0)
+        self.assertEqual(rows['Empty']['manager_name'], 'تعیین نشده')
+
+        response = self.client.get('/api/superadmin/schools/', {'search': 'alb'})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Alborz'])
+
+        created = self.client.post('/api/superadmin/schools/', {'name': 'New'}, format='json')
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.data['member_count'], 0)
+
+    def test_query_budget_is_fixed_for_1000_schools(self):
+        self.add_schools(10)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/superadmin/schools/', {'page_size': 10})
+        self.add_schools(990, offset=10)
+        # Count plus one annotated page query
+        self.assertEqual(len(small), 2)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/superadmin/schools/', {'page_size': 500, 'ordering': '-member_count'})
+        self.assertEqual(response.data['count'], 1000)
+        self.assertEqual(len(response.data['results']), 500)
+
+        school = School.objects.get(name='School 0000')
+        for i in range(30):
+            create_member(school, f'0913{i:07d}')
+        # School with its annotations, member count, member page
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/superadmin/schools/{school.id}/members/', {'page_size': 500})
+        self.assertEqual(response.data['total_count'], 31)
+        self.assertEqual(response.data['members'][0]['role'], 'مدیر')
+
+
+class CachedPrincipalTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001')
+        self.client = APIClient()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_user_profile_and_school_in_one_query_then_cached(self):
+        self.login(self.student)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.post('/api/profile/heartbeat/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post('/api/profile/heartbeat/').status_code, 200)
+
+    def test_assigning_a_new_manager_revokes_the_old_one(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get('/api/manager/dashboard/').status_code, 200)
+
+        admin = create_member(None, '09100000000', is_superadmin=True)
+        self.login(admin)
+        response = self.client.post(
+            f'/api/superadmin/schools/{self.school.id}/assign-manager/',
+            {'phone_number': '09120000009'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.login(self.manager)
+        self.assertEqual(self.client.get('/api/manager/dashboard/').status_code, 403)
+
+
+class RequestMetricsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        get_request_metrics().reset()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.admin = create_member(None, '09100000000', is_superadmin=True)
+        self.client = APIClient()
+
+    def test_report_percentiles_per_url_name(self):
+        self.client.force_authenticate(self.manager)
+        for _ in range(3):
+            self.client.get('/api/manager/students/')
+        self.client.force_authenticate(self.admin)
+        report = self.client.get('/api/superadmin/metrics/').data['endpoints']
+
+        students = report['manager_student_list']
+        self.assertEqual(students['count'], 3)
+        self.assertEqual(students['queries']['p50'], 1)
+        self.assertGreater(students['bytes']['p99'], 0)
+        self.assertLessEqual(students['sql_ms']['p95'], students['total_ms']['p95'])
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/superadmin/metrics/').status_code, 403)
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/manager/students/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries", app;dur=[\d.]+$')
+
+    def test_database_pool_endpoint(self):
+        self.client.force_authenticate(self.admin)
+        report = self.client.get('/api/superadmin/db-pool/').data
+        self.assertEqual(report['mode'], settings.DB_POOL_MODE)
+        self.assertEqual(report['engine'], connection.settings_dict['ENGINE'])
+        self.assertEqual(
+            [pool['alias'] for pool in report['pools']], ['default'] if settings.DB_POOL_MODE == 'pool' else []
+        )
+        self.assertEqual(self.client.delete('/api/superadmin/db-pool/').status_code, 204)
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/superadmin/db-pool/').status_code, 403)
+
+    def test_percentile_is_nearest_rank(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([percentile(ordered, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class ConnectionPoolTests(BaseTestCase):
+    """api.dbpool on SQLite connections; the PostgreSQL engine only adds the hooks"""
+
+    def setUp(self):
+        super().setUp()
+        self.pool = ConnectionPool(self.is_usable, lambda conn: True, max_size=2, timeout=0.05)
+
+    @staticmethod
+    def connect():
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    @staticmethod
+    def is_usable(conn):
+        try:
+            conn.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def test_reuses_connections_up_to_max_size(self):
+        first, second = self.pool.checkout(self.connect), self.pool.checkout(self.connect)
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout(self.connect)
+        self.pool.checkin(first)
+        self.assertIs(self.pool.checkout(self.connect), first)
+
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['idle']), (2, 2, 0))
+        self.assertEqual((stats['checkouts'], stats['connects'], stats['timeouts']), (3, 2, 1))
+        self.assertLessEqual(stats['wait_ms']['p50'], stats['checkout_ms']['p50'])
+
+    def test_waiter_gets_the_connection_given_back(self):
+        self.pool.timeout = 2
+        held = [self.pool.checkout(self.connect), self.pool.checkout(self.connect)]
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(self.pool.checkout(self.connect)))
+        waiter.start()
+        time.sleep(0.1)
+        self.assertEqual(self.pool.stats()['waiting'], 1)
+        self.pool.checkin(held[0])
+        waiter.join()
+        self.assertIs(borrowed[0], held[0])
+        self.assertGreaterEqual(self.pool.stats()['wait_ms']['max'], 100)
+
+    def test_dead_and_discarded_connections_are_replaced(self):
+        conn = self.pool.checkout(self.connect)
+        self.pool.checkin(conn)
+        conn.close()   # e.g. dropped by a failover while idle
+        replacement = self.pool.checkout(self.connect)
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(self.is_usable(replacement))
+
+        self.pool.checkin(replacement, discard=True)
+        with self.assertRaises(sqlite3.Error):
+            self.pool.checkout(lambda: sqlite3.connect('/nonexistent/dir/db.sqlite3'))
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['in_use']), (0, 0))
+        self.assertEqual((stats['check_failures'], stats['discarded']), (1, 1))
+
+
+class StudySessionListPaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = create_member(None, '09130000001')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.now = timezone.now().replace(microsecond=0)
+        # Two sessions share a start_time to exercise the id tie-breaker
+        self.sessions = [create_session(self.student, self.now - timedelta(hours=i // 2), 600) for i in range(7)]
+
+    def test_cursor_walks_every_session_once(self):
+        seen = []
+        url = '/api/sessions/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(s.id for s in self.sessions))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_since_until_window(self):
+        response = self.client.get('/api/sessions/', {
+            'since': (self.now - timedelta(hours=2)).isoformat(),
+            'until': (self.now - timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual([row['id'] for row in response.data['results']],
+                         [s.id for s in reversed(self.sessions[4:6])])
+        self.assertIsNone(response.data['next'])
+
+    def test_subject_is_joined_in_the_page_query(self):
+        # The ETag watermark plus the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/sessions/')
+        self.assertEqual(response.data['results'][0]['subject_name'], 'ریاضی')
+
+    def test_dates_are_days_of_the_users_school(self):
+        school = School.objects.create(name='Tokyo School', timezone='Asia/Tokyo')
+        student = create_member(school, '09130000002')
+        # 05:00 of 2026-03-10 in Tokyo
+        session = create_session(student, datetime(2026, 3, 9, 20, tzinfo=dt_timezone.utc), 600)
+        self.client.force_authenticate(student)
+        for params, expected in (({'since': '2026-03-10'}, [session.id]), ({'until': '2026-03-10'}, [])):
+            response = self.client.get('/api/sessions/', params)
+            self.assertEqual([row['id'] for row in response.data['results']], expected)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/sessions/', {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sessions/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class StudentAnalyticsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School', timezone='UTC')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.today = timezone.localdate(timezone.now(), dt_timezone.utc)
+        self.noon = datetime.combine(self.today, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=12)
+
+    def test_streaks_scan(self):
+        today = date(2026, 1, 10)
+        days = [date(2026, 1, d) for d in (1, 2, 3, 4, 7, 8, 9)]
+        self.assertEqual(study_streaks(days, today), (3, 4))
+        self.assertEqual(study_streaks(days + [today], today), (4, 4))
+        self.assertEqual(study_streaks(days[:4], today), (0, 4))
+        self.assertEqual(study_streaks([], today), (0, 0))
+
+    def test_series_subjects_and_streaks(self):
+        for days_ago in (1, 2, 3, 10):
+            post_session(self.student, self.noon - timedelta(days=days_ago), 600)
+        post_session(self.student, self.noon - timedelta(days=2), 300, subject_name='فیزیک')
+        post_session(self.student, self.noon - timedelta(days=40), 900)
+
+        response = self.client.get('/api/dashboard/analytics/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(len(data['days']), 30)
+        self.assertEqual(data['days'][-1], {'date': self.today.isoformat(), 'total_seconds': 0})
+        self.assertEqual(data['days'][-3]['total_seconds'], 900)
+        self.assertEqual(data['total_seconds'], 2700)
+        self.assertEqual(data['active_days'], 4)
+        self.assertEqual([s['name'] for s in data['subjects']], ['ریاضی', 'فیزیک'])
+        self.assertEqual((data['current_streak'], data['longest_streak']), (3, 3))
+
+        ranged = self.client.get('/api/dashboard/analytics/', {
+            'start': (self.today - timedelta(days=40)).isoformat(),
+            'end': (self.today - timedelta(days=40)).isoformat(),
+        }).data
+        self.assertEqual(ranged['total_seconds'], 900)
+
+        bad = self.client.get('/api/dashboard/analytics/', {'start': self.today.isoformat(), 'end': '2000-01-01'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_etag_answers_304_without_queries(self):
+        post_session(self.student, self.noon - timedelta(days=1), 600)
+        first = self.client.get('/api/dashboard/analytics/')
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/dashboard/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        post_session(self.student, self.noon, 300)
+        response = self.client.get('/api/dashboard/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalGetTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_student_reads_answer_304_without_queries(self):
+        create_session(self.student, timezone.now() - timedelta(hours=1), 600)
+        for url in ('/api/profile/', '/api/dashboard/stats/', '/api/subjects/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('no-cache', first['Cache-Control'])
+            with self.assertNumQueries(0):
+                response = self.revalidate(url, first['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_session_list_etag_follows_writes_and_renames(self):
+        subject = create_session(self.student, timezone.now() - timedelta(hours=2), 600).subject
+        etag = self.client.get('/api/sessions/')['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate('/api/sessions/', etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/sessions/?limit=1')['ETag'], etag)
+
+        subject.name = 'فیزیک'
+        subject.save()
+        response = self.revalidate('/api/sessions/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['subject_name'], 'فیزیک')
+
+        etag = response['ETag']
+        create_session(self.student, timezone.now() - timedelta(hours=1), 300, subject=subject)
+        self.assertEqual(self.revalidate('/api/sessions/', etag).status_code, 200)
+
+    def test_manager_reads_change_with_student_writes(self):
+        self.client.force_authenticate(self.manager)
+        urls = [
+            '/api/manager/dashboard/',
+            '/api/manager/students/',
+            '/api/manager/leaderboard/',
+            f'/api/manager/students/{self.student.id}/profile/',
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        for url in urls:
+            self.assertEqual(self.revalidate(url, etags[url]).status_code, 304, url)
+
+        create_session(self.student, timezone.now() - timedelta(hours=1), 600)
+        for url in urls:
+            self.assertEqual(self.revalidate(url, etags[url]).status_code, 200, url)
+
+    def test_profile_update_changes_etag(self):
+        etag = self.client.get('/api/profile/')['ETag']
+        self.client.patch('/api/profile/', {'full_name': 'Ali Rezaei'}, format='json')
+        response = self.revalidate('/api/profile/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['full_name'], 'Ali Rezaei')
+
+
+class ApiCompressionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        for i in range(3):
+            create_member(self.school, f'0913000000{i}', full_name=f'Student {i}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    @mock.patch('api.compression.brotli', None)
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding(''))
+        self.assertIsNone(negotiate_encoding('gzip;q=0, identity'))
+        self.assertIsNone(negotiate_encoding('*;q=0'))
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=200)
+    @mock.patch('api.compression.brotli', None)
+    def test_large_api_responses_are_gzipped(self):
+        plain = self.client.get('/api/manager/students/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/api/manager/students/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        revalidated = self.client.get('/api/manager/students/', HTTP_ACCEPT_ENCODING='gzip',
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+        small = self.client.get('/api/profile/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    def test_columnar_rewrites_lists_of_rows(self):
+        data = {'count': 2, 'rows': [{'id': 1, 'tags': [{'k': 'a'}]}, {'id': 2, 'tags': []}], 'ids': [1, 2]}
+        self.assertEqual(columnar(data), {
+            'count': 2, 'rows': {'id': [1, 2], 'tags': [{'k': ['a']}, []]}, 'ids': [1, 2]
+        })
+        self.assertEqual(columnar([{'a': 1}, {'b': 2}]), [{'a': 1}, {'b': 2}])
+
+        rows = self.client.get('/api/manager/students/').json()
+        columns = self.client.get('/api/manager/students/', {'format': 'columnar'}).json()
+        self.assertEqual(columns['count'], 3)
+        self.assertEqual(columns['students']['full_name'], [row['full_name'] for row in rows['students']])
+
+    def test_payload_benchmark(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'payloads.json'
+            call_command('benchmark_payloads', students=3, sessions=2, repeat=1,
+                         only=['manager_student_list'], save=str(path), stdout=out)
+            result = json.loads(path.read_text())['payloads']['manager_student_list']
+        self.assertLess(result['columnar']['bytes'], result['json']['bytes'])
+        self.assertIn('gzip', result['json'])
+        self.assertEqual(School.objects.count(), 1)
+
+
+class ValuesSerializerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School', timezone='UTC')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali', grade='11')
+        create_member(self.school, '09130000002')
+        now = timezone.now()
+        self.sessions = [create_session(self.student, now - timedelta(hours=i, minutes=7), 900 + i) for i in range(5)]
+        self.sessions[0].client_id = uuid.uuid4()
+        self.sessions[0].end_time = None
+        self.sessions[0].save()
+        self.client = APIClient()
+
+    def test_session_page_matches_model_serializer(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get('/api/sessions/', {'page_size': 3})
+        instances = StudySession.objects.filter(user=self.student).order_by('-start_time', '-id')[:3]
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']),
+            JSONRenderer().render(StudySessionSerializer(instances, many=True).data)
+        )
+        next_page = self.client.get(response.data['next']).data['results']
+        self.assertEqual([row['id'] for row in next_page], [s.id for s in self.sessions[3:]])
+
+    def test_student_list_matches_serializer(self):
+        rows = student_list_rows(UserProfile.objects.filter(role='student'), zone=dt_timezone.utc)
+        self.assertEqual(
+            JSONRenderer().render(values_serializer(ManagerStudentListSerializer).render(rows)),
+            JSONRenderer().render(ManagerStudentListSerializer(rows, many=True).data)
+        )
+
+    def test_microbenchmark_checks_output(self):
+        out = StringIO()
+        call_command('benchmark_serializers', rows=50, repeat=1, stdout=out)
+        self.assertIn('manager_student_list', out.getvalue())
+
+
+class ServerTimerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.t0 = timezone.now() - timedelta(hours=3)
+
+    def test_pauses_are_merged_out_of_the_duration(self):
+        start_timer(self.student, subject_name='ریاضی', now=self.t0)
+        pause_timer(self.student, self.t0 + timedelta(minutes=10))
+        pause_timer(self.student, self.t0 + timedelta(minutes=15))
+        resume_timer(self.student, self.t0 + timedelta(minutes=30))
+        session = stop_timer(self.student, now=self.t0 + timedelta(minutes=45))
+
+        self.assertEqual(session.duration_seconds, 25 * 60)
+        self.assertEqual((session.start_time, session.end_time), (self.t0, self.t0 + timedelta(minutes=45)))
+        self.assertEqual(session.subject.name, 'ریاضی')
+        self.assertFalse(ActiveSession.objects.exists())
+        self.assertEqual(DailyStudyRollup.objects.get(user=self.student).total_seconds, 25 * 60)
+
+    def test_rejected_start_creates_no_subject(self):
+        start_timer(self.student, now=self.t0)
+        response = self.client.post('/api/timer/start/', {'subject_name': 'شیمی'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Subject.objects.filter(name='شیمی').exists())
+
+    def test_endpoints(self):
+        self.assertEqual(self.client.get('/api/timer/').status_code, 404)
+        self.assertEqual(self.client.post('/api/timer/pause/').status_code, 404)
+
+        response = self.client.post('/api/timer/start/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['state'], 'running')
+        self.assertEqual(self.client.post('/api/timer/start/', {}, format='json').status_code, 409)
+        self.assertEqual(get_presence_store().active_count(self.school.id), 1)
+
+        self.assertEqual(self.client.post('/api/timer/pause/').data['state'], 'paused')
+        self.assertEqual(self.client.get('/api/timer/').data['state'], 'paused')
+        self.assertEqual(self.client.post('/api/timer/resume/').data['state'], 'running')
+
+        ActiveSession.objects.update(segment_started_at=F('segment_started_at') - timedelta(minutes=5))
+        response = self.client.post('/api/timer/stop/', {'subject_name': 'فیزیک'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['session']['subject_name'], 'فیزیک')
+        self.assertGreaterEqual(response.data['session']['duration_seconds'], 300)
+        self.assertEqual(self.client.get('/api/timer/').status_code, 404)
+        self.assertEqual(get_presence_store().active_count(self.school.id), 0)
+
+    def test_manager_sees_live_time(self):
+        start_timer(self.student, now=timezone.now() - timedelta(minutes=20))
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/manager/live-sessions/').data
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['sessions'][0]['full_name'], 'Ali')
+        self.assertGreaterEqual(data['in_progress_seconds'], 20 * 60)
+
+    def test_heartbeat_keeps_the_timer_alive(self):
+        start_timer(self.student, now=self.t0)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.student).access_token}')
+        self.client.post('/api/profile/heartbeat/')
+        self.assertGreater(ActiveSession.objects.get().last_seen_at, self.t0)
+        with self.assertNumQueries(0):
+            self.client.post('/api/profile/heartbeat/')
+        self.assertEqual(close_abandoned_sessions(), [])
+
+    def test_sweep_closes_abandoned_timers(self):
+        other = create_member(self.school, '09130000002')
+        paused = create_member(self.school, '09130000003')
+        start_timer(self.student, now=self.t0)
+        touch_timer(self.student, self.t0 + timedelta(minutes=12))
+        start_timer(other, now=timezone.now() - timedelta(minutes=1))
+        start_timer(paused, now=self.t0)
+        pause_timer(paused, self.t0 + timedelta(minutes=1))
+
+        out = StringIO()
+        call_command('sweep_active_sessions', once=True, stdout=out)
+        session = StudySession.objects.get(user=self.student)
+        self.assertEqual(session.duration_seconds, 12 * 60)
+        self.assertEqual(session.subject.name, 'مطالعه')
+        self.assertEqual(set(ActiveSession.objects.values_list('user_id', flat=True)), {other.id, paused.id})
+        self.assertIn(f'user {self.student.id}', out.getvalue())
+
+        later = close_abandoned_sessions(timezone.now() + timedelta(days=1))
+        self.assertEqual({session.user_id: session.duration_seconds for session in later}[paused.id], 60)
+        self.assertFalse(ActiveSession.objects.exists())
+
+
+class AsyncViewTests(TransactionTestCase):
+    """
+    The async views served through Django's ASGI handler. Its executor
+    threads have their own connections, so fixtures must be committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_request_metrics().reset()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        now = timezone.now()
+        for days in (0, 1, 3):
+            create_session(self.student, now - timedelta(days=days, hours=1), 1800 + days)
+        call_command('rebuild_study_rollups', stdout=StringIO())
+        self.urls = [
+            ('/api/dashboard/stats/', self.student),
+            ('/api/manager/dashboard/', self.manager),
+            (f'/api/manager/students/{self.student.id}/profile/', self.manager),
+        ]
+
+    def asgi_get(self, url, user, etag=None):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        if etag:
+            headers['If-None-Match'] = etag
+        return async_to_sync(AsyncClient().get)(url, headers=headers)
+
+    def test_same_bytes_as_the_wsgi_handler(self):
+        client = APIClient()
+        for url, user in self.urls:
+            client.force_authenticate(user)
+            expected = client.get(url)
+            cache.clear()
+            response = self.asgi_get(url, user)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+
+    def test_errors_and_revalidation(self):
+        outsider = create_member(School.objects.create(name='Other'), '09130000002')
+        self.assertEqual(self.asgi_get('/api/manager/students/999999/profile/', self.manager).status_code, 404)
+        self.assertEqual(self.asgi_get(f'/api/manager/students/{outsider.id}/profile/', self.manager).status_code, 403)
+        self.assertEqual(self.asgi_get('/api/manager/dashboard/', self.student).status_code, 403)
+
+        etag = self.asgi_get('/api/manager/dashboard/', self.manager)['ETag']
+        self.assertEqual(self.asgi_get('/api/manager/dashboard/', self.manager, etag).status_code, 304)
+
+    def test_profile_reads_fan_out_with_the_same_result(self):
+        url = f'/api/manager/students/{self.student.id}/profile/'
+        pooled = self.asgi_get(url, self.manager)
+        cache.clear()
+        with mock.patch('api.fanout._in_transaction', return_value=True):
+            sequential = self.asgi_get(url, self.manager)
+        self.assertEqual(pooled.content, sequential.content)
+        data = json.loads(pooled.content)
+        self.assertEqual(data['total_sessions'], 3)
+        self.assertEqual(len(data['heatmap_data']), 3)
+        self.assertEqual(data['week'], user_rollup_stats(self.student)['week'])
+
+    def test_fan_out_waits_for_the_slowest_call(self):
+        def slow(value):
+            time.sleep(0.2)
+            return value
+
+        started = time.perf_counter()
+        results = async_to_sync(fan_out)(lambda: slow(1), lambda: slow(2), lambda: slow(3))
+        self.assertEqual(results, [1, 2, 3])
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+    def test_request_metrics_count_queries_run_by_the_async_orm(self):
+        self.asgi_get('/api/manager/dashboard/', self.manager)
+        report = get_request_metrics().report()['manager_dashboard_kpi']
+        # Principal, then the roster count and today's and yesterday's KPI rows
+        self.assertEqual(report['queries']['p50'], 3)
+
+
+class StatsCacheTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001', full_name='Ali')
+        # Sessions go in the school's today, whatever the UTC time
+        self.today_start = study_windows(zone=school_zone(self.school))['today_start']
+        self.client = APIClient()
+
+    def test_generations_of_unknown_ids_expire(self):
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/manager/students/987654/profile/').status_code, 404)
+        self.assertIsNotNone(cache.get('gen:user:987654'))
+        later = time.time() + settings.STATS_GENERATION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertIsNone(cache.get('gen:user:987654'))
+
+    def test_dashboard_stats_cached_until_session_saved(self):
+        post_session(self.student, self.today_start + timedelta(minutes=11), 600)
+        self.client.force_authenticate(self.student)
+        first = self.client.get('/api/dashboard/stats/').data
+        with self.assertNumQueries(0):
+            cached_response = self.client.get('/api/dashboard/stats/').data
+        self.assertEqual(first, cached_response)
+
+        post_session(self.student, self.today_start + timedelta(minutes=21), 1200)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/dashboard/stats/').data['total_sessions'], 2)
+
+    def test_manager_views_invalidated_by_student_writes(self):
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/manager/dashboard/').data['absent_count'], 1)
+        profile_url = f'/api/manager/students/{self.student.id}/profile/'
+        self.assertEqual(self.client.get(profile_url).data['total_sessions'], 0)
+
+        post_session(self.student, self.today_start + timedelta(minutes=31), 1800)
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/manager/dashboard/').data['absent_count'], 0)
+        self.assertEqual(self.client.get(profile_url).data['total_sessions'], 1)
+
+    def test_cached_days_roll_over_at_the_school_midnight(self):
+        tehran = School.objects.create(name='Tehran School', timezone='Asia/Tehran')
+        # 20:00 and 21:00 UTC are 23:30 and 00:30 in Tehran, on the same UTC day
+        evening, night = (datetime(2026, 1, 14, hour, 0, tzinfo=dt_timezone.utc) for hour in (20, 21))
+        keys, signatures = [], []
+        for now in (evening, night):
+            with mock.patch('django.utils.timezone.now', return_value=now):
+                keys.append(cache_key('manager_kpi', 'school', tehran.id, 1, zone=school_zone(tehran)))
+                signatures.append(live.kpi_signature(tehran))
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertNotEqual(signatures[0], signatures[1])
+
+    def test_profile_move_invalidates_old_school(self):
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/manager/dashboard/').data['total_students'], 1)
+
+        profile = UserProfile.objects.get(user=self.student)
+        profile.school = School.objects.create(name='Other School')
+        profile.save()
+
+        self.assertEqual(self.client.get('/api/manager/dashboard/').data['total_students'], 0)
+
+
+class PresenceTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001')
+        self.client = APIClient()
+
+    def active_now(self):
+        self.client.force_authenticate(self.manager)
+        return self.client.get('/api/manager/dashboard/').data['active_now']
+
+    def test_heartbeat_does_not_write_profile(self):
+        self.client.force_authenticate(self.student)
+        # At most the throttled server-side timer touch
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/profile/heartbeat/')
+        self.assertEqual([q['sql'].split()[1] for q in captured], ['"api_activesession"'])
+        with self.assertNumQueries(0):
+            self.client.post('/api/profile/heartbeat/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.active_now(), 1)
+
+    def test_study_status_stop_leaves(self):
+        self.client.force_authenticate(self.student)
+        self.client.post('/api/profile/study-status/', {'is_studying': True}, format='json')
+        self.assertEqual(self.active_now(), 1)
+        self.client.force_authenticate(self.student)
+        self.client.post('/api/profile/study-status/', {'is_studying': False}, format='json')
+        self.assertEqual(self.active_now(), 0)
+
+    def test_cache_store_keeps_concurrent_arrivals(self):
+        store = CachePresenceStore(ttl=60)
+        cache_class = type(get_cache())
+        read = cache_class.get
+
+        def slow_read(self, *args, **kwargs):
+            # Widen the gap between reading and writing the school's entry
+            value = read(self, *args, **kwargs)
+            time.sleep(0.005)
+            return value
+
+        threads = [threading.Thread(target=store.heartbeat, args=(1, user_id)) for user_id in range(10)]
+        with mock.patch.object(cache_class, 'get', slow_read):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(store.active_count(1), 10)
+        store.leave(1, 3)
+        store.heartbeat(1, 4)
+        self.assertEqual(store.active_users(1), set(range(10)) - {3})
+
+    def test_per_process_presence_is_flagged(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(DEBUG=False, CACHES=locmem, PRESENCE_BACKEND='cache'):
+            self.assertEqual([warning.id for warning in check_presence_is_shared(None)], ['api.W001'])
+        with self.settings(DEBUG=False, PRESENCE_BACKEND='memory'):
+            self.assertEqual(len(check_presence_is_shared(None)), 1)
+
+    def test_stores_expire_after_ttl(self):
+        for store_class in (MemoryPresenceStore, CachePresenceStore):
+            store = store_class(ttl=60)
+            with mock.patch('api.presence.time.time', return_value=1000):
+                store.heartbeat(1, 10)
+            with mock.patch('api.presence.time.time', return_value=1030):
+                store.heartbeat(1, 11)
+                self.assertEqual(store.active_count(1), 2)
+            with mock.patch('api.presence.time.time', return_value=1070):
+                self.assertEqual(store.active_users(1), {11})
+                self.assertEqual(store.active_count(2), 0)
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.05)
+class LiveStreamTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        live._broadcaster = None
+        self.school = School.objects.create(name='Test School')
+        self.manager = create_member(self.school, '09120000000', role='manager')
+        self.student = create_member(self.school, '09130000001')
+
+    def stream(self, user=None, query=None, headers=()):
+        if query is None:
+            query = f'ticket={live.issue_stream_ticket(user)}' if user else ''
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/manager/dashboard/stream/',
+            'query_string': query.encode(),
+            'headers': list(headers),
+        }
+        return ApplicationCommunicator(live.LiveStreamRouter(None), scope)
+
+    async def status_of(self, communicator):
+        await communicator.send_input({'type': 'http.request'})
+        status = (await communicator.receive_output(timeout=5))['status']
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=5)
+        return status
+
+    async def read_event(self, communicator):
+        message = await communicator.receive_output(timeout=5)
+        event, data = message['body'].decode().strip().split('\n')[-2:]
+        return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_rejects_students_and_missing_tokens(self):
+        for user, status in ((None, 401), (self.student, 403)):
+            communicator = self.stream(user)
+            await communicator.send_input({'type': 'http.request'})
+            self.assertEqual((await communicator.receive_output(timeout=5))['status'], status)
+            await communicator.wait(timeout=5)
+
+    async def test_tickets_work_once_and_tokens_only_in_the_header(self):
+        client = AsyncClient()
+        token = RefreshToken.for_user(self.manager).access_token
+        response = await client.post('/api/manager/dashboard/stream/ticket/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 201)
+        ticket = response.json()['ticket']
+
+        self.assertEqual(await self.status_of(self.stream(query=f'ticket={ticket}')), 200)
+        self.assertEqual(await self.status_of(self.stream(query=f'ticket={ticket}')), 401)
+        self.assertEqual(await self.status_of(self.stream(query=f'token={token}')), 401)
+        header = (b'authorization', f'Bearer {token}'.encode())
+        self.assertEqual(await self.status_of(self.stream(query='', headers=[header])), 200)
+
+        student_token = RefreshToken.for_user(self.student).access_token
+        response = await client.post('/api/manager/dashboard/stream/ticket/', headers={'Authorization': f'Bearer {student_token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_tickets_live_in_the_shared_stats_cache(self):
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+            'stats': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'stats'},
+        }
+        with self.settings(CACHES=caches_setting, STATS_CACHE_ALIAS='stats'):
+            ticket = live.issue_stream_ticket(self.manager)
+            self.assertIsNone(cache.get(f'stream_ticket:{ticket}'))
+            self.assertEqual(live.redeem_stream_ticket(ticket), self.manager)
+
+    async def test_dashboard_says_whether_to_stream(self):
+        client = AsyncClient()
+        token = RefreshToken.for_user(self.manager).access_token
+        for enabled in (True, False):
+            with self.settings(LIVE_STREAM_ENABLED=enabled):
+                response = await client.get('/api/manager/dashboard/', headers={'Authorization': f'Bearer {token}'})
+            self.assertIs(response.json()['live_stream'], enabled)
+
+    async def test_snapshot_then_deltas_on_change(self):
+        communicator = self.stream(self.manager)
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=5)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), start['headers'])
+
+        event, snapshot = await self.read_event(communicator)
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual(snapshot['active_now'], 0)
+        self.assertEqual(snapshot['total_students'], 1)
+
+        await sync_to_async(get_presence_store().heartbeat)(self.school.id, self.student.id)
+        self.assertEqual(await self.read_event(communicator), ('delta', {'active_now': 1}))
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=5)
+        self.assertEqual(live.get_broadcaster().subscriber_count(), 0)
+
+    @override_settings(LIVE_ERROR_BACKOFF=0)
+    async def test_poller_survives_failed_ticks(self):
+        broadcaster = live.KPIBroadcaster(poll_interval=0.01, queue_size=10)
+        check = broadcaster._check
+        failures = iter([RuntimeError('db down')])
+
+        def flaky_check(school, signature):
+            error = next(failures, None)
+            if error:
+                raise error
+            return check(school, signature)
+
+        broadcaster._check = flaky_check
+        with self.assertLogs('api.live', 'ERROR'):
+            queue, _ = await broadcaster.subscribe(self.school)
+            await sync_to_async(get_presence_store().heartbeat)(self.school.id, self.student.id)
+            event, delta = await asyncio.wait_for(queue.get(), timeout=5)
+        self.assertEqual((event, delta), ('delta', {'active_now': 1}))
+        self.assertFalse(broadcaster._pollers[self.school.id].done())
+        broadcaster.unsubscribe(self.school.id, queue)
+
+    async def test_failed_snapshot_registers_no_subscriber(self):
+        broadcaster = live.KPIBroadcaster(poll_interval=0, queue_size=10)
+        with mock.patch.object(live, 'current_kpis', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                await broadcaster.subscribe(self.school)
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+        self.assertEqual(broadcaster._pollers, {})
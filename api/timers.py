@@ -0,0 +1,214 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .authentication import forget_principals
+from .cache import get_cache
+from .models import ActiveSession, DailyStudyRollup, LeaderboardEntry, SchoolDailyKPI, StudySession, Subject
+from .presence import get_presence_store
+from .timezones import user_zone
+
+
+class TimerConflict(Exception):
+    """The user already has an open timer"""
+
+
+def _subject(user, name, color):
+    subject, _ = Subject.objects.get_or_create(name=name, user=user, defaults={'color_code': color})
+    return subject
+
+
+def _locked(user):
+    """The user's open timer, locked for the rest of the transaction"""
+    return ActiveSession.objects.select_for_update(of=('self',)).select_related(
+        'user__profile', 'subject'
+    ).get(user=user)
+
+
+def _presence(user, running):
+    school_id = user.profile.school_id
+    if school_id:
+        presence = get_presence_store()
+        if running:
+            presence.heartbeat(school_id, user.id)
+        else:
+            presence.leave(school_id, user.id)
+
+
+def start_timer(user, subject_name=None, subject_color='#10b981', description='', now=None):
+    """Open a running timer for `user`; raises TimerConflict if one is open"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        active, created = ActiveSession.objects.get_or_create(user=user, defaults={
+            'school_id': user.profile.school_id,
+            'description': description,
+            'started_at': now,
+            'segment_started_at': now,
+            'last_seen_at': now,
+        })
+        # Only now, so a rejected start leaves no new subject behind
+        if created and subject_name:
+            active.subject = _subject(user, subject_name, subject_color)
+            active.save(update_fields=['subject'])
+    if not created:
+        raise TimerConflict('یک جلسه مطالعه در حال اجراست')
+    # Cached principals record that the user has no timer
+    forget_principals(user.id)
+    _presence(user, True)
+    return active
+
+
+def pause_timer(user, now=None):
+    """Merge the open segment into the accumulated time; pausing twice is a no-op"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        active = _locked(user)
+        if active.is_running:
+            active.accumulated_seconds = active.elapsed_seconds(now)
+            active.segment_started_at = None
+            active.last_seen_at = now
+            active.save(update_fields=['accumulated_seconds', 'segment_started_at', 'last_seen_at'])
+    _presence(user, False)
+    return active
+
+
+def resume_timer(user, now=None):
+    """Open a new segment of a paused timer; resuming a running one is a no-op"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        active = _locked(user)
+        if not active.is_running:
+            active.segment_started_at = now
+            active.last_seen_at = now
+            active.save(update_fields=['segment_started_at', 'last_seen_at'])
+    _presence(user, True)
+    return active
+
+
+def touch_timer(user, now=None):
+    """
+    Record a heartbeat of a running timer with a blind UPDATE.
+
+    Principals loaded without a timer (see load_principal) are skipped, and
+    the rest write at most once per TIMER_TOUCH_INTERVAL seconds per process,
+    so steady-state heartbeats stay free. A crashed client therefore loses
+    up to that interval plus one heartbeat period when the sweep closes it.
+    """
+    if User.active_session.is_cached(user):
+        try:
+            user.active_session
+        except ActiveSession.DoesNotExist:
+            return 0
+    if not get_cache().add(f'timer:touch:{user.id}', True, settings.TIMER_TOUCH_INTERVAL):
+        return 0
+    return ActiveSession.objects.filter(
+        user=user, segment_started_at__isnull=False
+    ).update(last_seen_at=now or timezone.now())
+
+
+def close_session(active, end):
+    """
+    Delete `active` and save its time as a StudySession ending at `end`.
+
+    The session keeps the timer's start and end, while duration_seconds
+    counts only the running segments. Timers without a subject are filed
+    under TIMER_DEFAULT_SUBJECT. Returns None for a timer that never ran.
+    """
+    duration = active.elapsed_seconds(end)
+    active.delete()
+    if duration <= 0:
+        return None
+
+    user = active.user
+    session = StudySession.objects.create(
+        user=user,
+        subject=active.subject or _subject(user, settings.TIMER_DEFAULT_SUBJECT, '#10b981'),
+        description=active.description,
+        start_time=active.started_at,
+        end_time=max(end, active.started_at),
+        duration_seconds=duration,
+        client_id=active.client_id
+    )
+    zone = user_zone(user)
+    DailyStudyRollup.add_session(session, zone)
+    LeaderboardEntry.add_sessions(user, [session], zone)
+    SchoolDailyKPI.add_sessions(user, [session], zone)
+    return session
+
+
+def stop_timer(user, subject_name=None, subject_color='#10b981', description=None, now=None):
+    """Close the user's timer now; the subject and description may be set at this point"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        active = _locked(user)
+        if subject_name:
+            active.subject = _subject(user, subject_name, subject_color)
+        if description is not None:
+            active.description = description
+        session = close_session(active, now)
+    _presence(user, False)
+    return session
+
+
+def _abandoned(now):
+    running_cutoff = now - timedelta(seconds=settings.TIMER_ABANDON_AFTER)
+    paused_cutoff = now - timedelta(seconds=settings.TIMER_PAUSED_ABANDON_AFTER)
+    return (
+        Q(segment_started_at__isnull=False, last_seen_at__lt=running_cutoff)
+        | Q(segment_started_at__isnull=True, last_seen_at__lt=paused_cutoff)
+    )
+
+
+def close_abandoned_sessions(now=None):
+    """
+    Close timers whose client went away: running ones with no heartbeat for
+    TIMER_ABANDON_AFTER seconds, paused ones untouched for
+    TIMER_PAUSED_ABANDON_AFTER. Time after the last heartbeat is not
+    counted. Returns the sessions saved.
+    """
+    now = now or timezone.now()
+    saved = []
+    for user_id in list(ActiveSession.objects.filter(_abandoned(now)).values_list('user_id', flat=True)):
+        with transaction.atomic():
+            # Re-checked under the lock: a heartbeat may have arrived meanwhile
+            active = ActiveSession.objects.select_for_update(of=('self',)).select_related(
+                'user__profile', 'subject'
+            ).filter(_abandoned(now), user_id=user_id).first()
+            if active is None:
+                continue
+            session = close_session(active, active.last_seen_at)
+        _presence(active.user, False)
+        if session is not None:
+            saved.append(session)
+    return saved
+
+
+def live_sessions(school, now=None):
+    """
+    Open timers of a school's students with their time so far, newest first.
+
+    Reads only ActiveSession rows (one query), never the session history.
+    """
+    now = now or timezone.now()
+    rows = ActiveSession.objects.filter(school=school, user__profile__role='student').values(
+        'user_id', 'user__profile__full_name', 'user__profile__phone_number', 'subject__name',
+        'started_at', 'segment_started_at', 'accumulated_seconds'
+    ).order_by('-started_at')
+    return [
+        {
+            'user_id': row['user_id'],
+            'full_name': row['user__profile__full_name'] or row['user__profile__phone_number'],
+            'state': 'paused' if row['segment_started_at'] is None else 'running',
+            'subject_name': row['subject__name'],
+            'started_at': row['started_at'],
+            'elapsed_seconds': ActiveSession(
+                segment_started_at=row['segment_started_at'],
+                accumulated_seconds=row['accumulated_seconds']
+            ).elapsed_seconds(now),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """ZoneInfo for an IANA name, falling back to SCHOOL_DEFAULT_TIMEZONE"""
+    try:
+        return ZoneInfo(name or settings.SCHOOL_DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.SCHOOL_DEFAULT_TIMEZONE)
+
+
+def school_zone(school):
+    """Timezone whose midnight starts a new study day for `school`"""
+    return get_zone(school.timezone if school is not None else None)
+
+
+def user_zone(user):
+    """
+    Timezone of the school `user` belongs to.
+
+    Users authenticated through CachedJWTAuthentication already carry their
+    profile and school, so this costs no query on the request path.
+    """
+    profile = getattr(user, 'profile', None)
+    return school_zone(profile.school if profile is not None else None)
+
+
+def validate_timezone(value):
+    if value not in available_timezones():
+        raise ValidationError(f'منطقه زمانی نامعتبر است: {value}')
+
+
+def period_start(day, period):
+    """
+    First local date of the 'day', 'week' or 'month' containing `day`.
+
+    Weeks start on LEADERBOARD_WEEK_START (0 = Monday, 5 = Saturday).
+    """
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=(day.weekday() - settings.LEADERBOARD_WEEK_START) % 7)
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unknown period: {period}')
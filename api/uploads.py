@@ -0,0 +1,104 @@
+from django.db import transaction, IntegrityError
+
+from .cache import invalidate
+from .models import Subject, StudySession, DailyStudyRollup, LeaderboardEntry, SchoolDailyKPI
+from .serializers import StudySessionUploadSerializer
+from .timezones import user_zone
+
+
+def _resolve_subjects(user, colors):
+    """Map subject name -> Subject for `user`, creating missing ones in one insert"""
+    subjects = {}
+    for subject in Subject.objects.filter(user=user, name__in=list(colors)).order_by('id'):
+        subjects.setdefault(subject.name, subject)
+    missing = [
+        Subject(user=user, name=name, color_code=color)
+        for name, color in colors.items() if name not in subjects
+    ]
+    for subject in Subject.objects.bulk_create(missing):
+        subjects[subject.name] = subject
+    return subjects
+
+
+@transaction.atomic
+def _save_batch(user, valid):
+    """Insert the sessions of `valid` not uploaded before; returns client_id -> (status, id)"""
+    existing = StudySession.objects.filter(
+        user=user,
+        client_id__in=list(valid)
+    ).values_list('client_id', 'id')
+    outcome = {client_id: ('duplicate', pk) for client_id, pk in existing}
+
+    pending = [data for client_id, data in valid.items() if client_id not in outcome]
+    if not pending:
+        return outcome
+
+    subjects = _resolve_subjects(user, {data['subject_name']: data['subject_color'] for data in pending})
+    sessions = StudySession.objects.bulk_create([
+        StudySession(
+            user=user,
+            subject=subjects[data['subject_name']],
+            client_id=data['client_id'],
+            description=data['description'],
+            start_time=data['start_time'],
+            end_time=data['end_time'],
+            duration_seconds=int((data['end_time'] - data['start_time']).total_seconds())
+        )
+        for data in pending
+    ])
+    # bulk_create sends no post_save, so roll up here
+    zone = user_zone(user)
+    DailyStudyRollup.add_sessions(sessions, zone)
+    LeaderboardEntry.add_sessions(user, sessions, zone)
+    SchoolDailyKPI.add_sessions(user, sessions, zone)
+    outcome.update({session.client_id: ('created', session.id) for session in sessions})
+    return outcome
+
+
+def upload_sessions(user, items):
+    """
+    Save a batch of sessions recorded offline by `user`.
+
+    Every item carries a client-generated `client_id`; an item whose id was
+    already uploaded is reported as a duplicate instead of being saved again,
+    so a client can safely retry the whole batch. Returns one result per
+    item, in order, with status `created`, `duplicate` or `invalid`.
+    """
+    results = [None] * len(items)
+    client_ids = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = StudySessionUploadSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {
+                'client_id': item.get('client_id') if isinstance(item, dict) else None,
+                'status': 'invalid',
+                'errors': serializer.errors
+            }
+            continue
+        client_ids[index] = serializer.validated_data['client_id']
+        # A repeated client_id within the batch resolves to the first copy
+        valid.setdefault(client_ids[index], serializer.validated_data)
+
+    if valid:
+        try:
+            outcome = _save_batch(user, valid)
+        except IntegrityError:
+            # A concurrent upload of the same items won the race; they now exist
+            outcome = _save_batch(user, valid)
+
+    created = False
+    for index, client_id in enumerate(client_ids):
+        if client_id is None:
+            continue
+        status, pk = outcome[client_id]
+        if status == 'created':
+            # Later copies of the same client_id in this batch are duplicates
+            outcome[client_id] = ('duplicate', pk)
+            created = True
+        results[index] = {'client_id': str(client_id), 'status': status, 'id': pk}
+
+    if created:
+        invalidate('user', user.id)
+        invalidate('school', user.profile.school_id)
+    return results
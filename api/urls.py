@@ -7,22 +7,40 @@ from .views import (
     login_with_password,
     UserProfileView,
     update_study_status,
+    study_heartbeat,
+    timer_state,
+    timer_start,
+    timer_pause,
+    timer_resume,
+    timer_stop,
     SubjectListView,
     SubjectDetailView,
     StudySessionListCreateView,
+    StudySessionBulkUploadView,
     DashboardStatsView,
+    StudentAnalyticsView,
     CreateTicketView,
     # Manager Panel Views
     ManagerDashboardKPIView,
+    ManagerKPITrendView,
+    ManagerStreamTicketView,
+    ManagerLeaderboardView,
+    ManagerLiveSessionsView,
     ManagerStudentListView,
     ManagerStudentProfileView,
     ManagerExportExcelView,
     ManagerStudentReportPDFView,
+    ManagerReportJobCreateView,
+    ManagerReportJobDetailView,
+    ManagerReportJobDownloadView,
     # SuperAdmin Panel Views
     SuperAdminSchoolListCreateView,
     SuperAdminSchoolDetailView,
     SuperAdminAssignManagerView,
-    SuperAdminSchoolMembersView
+    SuperAdminSchoolMembersView,
+    SuperAdminCacheStatsView,
+    SuperAdminRequestMetricsView,
+    SuperAdminDatabasePoolView
 )
 
 urlpatterns = [
@@ -37,26 +55,46 @@ urlpatterns = [
     
     path('profile/', UserProfileView.as_view(), name='user_profile'),
     path('profile/study-status/', update_study_status, name='update_study_status'),
+    path('profile/heartbeat/', study_heartbeat, name='study_heartbeat'),
+
+    # Server-side study timer
+    path('timer/', timer_state, name='timer_state'),
+    path('timer/start/', timer_start, name='timer_start'),
+    path('timer/pause/', timer_pause, name='timer_pause'),
+    path('timer/resume/', timer_resume, name='timer_resume'),
+    path('timer/stop/', timer_stop, name='timer_stop'),
     
     # Study Data
     path('subjects/', SubjectListView.as_view(), name='subject_list'),
     path('subjects/<int:pk>/', SubjectDetailView.as_view(), name='subject_detail'),
     path('sessions/', StudySessionListCreateView.as_view(), name='study_sessions'),
+    path('sessions/bulk/', StudySessionBulkUploadView.as_view(), name='study_sessions_bulk'),
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard_stats'),
+    path('dashboard/analytics/', StudentAnalyticsView.as_view(), name='dashboard_analytics'),
     
     # Support
     path('tickets/', CreateTicketView.as_view(), name='create_ticket'),
     
     # Manager Panel
     path('manager/dashboard/', ManagerDashboardKPIView.as_view(), name='manager_dashboard_kpi'),
+    path('manager/dashboard/trend/', ManagerKPITrendView.as_view(), name='manager_kpi_trend'),
+    path('manager/dashboard/stream/ticket/', ManagerStreamTicketView.as_view(), name='manager_stream_ticket'),
+    path('manager/leaderboard/', ManagerLeaderboardView.as_view(), name='manager_leaderboard'),
+    path('manager/live-sessions/', ManagerLiveSessionsView.as_view(), name='manager_live_sessions'),
     path('manager/students/', ManagerStudentListView.as_view(), name='manager_student_list'),
     path('manager/students/<int:user_id>/profile/', ManagerStudentProfileView.as_view(), name='manager_student_profile'),
     path('manager/export/excel/', ManagerExportExcelView.as_view(), name='manager_export_excel'),
     path('manager/students/<int:user_id>/report/pdf/', ManagerStudentReportPDFView.as_view(), name='manager_student_pdf'),
+    path('manager/reports/', ManagerReportJobCreateView.as_view(), name='manager_report_create'),
+    path('manager/reports/<uuid:job_id>/', ManagerReportJobDetailView.as_view(), name='manager_report_detail'),
+    path('manager/reports/<uuid:job_id>/download/', ManagerReportJobDownloadView.as_view(), name='manager_report_download'),
     
     # SuperAdmin Panel
     path('superadmin/schools/', SuperAdminSchoolListCreateView.as_view(), name='superadmin_schools'),
     path('superadmin/schools/<int:pk>/', SuperAdminSchoolDetailView.as_view(), name='superadmin_school_detail'),
     path('superadmin/schools/<int:school_id>/assign-manager/', SuperAdminAssignManagerView.as_view(), name='superadmin_assign_manager'),
     path('superadmin/schools/<int:school_id>/members/', SuperAdminSchoolMembersView.as_view(), name='superadmin_school_members'),
+    path('superadmin/cache/stats/', SuperAdminCacheStatsView.as_view(), name='superadmin_cache_stats'),
+    path('superadmin/metrics/', SuperAdminRequestMetricsView.as_view(), name='superadmin_request_metrics'),
+    path('superadmin/db-pool/', SuperAdminDatabasePoolView.as_view(), name='superadmin_db_pool'),
 ]
@@ -1,30 +1,77 @@
-from rest_framework import status, generics, views
+from rest_framework import status, generics, views, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import transaction
 from django.db.models import Sum, Max, Count, Q, F
 from django.db.models.functions import Coalesce
-from django.http import HttpResponse
+from django.http import FileResponse
 from datetime import timedelta, datetime
-from .models import UserProfile, Subject, StudySession, ConsultantTicket, School
+from .models import (
+    UserProfile, Subject, StudySession, ConsultantTicket, School, DailyStudyRollup, ReportJob, LeaderboardEntry,
+    ActiveSession, SchoolDailyKPI
+)
 from .serializers import (
     PhoneLoginSerializer,
     UserProfileSerializer,
     SubjectSerializer,
     StudySessionSerializer,
+    TimerActionSerializer,
+    ActiveSessionSerializer,
+    LiveSessionSerializer,
     ConsultantTicketSerializer,
     ManagerStudentListSerializer,
     ManagerDashboardKPISerializer,
+    KPITrendQuerySerializer,
+    KPITrendSerializer,
+    StudentAnalyticsQuerySerializer,
+    StudentAnalyticsSerializer,
+    LeaderboardQuerySerializer,
+    LeaderboardSerializer,
     SchoolSerializer,
-    AssignManagerSerializer
+    AssignManagerSerializer,
+    ReportJobCreateSerializer,
+    ReportJobSerializer
 )
 from .permissions import IsManager, IsSuperAdmin
+from .pagination import KeysetPagination, AdminListPagination
+from .cache import acached, cached, cache_stats, invalidate, fingerprint, generation
+from .conditional import (
+    conditional, profile_etag, user_data_etag, session_list_etag,
+    school_data_etag, school_rolling_etag, school_kpi_etag, student_profile_etag
+)
+from .metrics import get_request_metrics
+from .dbpool import pool_stats, reset_pool_stats
+from .async_views import AsyncAPIView
+from .fanout import fan_out
+from .readers import ValuesListMixin, values_serializer
+from .timers import (
+    TimerConflict, start_timer, pause_timer, resume_timer, stop_timer, touch_timer, live_sessions
+)
+from .authentication import forget_principals
+from .presence import get_presence_store
+from .aggregates import (
+    student_list_rows, study_windows, auser_rollup_stats, annotate_school_stats, student_analytics,
+    rollup_days, totals_from_days
+)
+from .live import acurrent_kpis, issue_stream_ticket
+from .daily_kpis import kpi_trend
+from .leaderboards import leaderboard
+from .rollups import rebuild_leaderboards
+from .exports import EXCEL_CONTENT_TYPE, student_report_rows, write_student_report
+from .reports import ARTIFACT_TYPES, submit_report
+from .uploads import upload_sessions
+from .timezones import school_zone, user_zone
 
 
+import os
 import re
+import tempfile
 from django.contrib.auth.hashers import make_password, check_password
 
 
@@ -234,6 +281,7 @@ def phone_login(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@conditional(profile_etag, name='get')
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """Get or update user profile"""
     serializer_class = UserProfileSerializer
@@ -266,14 +314,110 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_study_status(request):
-    """Update user's is_studying status when timer starts/stops"""
+    """Mark the user as studying (or not) when the timer starts/stops"""
     is_studying = request.data.get('is_studying', False)
-    profile = request.user.profile
-    profile.is_studying = is_studying
-    profile.save()
+    school_id = request.user.profile.school_id
+    if school_id:
+        presence = get_presence_store()
+        if is_studying:
+            presence.heartbeat(school_id, request.user.id)
+        else:
+            presence.leave(school_id, request.user.id)
     return Response({'status': 'updated', 'is_studying': is_studying})
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def study_heartbeat(request):
+    """Keep the user in the school's "active now" count and their server-side timer alive"""
+    school_id = request.user.profile.school_id
+    if school_id:
+        get_presence_store().heartbeat(school_id, request.user.id)
+    touch_timer(request.user)
+    return Response({
+        'status': 'ok',
+        'ttl': settings.PRESENCE_TTL,
+        'interval': settings.PRESENCE_HEARTBEAT_INTERVAL
+    })
+
+
+def _timer_response(active, now, status_code=status.HTTP_200_OK):
+    return Response(ActiveSessionSerializer(active, context={'now': now}).data, status=status_code)
+
+
+def _no_timer():
+    return Response({'error': 'جلسه مطالعه فعالی وجود ندارد'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def timer_state(request):
+    """The user's open timer, so a reloaded or crashed client can pick it up again"""
+    now = timezone.now()
+    try:
+        active = ActiveSession.objects.select_related('subject').get(user=request.user)
+    except ActiveSession.DoesNotExist:
+        return _no_timer()
+    return _timer_response(active, now)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def timer_start(request):
+    """Start a server-side timer; 409 while another one is open"""
+    serializer = TimerActionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    now = timezone.now()
+    try:
+        active = start_timer(request.user, now=now, **serializer.validated_data)
+    except TimerConflict as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+    return _timer_response(active, now, status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def timer_pause(request):
+    now = timezone.now()
+    try:
+        active = pause_timer(request.user, now)
+    except ActiveSession.DoesNotExist:
+        return _no_timer()
+    return _timer_response(active, now)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def timer_resume(request):
+    now = timezone.now()
+    try:
+        active = resume_timer(request.user, now)
+    except ActiveSession.DoesNotExist:
+        return _no_timer()
+    return _timer_response(active, now)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def timer_stop(request):
+    """
+    Stop the timer and save it as a study session
+
+    Duration is computed here from the running segments, not taken from the
+    client. `session` is null when the timer never ran.
+    """
+    serializer = TimerActionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        session = stop_timer(request.user, **serializer.validated_data)
+    except ActiveSession.DoesNotExist:
+        return _no_timer()
+    return Response({'session': StudySessionSerializer(session).data if session else None})
+
+
+@conditional(user_data_etag, name='get')
 class SubjectListView(generics.ListCreateAPIView):
     """List user's subjects or create new one"""
     serializer_class = SubjectSerializer
@@ -298,14 +442,53 @@ class SubjectDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Subject.objects.filter(user=self.request.user)
 
 
-class StudySessionListCreateView(generics.ListCreateAPIView):
-    """List recent sessions or log a new one"""
+@conditional(session_list_etag, name='get')
+class StudySessionListCreateView(ValuesListMixin, generics.ListCreateAPIView):
+    """
+    List recent sessions or log a new one
+    
+    The list is cursor-paginated (newest first) and can be narrowed with
+    `since` (inclusive) and `until` (exclusive) ISO-8601 datetimes.
+    """
     serializer_class = StudySessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return StudySession.objects.filter(user=self.request.user).order_by('-start_time')
+        sessions = StudySession.objects.filter(
+            user=self.request.user
+        ).select_related('subject').order_by('-start_time', '-id')
+        
+        since = self._parse_time_param('since')
+        until = self._parse_time_param('until')
+        if since:
+            sessions = sessions.filter(start_time__gte=since)
+        if until:
+            sessions = sessions.filter(start_time__lt=until)
+        return sessions
 
+    def _parse_time_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value) or self._parse_date_param(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError({name: 'تاریخ نامعتبر است'})
+        if timezone.is_naive(parsed):
+            # A bare date means midnight of that day at the user's school
+            parsed = timezone.make_aware(parsed, user_zone(self.request.user))
+        return parsed
+
+    @staticmethod
+    def _parse_date_param(value):
+        day = parse_date(value)
+        return datetime.combine(day, datetime.min.time()) if day else None
+
+    @transaction.atomic
     def perform_create(self, serializer):
         # Check if subject exists by name, or create it
         subject_data = self.request.data.get('subject_name')
@@ -318,40 +501,99 @@ class StudySessionListCreateView(generics.ListCreateAPIView):
                 user=self.request.user,
                 defaults={'color_code': subject_color}
             )
-            serializer.save(user=self.request.user, subject=subject)
+            session = serializer.save(user=self.request.user, subject=subject)
         else:
             # Fallback if subject ID provided
-            serializer.save(user=self.request.user)
+            session = serializer.save(user=self.request.user)
+        
+        zone = user_zone(self.request.user)
+        DailyStudyRollup.add_session(session, zone)
+        LeaderboardEntry.add_sessions(self.request.user, [session], zone)
+        SchoolDailyKPI.add_sessions(self.request.user, [session], zone)
+
+
+class StudySessionBulkUploadView(views.APIView):
+    """
+    Upload sessions recorded offline in one request
 
+    Body: `{"sessions": [...]}`, each item with a client-generated `client_id`.
+    Retrying a batch is safe: already uploaded items come back as duplicates.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get('sessions') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'لیست جلسات الزامی است'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.SESSION_UPLOAD_MAX_BATCH:
+            return Response({
+                'error': f'حداکثر {settings.SESSION_UPLOAD_MAX_BATCH} جلسه در هر درخواست مجاز است'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-class DashboardStatsView(views.APIView):
+        return Response({'results': upload_sessions(request.user, items)})
+
+
+class DashboardStatsView(AsyncAPIView):
     """Get aggregated stats for dashboard"""
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    @conditional(user_data_etag)
+    async def get(self, request):
         user = request.user
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = now - timedelta(days=7)
-        month_start = now - timedelta(days=30)
-
-        # Helper to sum duration
-        def get_duration(start_date):
-            return StudySession.objects.filter(
-                user=user,
-                start_time__gte=start_date
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-
-        stats = {
-            'today': get_duration(today_start),
-            'week': get_duration(week_start),
-            'month': get_duration(month_start),
-            'total_sessions': StudySession.objects.filter(user=user).count()
-        }
-        
+        stats = await acached(
+            'dashboard_stats', 'user', user.id, lambda: auser_rollup_stats(user), zone=user_zone(user)
+        )
         return Response(stats)
 
 
+def _analytics_query(request):
+    today = study_windows(zone=user_zone(request.user))['today']
+    return StudentAnalyticsQuerySerializer(data=request.query_params, context={'today': today}), today
+
+
+def _analytics_etag(request):
+    """
+    ETag of the analytics payload, derived without touching the rollups.
+
+    The user's cache generation changes on every session write, and the
+    local date covers the day rollover of defaults and streaks.
+    """
+    query, today = _analytics_query(request)
+    if not query.is_valid():
+        return None
+    user_id = request.user.id
+    return fingerprint(
+        'student_analytics', user_id, generation('user', user_id), today,
+        query.validated_data['start'], query.validated_data['end']
+    )
+
+
+class StudentAnalyticsView(views.APIView):
+    """
+    Daily study time series, per-subject split and streaks of the current user
+
+    Query params: `start` and `end` (YYYY-MM-DD), by default the last 30 days.
+    Responses carry an ETag; a matching If-None-Match gets a 304 before any
+    aggregation runs.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @conditional(_analytics_etag)
+    def get(self, request):
+        query, today = _analytics_query(request)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        start, end = query.validated_data['start'], query.validated_data['end']
+        analytics = cached(
+            'student_analytics', 'user', user.id,
+            lambda: StudentAnalyticsSerializer(student_analytics(user, start, end, today)).data,
+            start, end, zone=user_zone(user)
+        )
+        return Response(analytics)
+
+
 class CreateTicketView(generics.CreateAPIView):
     serializer_class = ConsultantTicketSerializer
     permission_classes = [IsAuthenticated]
@@ -362,18 +604,14 @@ class CreateTicketView(generics.CreateAPIView):
 
 # ==================== Manager Panel Views ====================
 
-class ManagerDashboardKPIView(views.APIView):
+class ManagerDashboardKPIView(AsyncAPIView):
     """
     KPI Dashboard for managers - Bird's-eye view of school performance
     """
     permission_classes = [IsAuthenticated, IsManager]
     
-    def get(self, request):
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        yesterday_start = today_start - timedelta(days=1)
-        yesterday_end = today_start
-        
+    @conditional(school_kpi_etag)
+    async def get(self, request):
         # Get all students in the manager's school
         manager_school = request.user.profile.school
         if not manager_school:
@@ -381,98 +619,109 @@ class ManagerDashboardKPIView(views.APIView):
                 'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        students = User.objects.filter(
-            profile__role='student',
-            profile__school=manager_school
+        serializer = ManagerDashboardKPISerializer(await acurrent_kpis(manager_school))
+        # Tells the dashboard whether to open the live stream or poll
+        return Response({**serializer.data, 'live_stream': settings.LIVE_STREAM_ENABLED})
+
+
+class ManagerKPITrendView(views.APIView):
+    """
+    Daily KPIs of the manager's school for the last `days` days (30, 90 or 365)
+
+    Read from the SchoolDailyKPI table, so the cost does not grow with the
+    number of sessions in the range.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+
+    @conditional(school_data_etag)
+    def get(self, request):
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        query = KPITrendQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        days = query.validated_data['days']
+        trend = cached(
+            'manager_kpi_trend', 'school', manager_school.id,
+            lambda: KPITrendSerializer(kpi_trend(manager_school, days)).data,
+            days, zone=school_zone(manager_school)
         )
-        total_students = students.count()
-        
-        if total_students == 0:
+        return Response(trend)
+
+
+class ManagerStreamTicketView(views.APIView):
+    """
+    Single-use ticket for opening the live KPI stream
+
+    The browser passes it as ?ticket= since EventSource cannot send the
+    Authorization header; it expires after LIVE_TICKET_TTL seconds.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def post(self, request):
+        if not request.user.profile.school:
             return Response({
-                'avg_study_today': '0:00',
-                'avg_study_today_seconds': 0,
-                'change_percent': 0,
-                'top_student': {'name': 'هیچ کس', 'total': 0},
-                'absent_count': 0,
-                'active_now': 0,
-                'total_students': 0
-            })
-        
-        # Average study time today
-        today_totals = StudySession.objects.filter(
-            user__profile__role='student',
-            user__profile__school=manager_school,
-            start_time__gte=today_start
-        ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-        
-        avg_today = today_totals // total_students if total_students > 0 else 0
-        
-        # Average study time yesterday for comparison
-        yesterday_totals = StudySession.objects.filter(
-            user__profile__role='student',
-            user__profile__school=manager_school,
-            start_time__gte=yesterday_start,
-            start_time__lt=yesterday_end
-        ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-        
-        avg_yesterday = yesterday_totals // total_students if total_students > 0 else 0
-        
-        # Calculate change percent
-        if avg_yesterday > 0:
-            change_percent = ((avg_today - avg_yesterday) / avg_yesterday) * 100
-        else:
-            change_percent = 100 if avg_today > 0 else 0
-        
-        # Format avg_today as HH:MM
-        hours = avg_today // 3600
-        minutes = (avg_today % 3600) // 60
-        avg_today_str = f"{hours}:{minutes:02d}"
-        
-        # Top student today
-        top_student_data = StudySession.objects.filter(
-            user__profile__role='student',
-            user__profile__school=manager_school,
-            start_time__gte=today_start
-        ).values('user').annotate(
-            total=Sum('duration_seconds')
-        ).order_by('-total').first()
-        
-        if top_student_data:
-            top_user = User.objects.get(id=top_student_data['user'])
-            top_student = {
-                'name': top_user.profile.full_name or top_user.profile.phone_number,
-                'total': top_student_data['total']
-            }
-        else:
-            top_student = {'name': 'هیچ کس', 'total': 0}
-        
-        # Absent students (no activity today)
-        active_users_today = StudySession.objects.filter(
-            start_time__gte=today_start,
-            user__profile__school=manager_school,
-            user__profile__role='student'
-        ).values_list('user_id', flat=True).distinct()
-        absent_count = max(0, total_students - len(set(active_users_today)))
-        
-        # Active now (students with is_studying=True in their profile)
-        active_now = UserProfile.objects.filter(
-            role='student',
-            school=manager_school,
-            is_studying=True
-        ).count()
-        
-        data = {
-            'avg_study_today': avg_today_str,
-            'avg_study_today_seconds': avg_today,
-            'change_percent': round(change_percent, 1),
-            'top_student': top_student,
-            'absent_count': absent_count,
-            'active_now': active_now,
-            'total_students': total_students
-        }
-        
-        serializer = ManagerDashboardKPISerializer(data)
-        return Response(serializer.data)
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'ticket': issue_stream_ticket(request.user),
+            'expires_in': settings.LIVE_TICKET_TTL
+        }, status=status.HTTP_201_CREATED)
+
+
+class ManagerLiveSessionsView(views.APIView):
+    """
+    Students of the manager's school with a timer open right now
+
+    Elapsed time comes from the server-side timers, so in-progress study
+    shows up before it is saved as a session.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request):
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        sessions = live_sessions(manager_school)
+        return Response({
+            'sessions': LiveSessionSerializer(sessions, many=True).data,
+            'count': len(sessions),
+            'in_progress_seconds': sum(row['elapsed_seconds'] for row in sessions)
+        })
+
+
+class ManagerLeaderboardView(views.APIView):
+    """
+    Top students of the manager's school for today, this week or this month
+
+    Query params: `period` (day/week/month), optional `grade` or
+    `olympiad_field` to rank within one group, and `limit` (default 10).
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+
+    @conditional(school_data_etag)
+    def get(self, request):
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        board = leaderboard(manager_school, **query.validated_data)
+        return Response(LeaderboardSerializer(board).data)
 
 
 class ManagerStudentListView(views.APIView):
@@ -481,6 +730,7 @@ class ManagerStudentListView(views.APIView):
     """
     permission_classes = [IsAuthenticated, IsManager]
     
+    @conditional(school_rolling_etag)
     def get(self, request):
         # Check if manager has a school
         manager_school = request.user.profile.school
@@ -510,82 +760,26 @@ class ManagerStudentListView(views.APIView):
                 Q(full_name__icontains=search) | Q(phone_number__icontains=search)
             )
         
-        # Calculate stats for each student
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = now - timedelta(days=7)
-        last_week_start = now - timedelta(days=14)
-        
-        students_data = []
-        for profile in students:
-            user = profile.user
-            
-            # Today's total
-            today_total = StudySession.objects.filter(
-                user=user,
-                start_time__gte=today_start
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-            
-            # This week's total
-            week_total = StudySession.objects.filter(
-                user=user,
-                start_time__gte=week_start
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-            
-            # Last week's total for trend
-            last_week_total = StudySession.objects.filter(
-                user=user,
-                start_time__gte=last_week_start,
-                start_time__lt=week_start
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-            
-            # Calculate trend
-            if last_week_total > 0:
-                trend_percent = ((week_total - last_week_total) / last_week_total) * 100
-                if trend_percent > 5:
-                    trend = 'up'
-                elif trend_percent < -5:
-                    trend = 'down'
-                else:
-                    trend = 'stable'
-            else:
-                trend_percent = 100 if week_total > 0 else 0
-                trend = 'up' if week_total > 0 else 'stable'
-            
-            # Last activity
-            last_session = StudySession.objects.filter(user=user).order_by('-start_time').first()
-            last_activity = last_session.start_time if last_session else None
-            
-            students_data.append({
-                'user_id': user.id,
-                'full_name': profile.full_name,
-                'phone_number': profile.phone_number,
-                'grade': profile.grade,
-                'olympiad_field': profile.olympiad_field,
-                'today_total': today_total,
-                'week_total': week_total,
-                'trend': trend,
-                'trend_percent': round(trend_percent, 1),
-                'last_activity': last_activity
-            })
+        # Calculate stats for all students in one grouped query
+        students_data = student_list_rows(students, zone=school_zone(manager_school))
         
         # Sort by week_total descending
         students_data.sort(key=lambda x: x['week_total'], reverse=True)
         
-        serializer = ManagerStudentListSerializer(students_data, many=True)
         return Response({
-            'students': serializer.data,
+            'students': values_serializer(ManagerStudentListSerializer).render(students_data),
             'count': len(students_data)
         })
 
 
-class ManagerStudentProfileView(views.APIView):
+class ManagerStudentProfileView(AsyncAPIView):
     """
     Get detailed profile of a specific student (returns complete dashboard data)
     """
     permission_classes = [IsAuthenticated, IsManager]
     
-    def get(self, request, user_id):
+    @conditional(student_profile_etag)
+    async def get(self, request, user_id):
         # Ensure manager can only see students from their school
         try:
             manager_profile = request.user.profile
@@ -598,7 +792,7 @@ class ManagerStudentProfileView(views.APIView):
         
         try:
             # First get the user to ensure existence
-            user = User.objects.get(id=user_id)
+            user = await User.objects.select_related('profile__school').aget(id=user_id)
             
             # Then check if they are a student in the manager's school
             # We use filter to avoid DoesNotExist if profile is missing (though unlikely)
@@ -614,20 +808,35 @@ class ManagerStudentProfileView(views.APIView):
         except User.DoesNotExist:
             return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get time-based stats
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = now - timedelta(days=7)
-        month_start = now - timedelta(days=30)
+        stats = await acached(
+            'student_profile', 'user', user.id, lambda: self.build_stats(user), zone=user_zone(user)
+        )
+        return Response(stats)
+    
+    async def build_stats(self, user):
+        # Recent sessions (last 10)
+        recent_qs = StudySession.objects.filter(user=user).select_related('subject').order_by('-start_time')[:10]
+        
+        # Subject breakdown (total time per subject)
+        subject_qs = DailyStudyRollup.objects.filter(user=user).values(
+            'subject__name', 'subject__color_code'
+        ).annotate(
+            total_seconds=Sum('total_seconds')
+        ).order_by('-total_seconds')
+        
+        # The three reads are independent; the per-day one feeds both the
+        # today/week/month totals and the heatmap
+        recent_sessions, subject_stats, days = await fan_out(
+            lambda: list(recent_qs),
+            lambda: list(subject_qs),
+            lambda: list(rollup_days(user))
+        )
         
-        def get_duration(start_date):
-            return StudySession.objects.filter(
-                user=user,
-                start_time__gte=start_date
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
+        # Time-based stats in the student's school day
+        windows = study_windows(zone=user_zone(user))
+        totals = totals_from_days(days, windows)
+        heatmap_start = windows['today'] - timedelta(days=60)
         
-        # Get recent sessions (last 10)
-        recent_sessions = StudySession.objects.filter(user=user).order_by('-start_time')[:10]
         sessions_data = []
         for session in recent_sessions:
             sessions_data.append({
@@ -640,13 +849,6 @@ class ManagerStudentProfileView(views.APIView):
                 'description': session.description or ''
             })
         
-        # Get subject breakdown (total time per subject)
-        subject_stats = StudySession.objects.filter(user=user).values(
-            'subject__name', 'subject__color_code'
-        ).annotate(
-            total_seconds=Sum('duration_seconds')
-        ).order_by('-total_seconds')
-        
         subjects_breakdown = []
         for stat in subject_stats:
             if stat['subject__name']:
@@ -656,35 +858,24 @@ class ManagerStudentProfileView(views.APIView):
                     'total_seconds': stat['total_seconds']
                 })
         
-        # Get heatmap data (last 60 days)
-        heatmap_start = now - timedelta(days=60)
-        heatmap_sessions = StudySession.objects.filter(
-            user=user,
-            start_time__gte=heatmap_start
-        ).values('start_time__date').annotate(
-            total_seconds=Sum('duration_seconds')
-        )
-        
+        # Heatmap data (last 60 days)
         heatmap_data = {}
-        for item in heatmap_sessions:
-            date_str = item['start_time__date'].isoformat()
-            heatmap_data[date_str] = item['total_seconds']
+        for item in days:
+            if item['date'] >= heatmap_start:
+                heatmap_data[item['date'].isoformat()] = item['total_seconds']
         
         stats = {
             'student_name': user.profile.full_name,
             'phone_number': user.profile.phone_number,
             'grade': user.profile.grade,
             'olympiad_field': user.profile.olympiad_field,
-            'today': get_duration(today_start),
-            'week': get_duration(week_start),
-            'month': get_duration(month_start),
-            'total_sessions': StudySession.objects.filter(user=user).count(),
+            **totals,
             'recent_sessions': sessions_data,
             'subjects_breakdown': subjects_breakdown,
             'heatmap_data': heatmap_data
         }
         
-        return Response(stats)
+        return stats
 
 
 class ManagerExportExcelView(views.APIView):
@@ -695,14 +886,19 @@ class ManagerExportExcelView(views.APIView):
     
     def get(self, request):
         try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment
+            import openpyxl  # noqa: F401
         except ImportError:
             return Response(
                 {'error': 'openpyxl library not installed. Install it with: pip install openpyxl'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         # Get date range from query params
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
@@ -712,87 +908,120 @@ class ManagerExportExcelView(views.APIView):
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
             end_date = end_date.replace(hour=23, minute=59, second=59)
         else:
-            # Default: last 30 days
-            end_date = timezone.now()
+            # Default: last 30 days, ending today in the school's timezone
+            end_date = study_windows(zone=school_zone(manager_school))['now']
             start_date = end_date - timedelta(days=30)
         
-        # Create workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "گزارش عملکرد"
-        
-        # Header style
-        header_fill = PatternFill(start_color="10b981", end_color="10b981", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
+        # Rows are streamed from the DB into a write-only workbook spooled
+        # to a temp file, which is then streamed back to the client.
+        report = tempfile.TemporaryFile()
+        write_student_report(report, student_report_rows(manager_school, start_date, end_date))
+        report.seek(0)
+        
+        return FileResponse(
+            report,
+            as_attachment=True,
+            filename=f'student_report_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.xlsx',
+            content_type=EXCEL_CONTENT_TYPE
+        )
+
+
+class ManagerStudentReportPDFView(views.APIView):
+    """
+    Generate PDF report for a specific student
+    
+    The PDF is built by the report worker; this returns the cached file when
+    it is up to date, otherwise the queued job (202) to poll.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    
+    def get(self, request, user_id):
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({'error': 'Manager has no school assigned'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Headers
-        headers = ['نام', 'شماره تماس', 'پایه', 'رشته المپیاد', 'مجموع ساعات مطالعه', 'تعداد جلسات']
-        ws.append(headers)
+        if not UserProfile.objects.filter(user_id=user_id, role='student', school=manager_school).exists():
+            return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center')
+        job = submit_report('student_pdf', request.user, manager_school, {'user_id': user_id})
+        if job.status == 'done':
+            return report_file_response(job)
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+def report_file_response(job):
+    """Stream a finished job's artifact, or 404 if it has been pruned"""
+    if not job.file_path or not os.path.exists(job.file_path):
+        return Response({'error': 'فایل گزارش منقضی شده است، دوباره درخواست دهید'}, status=status.HTTP_404_NOT_FOUND)
+    extension, content_type = ARTIFACT_TYPES[job.kind]
+    return FileResponse(
+        open(job.file_path, 'rb'),
+        as_attachment=True,
+        filename=f'{job.kind}_{job.created_at.strftime("%Y%m%d")}.{extension}',
+        content_type=content_type
+    )
+
+
+class ManagerReportJobCreateView(views.APIView):
+    """
+    Queue a background report (Excel export or student PDF)
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    
+    def post(self, request):
+        manager_school = request.user.profile.school
+        if not manager_school:
+            return Response({
+                'error': 'مدیر به هیچ مدرسه‌ای متصل نیست'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get all students
-        students = UserProfile.objects.filter(role='student')
+        serializer = ReportJobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
         
-        for profile in students:
-            user = profile.user
-            
-            # Calculate total study time in date range
-            total_seconds = StudySession.objects.filter(
-                user=user,
-                start_time__gte=start_date,
-                start_time__lte=end_date
-            ).aggregate(total=Sum('duration_seconds'))['total'] or 0
-            
-            hours = total_seconds / 3600
-            
-            session_count = StudySession.objects.filter(
-                user=user,
-                start_time__gte=start_date,
-                start_time__lte=end_date
-            ).count()
-            
-            ws.append([
-                profile.full_name,
-                profile.phone_number,
-                profile.get_grade_display(),
-                profile.get_olympiad_field_display(),
-                f"{hours:.2f}",
-                session_count
-            ])
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 12
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 20
-        ws.column_dimensions['F'].width = 15
-        
-        # Create response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename=student_report_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.xlsx'
+        if data['kind'] == 'student_pdf':
+            if not UserProfile.objects.filter(user_id=data['user_id'], role='student', school=manager_school).exists():
+                return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+            params = {'user_id': data['user_id']}
+        else:
+            # Resolve the default range now so the job is reproducible
+            end_date = data.get('end_date') or study_windows(zone=school_zone(manager_school))['today']
+            start_date = data.get('start_date') or end_date - timedelta(days=30)
+            params = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
         
-        wb.save(response)
-        return response
+        job = submit_report(data['kind'], request.user, manager_school, params)
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
-class ManagerStudentReportPDFView(views.APIView):
+class ManagerReportJobDetailView(views.APIView):
     """
-    Generate PDF report for a specific student
+    Status of a report job requested by this manager
     """
     permission_classes = [IsAuthenticated, IsManager]
     
-    def get(self, request, user_id):
-        return Response(
-            {'message': 'PDF generation will be implemented in next phase. For now, use Excel export.'},
-            status=status.HTTP_501_NOT_IMPLEMENTED
-        )
+    def get(self, request, job_id):
+        try:
+            job = ReportJob.objects.get(id=job_id, requested_by=request.user)
+        except ReportJob.DoesNotExist:
+            return Response({'error': 'گزارش یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReportJobSerializer(job).data)
+
+
+class ManagerReportJobDownloadView(views.APIView):
+    """
+    Download the artifact of a finished report job
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    
+    def get(self, request, job_id):
+        try:
+            job = ReportJob.objects.get(id=job_id, requested_by=request.user)
+        except ReportJob.DoesNotExist:
+            return Response({'error': 'گزارش یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
+        if job.status != 'done':
+            return Response(ReportJobSerializer(job).data, status=status.HTTP_409_CONFLICT)
+        return report_file_response(job)
 
 
 # ==================== SuperAdmin Panel Views ====================
@@ -800,10 +1029,17 @@ class ManagerStudentReportPDFView(views.APIView):
 class SuperAdminSchoolListCreateView(generics.ListCreateAPIView):
     """
     List all schools or create a new school (SuperAdmin only)
+    
+    Paginated; supports `search` (name, invitation code) and `ordering`.
     """
     serializer_class = SchoolSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
-    queryset = School.objects.all()
+    queryset = annotate_school_stats(School.objects.all())
+    pagination_class = AdminListPagination
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'invitation_code']
+    ordering_fields = ['name', 'created_at', 'member_count', 'is_active']
+    ordering = ['-created_at', '-id']
 
 
 class SuperAdminSchoolDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -812,7 +1048,7 @@ class SuperAdminSchoolDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     serializer_class = SchoolSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
-    queryset = School.objects.all()
+    queryset = annotate_school_stats(School.objects.all())
 
 
 class SuperAdminAssignManagerView(views.APIView):
@@ -840,16 +1076,25 @@ class SuperAdminAssignManagerView(views.APIView):
             defaults={'phone_number': phone_number}
         )
         
-        # Remove manager role from previous manager of this school (if exists)
-        previous_managers = UserProfile.objects.filter(school=school, role='manager')
-        for prev_manager in previous_managers:
-            prev_manager.role = 'student'
-            prev_manager.save()
+        with transaction.atomic():
+            # Remove manager role from previous manager of this school (if exists)
+            previous_managers = UserProfile.objects.filter(
+                school=school, role='manager'
+            ).exclude(pk=profile.pk)
+            demoted = list(previous_managers.values_list('user_id', flat=True))
+            previous_managers.update(role='student', updated_at=timezone.now())
+            # update() sends no signals: give the demoted managers their entries back
+            rebuild_leaderboards(DailyStudyRollup, LeaderboardEntry, UserProfile, users=demoted)
+            
+            # Assign new manager
+            profile.school = school
+            profile.role = 'manager'
+            profile.save()
         
-        # Assign new manager
-        profile.school = school
-        profile.role = 'manager'
-        profile.save()
+        # update() sends no signals: drop the demoted managers' cached
+        # principals so their next request is no longer authorised as manager
+        forget_principals(*demoted)
+        invalidate('school', school.id)
         
         return Response({
             'message': f'مدیر با شماره {phone_number} به مدرسه {school.name} اختصاص یافت',
@@ -864,21 +1109,33 @@ class SuperAdminAssignManagerView(views.APIView):
 class SuperAdminSchoolMembersView(views.APIView):
     """
     Get list of all members (students + manager) of a school
+    
+    Paginated; supports `search` (name, phone number) and `ordering`.
     """
     permission_classes = [IsAuthenticated, IsSuperAdmin]
+    pagination_class = AdminListPagination
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['full_name', 'phone_number']
+    ordering_fields = ['full_name', 'phone_number', 'role', 'grade', 'created_at']
+    ordering = ['role', 'full_name', 'id']
     
     def get(self, request, school_id):
         try:
-            school = School.objects.get(id=school_id)
+            school = annotate_school_stats(School.objects.all()).get(id=school_id)
         except School.DoesNotExist:
             return Response({'error': 'مدرسه یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
         
         members = UserProfile.objects.filter(school=school)
+        for backend in self.filter_backends:
+            members = backend().filter_queryset(request, members, self)
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(members, request, view=self)
         
         members_data = []
-        for profile in members:
+        for profile in page:
             members_data.append({
-                'id': profile.user.id,
+                'id': profile.user_id,
                 'full_name': profile.full_name,
                 'phone_number': profile.phone_number,
                 'role': profile.get_role_display(),
@@ -889,6 +1146,60 @@ class SuperAdminSchoolMembersView(views.APIView):
         return Response({
             'school': SchoolSerializer(school).data,
             'members': members_data,
-            'total_count': len(members_data)
+            'total_count': paginator.page.paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link()
+        })
+
+
+
+class SuperAdminCacheStatsView(views.APIView):
+    """
+    Hit/miss counters of the dashboard stats cache (this worker process only)
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+    
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class SuperAdminRequestMetricsView(views.APIView):
+    """
+    p50/p95/p99 of query count, SQL time, wall time and response size per
+    endpoint, over the last REQUEST_METRICS_BUFFER requests of each (this
+    worker process only). DELETE clears the buffers.
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+    
+    def get(self, request):
+        return Response({
+            'buffer_size': settings.REQUEST_METRICS_BUFFER,
+            'endpoints': get_request_metrics().report()
+        })
+    
+    def delete(self, request):
+        get_request_metrics().reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SuperAdminDatabasePoolView(views.APIView):
+    """
+    Database connection settings and, with DB_POOL_MODE=pool, the pool's
+    size, connections in use, waiting threads and p50/p95/p99 of checkout
+    wait and latency (this worker process only). DELETE clears the counters.
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request):
+        database = settings.DATABASES['default']
+        return Response({
+            'mode': settings.DB_POOL_MODE,
+            'engine': database['ENGINE'],
+            'conn_max_age': database['CONN_MAX_AGE'],
+            'health_checks': database['CONN_HEALTH_CHECKS'],
+            'pools': pool_stats()
         })
 
+    def delete(self, request):
+        reset_pool_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -63,33 +63,87 @@ export const authAPI = {
   getProfile: () => api.get('profile/'),
   updateProfile: (data) => api.put('profile/', data),
   updateStudyStatus: (isStudying) => api.post('profile/study-status/', { is_studying: isStudying }),
+  heartbeat: () => api.post('profile/heartbeat/'),
 };
 
 export const dataAPI = {
   getSubjects: () => api.get('subjects/'),
   createSubject: (data) => api.post('subjects/', data),
   updateSubject: (id, data) => api.put(`subjects/${id}/`, data),
-  getSessions: () => api.get('sessions/'), // This endpoint lists recent sessions
+  // Cursor-paginated, newest first; params: since, until, page_size, cursor
+  getSessions: (params) => api.get('sessions/', { params }),
+  // Follow the cursor until exhausted; resolves to { data: [...sessions] }
+  getAllSessions: async (params = {}) => {
+    const sessions = [];
+    let cursor;
+    do {
+      const { data } = await api.get('sessions/', { params: { page_size: 500, ...params, cursor } });
+      sessions.push(...data.results);
+      cursor = data.next_cursor;
+    } while (cursor);
+    return { data: sessions };
+  },
   createSession: (data) => api.post('sessions/', data),
+  // Batch upload of offline sessions; each item needs a client_id (see utils/sessionOutbox)
+  uploadSessions: (sessions) => api.post('sessions/bulk/', { sessions }),
   getDashboardStats: () => api.get('dashboard/stats/'),
+  // Daily series, subject split and streaks; params: start, end (YYYY-MM-DD)
+  getAnalytics: (params) => api.get('dashboard/analytics/', { params }),
+};
+
+// Server-side timer: the server keeps the running/paused state and computes
+// the duration on stop; profile/heartbeat/ keeps a running timer alive
+export const timerAPI = {
+  getState: () => api.get('timer/'),
+  start: (data = {}) => api.post('timer/start/', data),
+  pause: () => api.post('timer/pause/'),
+  resume: () => api.post('timer/resume/'),
+  // data: optional subject_name, subject_color, description
+  stop: (data = {}) => api.post('timer/stop/', data),
 };
 
 // Manager Panel API
 export const managerAPI = {
   getDashboardKPI: () => api.get('manager/dashboard/'),
+  // Daily KPIs oldest first; params: days (30, 90 or 365)
+  getKpiTrend: (params) => api.get('manager/dashboard/trend/', { params }),
+  // Open timers of the school's students with their time so far
+  getLiveSessions: () => api.get('manager/live-sessions/'),
+  // EventSource cannot send headers, so the stream is opened with a
+  // short-lived single-use ticket instead of the access token
+  openDashboardStream: async () => {
+    const { data } = await api.post('manager/dashboard/stream/ticket/');
+    return new EventSource(
+      `${api.defaults.baseURL}manager/dashboard/stream/?ticket=${encodeURIComponent(data.ticket)}`
+    );
+  },
+  // params: { period: 'day' | 'week' | 'month', grade, olympiad_field, limit }
+  getLeaderboard: (params) => api.get('manager/leaderboard/', { params }),
   getStudentList: (params) => api.get('manager/students/', { params }),
   getStudentProfile: (userId) => api.get(`manager/students/${userId}/profile/`),
-  exportExcel: (startDate, endDate) => {
-    const params = new URLSearchParams();
-    if (startDate) params.append('start_date', startDate);
-    if (endDate) params.append('end_date', endDate);
-    return `${api.defaults.baseURL}manager/export/excel/?${params.toString()}`;
-  },
+  // Background reports: submit, poll status, then download
+  submitReport: (data) => api.post('manager/reports/', data),
+  getReportJob: (jobId) => api.get(`manager/reports/${jobId}/`),
+  downloadReport: (jobId) => api.get(`manager/reports/${jobId}/download/`, { responseType: 'blob' }),
 };
 
 // SuperAdmin Panel API
 export const superadminAPI = {
-  getSchools: () => api.get('superadmin/schools/'),
+  // Paginated; params: page, page_size, search, ordering
+  getSchools: (params) => api.get('superadmin/schools/', { params }),
+  // Follow the pages until exhausted; resolves to { data: [...schools] }
+  getAllSchools: async (params = {}) => {
+    const schools = [];
+    let page = 1;
+    let next;
+    do {
+      const { data } = await api.get('superadmin/schools/', { params: { page_size: 500, ...params, page } });
+      schools.push(...data.results);
+      next = data.next;
+      page += 1;
+    } while (next);
+    return { data: schools };
+  },
   createSchool: (data) => api.post('superadmin/schools/', data),
   updateSchool: (id, data) => api.put(`superadmin/schools/${id}/`, data),
   deleteSchool: (id) => api.delete(`superadmin/schools/${id}/`),
@@ -23,8 +23,11 @@ const Dashboard = () => {
       try {
         setLoading(true);
         // Fetch sessions and subjects in parallel
+        // Only the last 90 days are needed (heatmap and tab filters); one
+        // extra day covers the gap between browser and Iran local time
+        const since = new Date(Date.now() - 91 * 24 * 3600 * 1000);
         const [sessionsRes, subjectsRes] = await Promise.all([
-          dataAPI.getSessions(),
+          dataAPI.getAllSessions({ since: since.toISOString() }),
           dataAPI.getSubjects()
         ]);
 
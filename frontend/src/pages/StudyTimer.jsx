@@ -7,6 +7,7 @@ import { Link } from 'react-router-dom';
 import { MdGetApp } from 'react-icons/md';
 import { usePWA } from '../hooks/PWAContext'; 
 import { formatRelativeDateIran, getStartOfDayIran } from '../utils/dateUtils';
+import { queueSession, flushOutbox } from '../utils/sessionOutbox';
 
 const StudyTimer = () => {
   const navigate = useNavigate();
@@ -30,6 +31,14 @@ const [showBlackOverlay, setShowBlackOverlay] = useState(false);
 
   const { seconds, isActive, isPaused, focusLost, start, pause, resume, stop, reset } = useStudyTimer(0);
 
+  useEffect(() => {
+    // Upload sessions saved while offline, now and whenever the connection returns
+    const sync = () => flushOutbox().catch(() => {});
+    sync();
+    window.addEventListener('online', sync);
+    return () => window.removeEventListener('online', sync);
+  }, []);
+
   useEffect(() => {
   const initData = async () => {
     const isLoggedIn = localStorage.getItem('isLoggedIn');
@@ -43,7 +52,8 @@ const [showBlackOverlay, setShowBlackOverlay] = useState(false);
       const [subjectsRes, profileRes, sessionsRes] = await Promise.all([
         dataAPI.getSubjects(),
         authAPI.getProfile(),
-        dataAPI.getSessions() // <--- تغییر کلیدی در اینجا
+        // فقط سشن‌های اخیر از سرور گرفته می‌شود؛ فیلتر دقیق "امروز" در پایین انجام می‌شود
+        dataAPI.getAllSessions({ since: new Date(Date.now() - 2 * 24 * 3600 * 1000).toISOString() })
       ]);
 
       setCourses(subjectsRes.data);
@@ -189,6 +199,15 @@ const handleDismissBlackout = () => {
     }
   }, [isActive, startTime]);
 
+  // Keep the manager's "active now" count alive while the timer is running
+  useEffect(() => {
+    if (!isActive || isPaused) return;
+    const ping = () => authAPI.heartbeat().catch(() => {});
+    ping();
+    const heartbeatId = setInterval(ping, 30000);
+    return () => clearInterval(heartbeatId);
+  }, [isActive, isPaused]);
+
   const handleStop = async () => {
     const studyTime = seconds;
     const end = new Date();
@@ -228,13 +247,23 @@ const handleDismissBlackout = () => {
         localStorage.removeItem('timerState');
         stop();
 
-        const response = await dataAPI.createSession({
+        // Queue first so the session survives a failed upload, then sync
+        queueSession({
             subject_name: courseName,
             description: courseDescription,
             start_time: editedStartTime.toISOString(),
             end_time: editedEndTime.toISOString(),
         });
-        console.log("Session saved successfully:", response.data);
+        try {
+            const results = await flushOutbox();
+            const invalid = results.filter(result => result.status === 'invalid');
+            if (invalid.length) {
+                alert(`خطا در ذخیره جلسه مطالعه: ${JSON.stringify(invalid[0].errors)}`);
+            }
+        } catch (error) {
+            // Offline or server unreachable: kept in the outbox until the next sync
+            console.warn("Session queued for later upload:", error.message);
+        }
 
         // Update stats locally if the session is for today
         const sessionDate = getStartOfDayIran(editedStartTime);
@@ -18,11 +18,19 @@ import {
   HiLogout
 } from 'react-icons/hi';
 
+// KPI refresh without the live stream, and when to give up on the stream
+const KPI_POLL_MS = 30000;
+const STREAM_RETRY_MS = 3000;
+const MAX_STREAM_FAILURES = 3;
+// How often to check on a queued Excel report
+const REPORT_POLL_MS = 2000;
+
 export default function ManagerDashboard() {
   const navigate = useNavigate();
   const [kpiData, setKpiData] = useState(null);
   const [students, setStudents] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [exporting, setExporting] = useState(false);
   const [filters, setFilters] = useState({
     grade: '',
     olympiad: '',
@@ -56,7 +64,63 @@ export default function ManagerDashboard() {
   };
 
   useEffect(() => {
-    fetchDashboardData();
+    // Live KPI updates where the backend serves the stream: a full snapshot
+    // on connect, then only the changed fields. Otherwise, or once the
+    // stream keeps failing, poll the dashboard endpoint instead.
+    let stream = null;
+    let poller = null;
+    let retry = null;
+    let failures = 0;
+    let closed = false;
+
+    const startPolling = () => {
+      if (!closed && !poller) poller = setInterval(fetchDashboardData, KPI_POLL_MS);
+    };
+    const reconnectOrPoll = () => {
+      failures += 1;
+      if (failures >= MAX_STREAM_FAILURES) startPolling();
+      else if (!closed) retry = setTimeout(connect, STREAM_RETRY_MS);
+    };
+    const connect = async () => {
+      try {
+        stream = await managerAPI.openDashboardStream();
+      } catch (error) {
+        console.error('Error opening KPI stream:', error);
+        reconnectOrPoll();
+        return;
+      }
+      if (closed) {
+        stream.close();
+        return;
+      }
+      stream.addEventListener('snapshot', (event) => {
+        failures = 0;
+        setKpiData(JSON.parse(event.data));
+      });
+      stream.addEventListener('delta', (event) => {
+        const delta = JSON.parse(event.data);
+        setKpiData((current) => (current ? { ...current, ...delta } : current));
+      });
+      // A ticket works once, so the browser's own reconnect would be
+      // refused; reconnect with a fresh one instead
+      stream.onerror = () => {
+        stream.close();
+        stream = null;
+        reconnectOrPoll();
+      };
+    };
+
+    fetchDashboardData().then((data) => {
+      if (closed) return;
+      if (data?.live_stream) connect();
+      else startPolling();
+    });
+    return () => {
+      closed = true;
+      if (stream) stream.close();
+      clearInterval(poller);
+      clearTimeout(retry);
+    };
   }, []);
 
   useEffect(() => {
@@ -67,6 +131,7 @@ export default function ManagerDashboard() {
     try {
       const response = await managerAPI.getDashboardKPI();
       setKpiData(response.data);
+      return response.data;
     } catch (error) {
       console.error('Error fetching KPI data:', error);
       if (error.response?.status === 403) {
@@ -94,7 +159,7 @@ export default function ManagerDashboard() {
     return `${hours}:${minutes.toString().padStart(2, '0')}`;
   };
 
-  const handleExportExcel = () => {
+  const handleExportExcel = async () => {
     const today = getIranDate();
     const thirtyDaysAgo = new Date(today);
     thirtyDaysAgo.setDate(today.getDate() - 30);
@@ -103,8 +168,29 @@ export default function ManagerDashboard() {
     const startDate = thirtyDaysAgo.toLocaleDateString('en-CA');
     const endDate = today.toLocaleDateString('en-CA');
     
-    const url = managerAPI.exportExcel(startDate, endDate);
-    window.open(url, '_blank');
+    // The workbook is built by the report worker: queue it, wait, then download
+    setExporting(true);
+    try {
+      let { data: job } = await managerAPI.submitReport({ kind: 'excel', start_date: startDate, end_date: endDate });
+      while (job.status === 'pending' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_MS));
+        ({ data: job } = await managerAPI.getReportJob(job.id));
+      }
+      if (job.status !== 'done') throw new Error(job.error);
+
+      const { data } = await managerAPI.downloadReport(job.id);
+      const url = URL.createObjectURL(data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `student_report_${startDate}_${endDate}.xlsx`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Error exporting Excel:', error);
+      alert('خطا در تهیه فایل Excel');
+    } finally {
+      setExporting(false);
+    }
   };
 
   const handleStudentClick = (userId) => {
@@ -282,10 +368,11 @@ export default function ManagerDashboard() {
             {/* Export Button */}
             <button
               onClick={handleExportExcel}
+              disabled={exporting}
               className="px-6 py-3 bg-gradient-to-r from-emerald-600 to-teal-600 text-white rounded-xl hover:from-emerald-700 hover:to-teal-700 transition-all font-semibold flex items-center gap-2 shadow-lg hover:shadow-xl hover:scale-105 transform"
             >
               <HiDownload className="text-lg" />
-              دانلود Excel
+              {exporting ? 'در حال تهیه...' : 'دانلود Excel'}
             </button>
           </div>
         </div>
@@ -19,7 +19,7 @@ export default function SuperAdminDashboard() {
 
   const fetchSchools = async () => {
     try {
-      const response = await superadminAPI.getSchools();
+      const response = await superadminAPI.getAllSchools();
       setSchools(response.data);
     } catch (error) {
       console.error('Error fetching schools:', error);
@@ -0,0 +1,69 @@
+import { dataAPI } from '../api/client';
+
+// Sessions waiting to be uploaded, kept in localStorage so they survive
+// reloads and offline periods. Each one has a client_id so that retrying an
+// upload never creates the session twice.
+const OUTBOX_KEY = 'pendingSessions';
+const MAX_BATCH = 500;
+
+const readOutbox = () => {
+  try {
+    return JSON.parse(localStorage.getItem(OUTBOX_KEY)) || [];
+  } catch {
+    return [];
+  }
+};
+
+const writeOutbox = (sessions) => {
+  if (sessions.length) {
+    localStorage.setItem(OUTBOX_KEY, JSON.stringify(sessions));
+  } else {
+    localStorage.removeItem(OUTBOX_KEY);
+  }
+};
+
+const newClientId = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  // Fallback for non-secure contexts (e.g. testing over plain http on a LAN)
+  return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, (c) => {
+    const r = (Math.random() * 16) | 0;
+    return (c === 'x' ? r : (r & 0x3) | 0x8).toString(16);
+  });
+};
+
+export const queueSession = (session) => {
+  const queued = { ...session, client_id: newClientId() };
+  writeOutbox([...readOutbox(), queued]);
+  return queued;
+};
+
+export const pendingSessionCount = () => readOutbox().length;
+
+let flushing = null;
+
+// Upload everything in the outbox. Resolves to the per-item results; items
+// the server answered for (created, duplicate or invalid) leave the outbox,
+// while a network failure keeps them for the next attempt.
+export const flushOutbox = () => {
+  if (!flushing) {
+    flushing = (async () => {
+      const results = [];
+      try {
+        let batch = readOutbox().slice(0, MAX_BATCH);
+        while (batch.length) {
+          const { data } = await dataAPI.uploadSessions(batch);
+          results.push(...data.results);
+          const answered = new Set(batch.map((session) => session.client_id));
+          writeOutbox(readOutbox().filter((session) => !answered.has(session.client_id)));
+          batch = readOutbox().slice(0, MAX_BATCH);
+        }
+      } finally {
+        flushing = null;
+      }
+      return results;
+    })();
+  }
+  return flushing;
+};
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings shared by the Procfile and the Docker image.
+
+SERVER_MODE=wsgi (the default) serves study_assistant.wsgi on gunicorn's
+sync workers. SERVER_MODE=asgi serves study_assistant.asgi on uvicorn
+workers: the async views (dashboard stats, manager KPIs, student profile)
+then wait on the database without holding a worker, and the manager KPI
+stream is served by the same process. Workers come from WEB_CONCURRENCY
+and the port from PORT, as gunicorn reads them by default.
+"""
+import os
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'study_assistant.asgi:application'
+    # Needs `pip install uvicorn-worker`
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'study_assistant.wsgi:application'
+else:
+    raise RuntimeError(f"SERVER_MODE must be 'wsgi' or 'asgi', not {SERVER_MODE!r}")
+
+accesslog = '-'
+errorlog = '-'
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_assistant.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup; serves the manager dashboard SSE stream outside Django's request cycle
+from api.live import LiveStreamRouter  # noqa: E402
+
+application = LiveStreamRouter(django_application)
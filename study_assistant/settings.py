@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Load .env file
 load_dotenv()
@@ -57,8 +58,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',  # first, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # WhiteNoise middleware
+    'api.middleware.AsyncWhiteNoiseMiddleware', # WhiteNoise, async-capable for SERVER_MODE=asgi
+    'api.compression.ApiCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +95,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'study_assistant.wsgi.application'
+ASGI_APPLICATION = 'study_assistant.asgi.application'
+
+# 'wsgi' runs sync gunicorn workers, 'asgi' uvicorn workers serving the async views (see gunicorn.conf.py)
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
 
 
 # Database
@@ -99,10 +106,36 @@ WSGI_APPLICATION = 'study_assistant.wsgi.application'
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# How PostgreSQL connections are reused:
+# 'persistent' keeps one per thread for 10 minutes (none under ASGI, where every
+#   request queries from its own executor thread and they would only pile up);
+# 'pool' shares DB_POOL_MAX_SIZE connections per process between all threads
+#   (api/backends/postgresql), the mode to use with SERVER_MODE=asgi;
+# 'pgbouncer' for a DATABASE_URL pointing at PgBouncer in transaction mode,
+#   which cannot keep the server-side cursors of .iterator() open.
+# Reused connections are health-checked before use, so ones dropped by a
+# failover or an idle timeout are reopened instead of failing the request.
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'persistent')
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+# Seconds a request waits for a free pooled connection before failing
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+if DB_POOL_MODE not in ('persistent', 'pool', 'pgbouncer'):
+    raise ImproperlyConfigured(f'Unknown DB_POOL_MODE {DB_POOL_MODE!r}')
+
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=0 if SERVER_MODE == 'asgi' or DB_POOL_MODE == 'pool' else 600,
+            conn_health_checks=True,
+            disable_server_side_cursors=DB_POOL_MODE == 'pgbouncer',
+        )
     }
+    if DB_POOL_MODE == 'pool':
+        if DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+            raise ImproperlyConfigured('DB_POOL_MODE=pool needs a PostgreSQL DATABASE_URL')
+        DATABASES['default']['ENGINE'] = 'api.backends.postgresql'
 else:
     DATABASES = {
         'default': {
@@ -138,6 +171,13 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Timezone of schools created without one and of users without a school;
+# study days (today, heatmap cells, daily rollups) start at its midnight
+SCHOOL_DEFAULT_TIMEZONE = os.getenv('SCHOOL_DEFAULT_TIMEZONE', 'Asia/Tehran')
+
+# First day of a leaderboard week (0 = Monday ... 5 = Saturday)
+LEADERBOARD_WEEK_START = int(os.getenv('LEADERBOARD_WEEK_START', '5'))
+
 USE_I18N = True
 
 USE_TZ = True
@@ -157,13 +197,22 @@ STORAGES = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Covering indexes (Index.include) only exist on PostgreSQL; on SQLite the
+# non-key columns are simply dropped, which is fine for local development.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.ColumnarJSONRenderer',  # ?format=columnar
+    ],
 }
 
 from datetime import timedelta
@@ -172,3 +221,101 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
 }
+
+# Background report jobs (see `python manage.py run_report_worker`)
+REPORT_ROOT = Path(os.getenv('REPORT_ROOT', BASE_DIR / 'reports'))
+REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', '600'))  # seconds before a running job is re-queued
+REPORT_ARTIFACT_MAX_AGE_DAYS = int(os.getenv('REPORT_ARTIFACT_MAX_AGE_DAYS', '7'))
+# Optional TTF font with Persian glyphs for PDF reports
+REPORT_PDF_FONT = os.getenv('REPORT_PDF_FONT', '')
+
+# Per-endpoint request metrics (superadmin/metrics/): samples kept per URL name
+# in each process, and whether to expose the timings in a Server-Timing header.
+REQUEST_METRICS_BUFFER = int(os.getenv('REQUEST_METRICS_BUFFER', '1000'))
+REQUEST_METRICS_SERVER_TIMING = os.getenv('REQUEST_METRICS_SERVER_TIMING', 'False') == 'True'
+
+# Compression of API responses (static files are compressed by WhiteNoise).
+# Bodies below the minimum size are sent as is; brotli is offered when the
+# `brotli` package is installed (`pip install brotli`), gzip otherwise.
+API_COMPRESSION_PREFIX = '/api/'
+API_COMPRESSION_MIN_SIZE = int(os.getenv('API_COMPRESSION_MIN_SIZE', '1024'))  # bytes
+API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', '6'))
+API_BROTLI_QUALITY = int(os.getenv('API_BROTLI_QUALITY', '5'))
+
+# Largest batch accepted by sessions/bulk/ (offline PWA sync)
+SESSION_UPLOAD_MAX_BATCH = int(os.getenv('SESSION_UPLOAD_MAX_BATCH', '500'))
+
+# Longest date range served by dashboard/analytics/, in days
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '366'))
+
+# Cache backends for dashboard stats. locmem is per process, so with several
+# gunicorn workers a write only invalidates the worker that handled it; use
+# `file` or `redis` (needs `pip install redis`) when running more than one.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'timer-app',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+    # Caches nothing, so every request reaches the database; for load tests
+    'dummy': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'timer',
+    },
+}
+STATS_CACHE_ALIAS = 'default'
+STATS_CACHE_TIMEOUT = int(os.getenv('STATS_CACHE_TIMEOUT', '300'))  # seconds
+# Seconds a user's or school's cache generation lives; expiring restarts it, costing one miss
+STATS_GENERATION_TIMEOUT = int(os.getenv('STATS_GENERATION_TIMEOUT', str(7 * 24 * 3600)))
+# Authenticated user + profile + school, cached per user in the same cache.
+# Saves drop the entry; the TTL bounds staleness in other processes with locmem.
+AUTH_PRINCIPAL_CACHE_TIMEOUT = int(os.getenv('AUTH_PRINCIPAL_CACHE_TIMEOUT', '60'))  # seconds
+
+# "Active now" presence: students ping profile/heartbeat/ while the timer runs
+# and drop out PRESENCE_TTL seconds after their last ping. 'cache' shares it
+# through CACHE_BACKEND, which must then be one every process sees (file or
+# redis, not locmem); 'memory' suits a single process. See check api.W001.
+PRESENCE_BACKEND = os.getenv('PRESENCE_BACKEND', 'cache')  # 'cache' or 'memory'
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', '90'))
+PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv('PRESENCE_HEARTBEAT_INTERVAL', '30'))
+
+# Server-side study timers (api/timers.py). `python manage.py sweep_active_sessions`
+# closes running timers without a heartbeat for TIMER_ABANDON_AFTER seconds and
+# paused ones left for TIMER_PAUSED_ABANDON_AFTER; timers stopped without a
+# subject are saved under TIMER_DEFAULT_SUBJECT.
+TIMER_ABANDON_AFTER = int(os.getenv('TIMER_ABANDON_AFTER', '600'))
+TIMER_TOUCH_INTERVAL = int(os.getenv('TIMER_TOUCH_INTERVAL', '60'))  # seconds between heartbeat writes per user
+TIMER_PAUSED_ABANDON_AFTER = int(os.getenv('TIMER_PAUSED_ABANDON_AFTER', '43200'))
+TIMER_DEFAULT_SUBJECT = os.getenv('TIMER_DEFAULT_SUBJECT', 'مطالعه')
+
+# Threads per process running independent reads of one request concurrently
+# (api/fanout.py), each with its own database connection; 0 runs them in turn.
+FANOUT_THREADS = int(os.getenv('FANOUT_THREADS', '4'))
+
+# Live manager dashboard. The SSE stream is only served by the ASGI app
+# (study_assistant/asgi.py) and watches the stats cache and presence store,
+# so it needs the same CACHE_BACKEND as the processes that record sessions.
+LIVE_STREAM_PATH = '/api/manager/dashboard/stream/'
+# Whether clients can reach the stream: this process serves it, or a proxy routes
+# LIVE_STREAM_PATH to an ASGI one (the `live` service in docker-compose.yml).
+# Off, the dashboard polls the KPIs instead.
+LIVE_STREAM_ENABLED = os.getenv('LIVE_STREAM_ENABLED', str(SERVER_MODE == 'asgi')) == 'True'
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '2'))  # seconds between change checks per school
+LIVE_KEEPALIVE = int(os.getenv('LIVE_KEEPALIVE', '15'))  # seconds between keepalive comments
+LIVE_QUEUE_SIZE = int(os.getenv('LIVE_QUEUE_SIZE', '16'))  # pending events per client before it is resynced
+LIVE_RETRY_MS = int(os.getenv('LIVE_RETRY_MS', '3000'))  # client reconnect delay
+LIVE_TICKET_TTL = int(os.getenv('LIVE_TICKET_TTL', '30'))  # seconds a stream ticket stays valid
+LIVE_ERROR_BACKOFF = float(os.getenv('LIVE_ERROR_BACKOFF', '60'))  # max seconds between polls after errors